@@ -0,0 +1,47 @@
+"""
+Async MongoDB access for the ASGI read endpoints.
+
+Uses motor, which is only needed for ``octofit_tracker.async_views``. motor
+clients are bound to the event loop they were created on, so one client
+is kept per running loop, created with the shared client options. Under
+WSGI every async view runs on a loop of its own; ``close_clients`` closes
+that loop's client when the view returns, so each request pays for a
+connection but none is leaked. The database name is read from the Django
+connection settings, so tests hit the test database like djongo does.
+"""
+import asyncio
+import weakref
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+
+from .db import client_options
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+except ImportError:  # pragma: no cover - motor is only needed under ASGI
+    AsyncIOMotorClient = None
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_db(alias='default'):
+    """
+    Return the motor database for ``alias`` on the running event loop.
+    """
+    if AsyncIOMotorClient is None:
+        raise ImproperlyConfigured('The async endpoints require the motor package.')
+    settings_dict = connections[alias].settings_dict
+    loop = asyncio.get_running_loop()
+    clients = _clients.setdefault(loop, {})
+    if alias not in clients:
+        clients[alias] = AsyncIOMotorClient(**client_options(alias))
+    return clients[alias][settings_dict['NAME']]
+
+
+def close_clients():
+    """
+    Close and forget the clients created on the running event loop.
+    """
+    for client in _clients.pop(asyncio.get_running_loop(), {}).values():
+        client.close()
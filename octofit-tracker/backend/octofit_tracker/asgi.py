@@ -2,6 +2,10 @@
 ASGI config for octofit_tracker project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn octofit_tracker.asgi:application``)
+to run the /api/async/ endpoints without blocking a thread per request.
+The live leaderboard (SSE at /api/leaderboard/live/, WebSocket at
+/ws/leaderboard/) is served by ``LiveLeaderboardApp`` in front of Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
@@ -13,4 +17,11 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from octofit_tracker.live import LiveLeaderboardApp  # noqa: E402 - needs the app registry
+from octofit_tracker.ranking import warm_rank_index  # noqa: E402
+
+warm_rank_index()
+
+application = LiveLeaderboardApp(django_application)
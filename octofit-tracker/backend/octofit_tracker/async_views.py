@@ -0,0 +1,110 @@
+"""
+Async versions of the hot read endpoints.
+
+Under ASGI these views wait on MongoDB through motor instead of holding a
+worker thread, so one process can serve many slow clients at once. They
+return the same JSON as their DRF counterparts: rows come from the same
+serializers (including ``?fields=``/``?omit=``), activities use the same
+filters and keyset cursors, and user stats read the same rollups. The
+sync endpoints are unchanged.
+"""
+from functools import wraps
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+
+from . import repository, rollups
+from .aio import close_clients, get_async_db
+from .filters import ActivityFilterBackend, rollup_params
+from .pagination import ActivityPagination
+from .renderers import ORJSONRenderer
+from .serializers import ActivitySerializer, LeaderboardSerializer
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(ORJSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+def api_errors(view):
+    """
+    Turn DRF API exceptions raised while parsing parameters into JSON errors.
+
+    Outside ASGI the view runs on a one-off event loop, so its motor client
+    is closed afterwards.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        except APIException as exc:
+            data = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+            return json_response(data, exc.status_code)
+        finally:
+            if not isinstance(request, ASGIRequest):
+                close_clients()
+    return wrapper
+
+
+@api_errors
+async def leaderboard_list(request):
+    """
+    The all-time leaderboard, ordered by rank.
+    """
+    serializer = LeaderboardSerializer(context={'request': Request(request)})
+    cursor = get_async_db().leaderboard.find({}, repository.projection_for(serializer)).sort('rank', 1)
+    return json_response(repository.represent(await cursor.to_list(None), serializer))
+
+
+@api_errors
+async def activity_list(request):
+    """
+    Activities newest first, with the list endpoint's filters and cursors.
+    """
+    drf_request = Request(request)
+    db = get_async_db()
+    paginator = ActivityPagination()
+    paginator.model = ActivitySerializer.Meta.model
+    paginator.page_size = paginator.get_page_size(drf_request)
+    paginator.base_url = request.build_absolute_uri()
+
+    team = drf_request.query_params.get('team')
+    members = await db.users.distinct('username', {'team': team}) if team else None
+    query = ActivityFilterBackend().get_mongo_query(drf_request, members)
+    position = paginator.decode_cursor(drf_request)
+    if position is not None:
+        query = {'$and': [query, paginator.mongo_after(position)]}
+
+    serializer = ActivitySerializer(context={'request': drf_request})
+    projection = repository.projection_for(serializer)
+    projection.update(dict.fromkeys(paginator.field_names, True))
+    cursor = db.activities.find(query, projection).sort(paginator.mongo_sort()).limit(paginator.page_size + 1)
+    documents = await cursor.to_list(None)
+
+    paginator.has_next = len(documents) > paginator.page_size
+    paginator.page = documents[:paginator.page_size]
+    return json_response({
+        'next': paginator.get_next_link(),
+        'results': repository.represent(paginator.page, serializer),
+    })
+
+
+@api_errors
+async def user_stats(request, pk):
+    """
+    A user's activity totals and per-period series from the rollups.
+    """
+    bucket, start, end = rollup_params(Request(request).query_params)
+    db = get_async_db()
+    user = await db.users.find_one({'id': pk}, {'username': True})
+    if user is None:
+        return json_response({'detail': 'Not found.'}, status.HTTP_404_NOT_FOUND)
+    cursor = db[rollups.COLLECTION].find(
+        rollups.read_query(user['username'], bucket, start, end), rollups.READ_PROJECTION
+    ).sort('start', 1)
+    data = rollups.summarize(user['username'], bucket, await cursor.to_list(None))
+    data['from'] = start.isoformat() if start else None
+    data['to'] = end.isoformat() if end else None
+    return json_response(data)
@@ -0,0 +1,81 @@
+"""
+Endpoint benchmark measurement and baseline comparison.
+
+Used by ``manage.py benchmark_api``; kept separate from the command so the
+statistics and regression rules can be unit tested without a database.
+"""
+import math
+import time
+
+
+def percentile(samples, fraction):
+    """
+    Nearest-rank percentile of ``samples``; ``fraction`` is between 0 and 1.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(math.ceil(fraction * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def summarize(latencies, round_trips, elapsed):
+    """
+    Summarize one endpoint's run; latencies are in seconds, reported in ms.
+    """
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'db_round_trips': round(sum(round_trips) / len(round_trips), 2) if round_trips else 0.0,
+    }
+
+
+def run_endpoint(client, path, requests, timer, before_request=None):
+    """
+    Issue ``requests`` GETs to ``path`` and summarize the results.
+    """
+    latencies = []
+    round_trips = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        if before_request:
+            before_request()
+        timer.reset()
+        begin = time.perf_counter()
+        response = client.get(path)
+        latencies.append(time.perf_counter() - begin)
+        round_trips.append(timer.snapshot()[0])
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {path} returned {response.status_code}')
+    return summarize(latencies, round_trips, time.perf_counter() - started)
+
+
+def compare(baseline, current, threshold):
+    """
+    Return a list of regressions of ``current`` against ``baseline``.
+
+    A regression is a p50/p95/p99 latency more than ``threshold`` (a
+    fraction, e.g. ``0.2``) above the baseline, a matching drop in
+    throughput, or any increase in DB round-trips per request.
+    """
+    regressions = []
+    for endpoint, before in baseline.get('endpoints', {}).items():
+        after = current.get('endpoints', {}).get(endpoint)
+        if after is None:
+            regressions.append(f'{endpoint}: missing from the current run')
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if before[metric] and after[metric] > before[metric] * (1 + threshold):
+                regressions.append(f'{endpoint}: {metric} {before[metric]} -> {after[metric]}')
+        if before['throughput_rps'] and after['throughput_rps'] < before['throughput_rps'] / (1 + threshold):
+            regressions.append(
+                f"{endpoint}: throughput_rps {before['throughput_rps']} -> {after['throughput_rps']}"
+            )
+        if after['db_round_trips'] > before['db_round_trips']:
+            regressions.append(
+                f"{endpoint}: db_round_trips {before['db_round_trips']} -> {after['db_round_trips']}"
+            )
+    return regressions
@@ -0,0 +1,100 @@
+"""
+Read-through response cache for read-mostly endpoints.
+
+Cached entries are keyed by a per-resource generation number. Any write to
+a resource replaces its generation, which orphans every cached response
+for it at once; orphaned entries simply expire. The cache backend is the
+Django cache named by ``RESPONSE_CACHE_ALIAS`` (local memory by default,
+Redis when ``REDIS_URL`` is set, see ``settings.py``).
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def get_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def _generation_key(resource):
+    return f'octofit:generation:{resource}'
+
+
+def generation(resource):
+    cache = get_cache()
+    value = cache.get(_generation_key(resource))
+    if value is None:
+        value = time.time_ns()
+        if not cache.add(_generation_key(resource), value, None):
+            value = cache.get(_generation_key(resource), value)
+    return value
+
+
+def invalidate(*resources):
+    """
+    Drop every cached response for the given resources.
+
+    A fresh, time-based generation is used rather than an increment so a
+    generation lost to eviction can never come back and revive old entries.
+    """
+    cache = get_cache()
+    for resource in resources:
+        cache.set(_generation_key(resource), time.time_ns(), None)
+
+
+def content_hash(data):
+    encoded = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+class CachedResponseMixin:
+    """
+    Cache ``list`` and ``retrieve`` responses and answer conditional GETs.
+
+    Responses carry a strong ``ETag`` derived from the response data and
+    the negotiated format; a matching ``If-None-Match`` gets a bodyless 304.
+    Writes made through the viewset invalidate ``cache_resource``.
+    """
+    cache_resource = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        cache = get_cache()
+        path = hashlib.sha1(request.get_full_path().encode('utf-8')).hexdigest()
+        key = f'octofit:response:{self.cache_resource}:{generation(self.cache_resource)}:{path}'
+        entry = cache.get(key)
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = (response.data, content_hash(response.data))
+            cache.set(key, entry, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 30))
+
+        data, digest = entry
+        etag = f'"{digest}-{request.accepted_renderer.format}"'
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response(data, headers={'ETag': etag})
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        invalidate(self.cache_resource)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        invalidate(self.cache_resource)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        invalidate(self.cache_resource)
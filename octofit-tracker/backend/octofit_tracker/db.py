@@ -0,0 +1,94 @@
+"""
+Direct MongoDB access for code paths that need native operators.
+
+djongo translates ORM calls into Mongo queries but cannot express atomic
+updates such as ``$inc``. These helpers hand out the pymongo ``Database``
+that djongo itself is connected to, so raw writes land in the same
+database (including the test database during ``manage.py test``).
+"""
+from django.conf import settings
+from django.db import connections
+from pymongo import MongoClient, ReturnDocument
+
+
+def get_db(alias='default'):
+    """
+    Return the pymongo Database behind the given Django connection.
+    """
+    connection = connections[alias]
+    connection.ensure_connection()
+    return connection.connection
+
+
+def field_value(record, name):
+    """
+    Read ``name`` from a model instance or a raw document.
+    """
+    if isinstance(record, dict):
+        return record.get(name)
+    return getattr(record, name)
+
+
+def client_options(alias='default'):
+    """
+    Return a copy of the pymongo options configured for ``alias``.
+
+    These are ``DATABASES[alias]['CLIENT']``, the same options djongo
+    connects with, so every client shares the pool and timeout settings.
+    """
+    return dict(settings.DATABASES[alias].get('CLIENT', {}))
+
+
+def create_client(options=None, alias='default'):
+    """
+    Create a ``MongoClient`` with ``options`` or the configured options for ``alias``.
+
+    For code that cannot use the Django connection, such as worker
+    processes; pass ``client_options()`` to them rather than settings.
+    """
+    return MongoClient(**(client_options(alias) if options is None else options))
+
+
+def assign_ids(db, collection, documents):
+    """
+    Give ``documents`` the next auto-increment primary keys of ``collection``.
+
+    The keys are reserved in one step from djongo's ``__schema__``
+    collection, exactly as djongo does for a multi-row INSERT, so the
+    documents are addressable through the ORM once inserted.
+    """
+    if not documents:
+        return
+    auto = db['__schema__'].find_one_and_update(
+        {'name': collection, 'auto': {'$exists': True}},
+        {'$inc': {'auto.seq': len(documents)}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if auto:
+        first = auto['auto']['seq'] - len(documents) + 1
+        for offset, document in enumerate(documents):
+            for name in auto['auto']['field_names']:
+                document[name] = first + offset
+
+
+def insert_documents(db, collection, documents):
+    """
+    Insert ``documents`` with a single unordered ``insert_many``, assigning
+    their primary keys with ``assign_ids``.
+    """
+    assign_ids(db, collection, documents)
+    return db[collection].insert_many(documents, ordered=False)
+
+
+def to_document(instance, connection_alias='default'):
+    """
+    Convert an unsaved model instance into the document the ORM would store.
+    """
+    connection = connections[connection_alias]
+    document = {}
+    for field in instance._meta.concrete_fields:
+        if field.primary_key:
+            continue
+        value = field.pre_save(instance, add=True)
+        document[field.column] = field.get_db_prep_save(value, connection)
+    return document
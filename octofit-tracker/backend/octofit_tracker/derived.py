@@ -0,0 +1,201 @@
+"""
+Full rebuild of the data derived from activities.
+
+``rebuild`` recomputes the leaderboard, ``teams.total_points``, team
+statistics, rollups and windowed leaderboards without touching users,
+teams' other fields or activities. Activities are streamed in username
+order and folded into one small tuple per user, so memory grows with the
+number of users rather than activities. With several workers, username
+ranges are folded in parallel processes (``folding``) and their sorted
+runs are k-way merged to assign global ranks.
+
+The new leaderboard is written to a temporary collection with the same
+indexes and then renamed over ``leaderboard`` in one step, so readers see
+either the old board or the new one. Existing rows keep their primary key.
+Incremental updates made while the rebuild runs are overwritten by the
+swap, so run it while activity writes are quiet.
+"""
+import heapq
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.utils import timezone
+from pymongo import UpdateOne
+
+from . import folding, rollups, team_counters, team_stats, windows
+from .cache import invalidate
+from .db import assign_ids, client_options
+from .indexes import copy_indexes
+from .models import Leaderboard
+from .ranking import reset_rank_index
+
+TEMP_COLLECTION = 'leaderboard_rebuild'
+REPORT_EVERY = folding.REPORT_EVERY
+
+# More partitions than workers, so one slow range does not leave cores idle.
+PARTITIONS_PER_WORKER = 4
+
+
+def fold_runs(db, workers=1, batch_size=10000, progress=None):
+    """
+    Return the folded activities as runs sorted by ``rank_key``.
+
+    With one worker this is a single scan. Otherwise usernames are split
+    into ranges that a process pool folds and sorts in parallel;
+    ``progress(count)`` then reports finished partitions.
+    """
+    if workers <= 1:
+        rows = folding.fold_activities(db, folding.range_query(None, None), batch_size=batch_size, progress=progress)
+        rows.sort(key=folding.rank_key)
+        return [rows]
+
+    jobs = [
+        {'client': client_options(), 'database': db.name, 'lower': lower, 'upper': upper, 'batch_size': batch_size}
+        for lower, upper in folding.partition_ranges(db, workers * PARTITIONS_PER_WORKER)
+    ]
+    runs = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for run in executor.map(folding.fold_partition, jobs):
+            runs.append(run)
+            if progress:
+                progress(len(runs))
+    return runs
+
+
+def ranked_rows(db, runs):
+    """
+    Merge sorted runs into one iterator over the new board in rank order.
+
+    Users who already have a leaderboard row but no activities keep a row
+    with zero totals, as the incremental maintenance leaves them. Rows
+    without a string username are dropped.
+    """
+    seen = {row[0] for run in runs for row in run}
+    idle = sorted(
+        (entry['username'], 0, 0, 0, 0)
+        for entry in db.leaderboard.find({}, {'_id': False, 'username': True})
+        if isinstance(entry.get('username'), str) and entry['username'] not in seen
+    )
+    return heapq.merge(*runs, idle, key=folding.rank_key)
+
+
+def write_leaderboard(db, rows, batch_size=1000, progress=None):
+    """
+    Write ``rows`` into a fresh temporary collection and rename it over ``leaderboard``.
+
+    Returns the number of rows and ``{team: total_points}`` for the new
+    board. ``progress(count)`` is called about every ``REPORT_EVERY`` rows
+    and at the end.
+    """
+    profiles = {
+        user['username']: user
+        for user in db.users.find({}, {'_id': False, 'username': True, 'full_name': True, 'team': True})
+    }
+    previous = {
+        entry['username']: entry
+        for entry in db.leaderboard.find({}, {'_id': False, 'username': True, 'id': True, 'full_name': True, 'team': True})
+    }
+    db[TEMP_COLLECTION].drop()
+    copy_indexes(db, 'leaderboard', TEMP_COLLECTION, Leaderboard.mongo_indexes)
+
+    now = timezone.now()
+    team_points = {}
+    batch = []
+    written = 0
+    for rank, (username, points, calories, duration, count) in enumerate(rows, start=1):
+        profile = profiles.get(username) or previous.get(username) or {}
+        team = profile.get('team') or ''
+        document = {
+            'username': username,
+            'full_name': profile.get('full_name') or username,
+            'team': team,
+            'total_points': points,
+            'total_calories': calories,
+            'total_duration_minutes': duration,
+            'total_activities': count,
+            'rank': rank,
+            'updated_at': now,
+        }
+        if username in previous and 'id' in previous[username]:
+            document['id'] = previous[username]['id']
+        batch.append(document)
+        if team:
+            team_points[team] = team_points.get(team, 0) + points
+        if len(batch) >= batch_size:
+            _insert_batch(db, batch)
+            written += len(batch)
+            if progress and written // REPORT_EVERY != (written - len(batch)) // REPORT_EVERY:
+                progress(written)
+            batch = []
+    if batch:
+        _insert_batch(db, batch)
+        written += len(batch)
+    if progress and written % REPORT_EVERY:
+        progress(written)
+
+    if written:
+        db[TEMP_COLLECTION].rename('leaderboard', dropTarget=True)
+    else:
+        db[TEMP_COLLECTION].drop()
+        db.leaderboard.delete_many({})
+    return written, team_points
+
+
+def _insert_batch(db, batch):
+    assign_ids(db, 'leaderboard', [document for document in batch if 'id' not in document])
+    db[TEMP_COLLECTION].insert_many(batch, ordered=False)
+
+
+def update_team_points(db, team_points):
+    """
+    Set every team's ``total_points`` from ``team_points``; teams not in it get 0.
+
+    Unfolded team counter shards are dropped, since they are included.
+    """
+    operations = [
+        UpdateOne({'name': team['name']}, {'$set': {'total_points': team_points.get(team['name'], 0)}})
+        for team in db.teams.find({}, {'_id': False, 'name': True, 'total_points': True})
+        if team.get('total_points') != team_points.get(team['name'], 0)
+    ]
+    if operations:
+        db.teams.bulk_write(operations, ordered=False)
+    team_counters.clear(db)
+    return len(operations)
+
+
+def rebuild(db, batch_size=1000, workers=1, progress=None):
+    """
+    Rebuild all derived data from the activities; returns a summary dict.
+
+    ``workers`` > 1 folds username ranges in that many processes. Each
+    returns a sorted run and the runs are k-way merged to assign ranks.
+    ``progress(stage, count)`` is called as activities (or, in parallel,
+    partitions) are folded and as leaderboard rows are written.
+    """
+    started = time.monotonic()
+    stage = 'activities' if workers <= 1 else 'partitions'
+    runs = fold_runs(
+        db, workers=workers, batch_size=max(batch_size, 1000),
+        progress=partial(progress, stage) if progress else None,
+    )
+    activities = sum(row[4] for run in runs for row in run)
+
+    users, team_points = write_leaderboard(
+        db, ranked_rows(db, runs), batch_size=batch_size,
+        progress=partial(progress, 'leaderboard') if progress else None,
+    )
+    teams_updated = update_team_points(db, team_points)
+    reset_rank_index()
+
+    team_stats.rebuild(db)
+    rollups.rebuild(db, batch_size=batch_size)
+    windows.rebuild_all(db)
+    invalidate('leaderboard', 'teams')
+
+    return {
+        'activities': activities,
+        'users': users,
+        'teams_updated': teams_updated,
+        'seconds': time.monotonic() - started,
+    }
@@ -0,0 +1,51 @@
+"""
+Streaming exports of large collections.
+
+Rows are read from a server-side MongoDB cursor and encoded one batch at a
+time, so memory use depends on the batch size and not on the export size.
+"""
+import csv
+import io
+import json
+
+from .db import get_db
+from .repository import projection_for, representer
+
+
+def stream_documents(collection, query, serializer, export_format, batch_size=1000):
+    """
+    Yield the encoded export of ``collection`` in chunks of ``batch_size`` rows.
+
+    Each value is converted with the matching field of ``serializer`` so rows
+    are identical to what the API returns for the same documents.
+    """
+    names = list(serializer.fields)
+    to_representation = representer(serializer)
+    cursor = get_db()[collection].find(query, projection_for(serializer), batch_size=batch_size).sort('_id', 1)
+
+    buffer = io.StringIO()
+    if export_format == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+
+        def encode(row):
+            writer.writerow(row.values())
+    else:
+        def encode(row):
+            buffer.write(json.dumps(row, ensure_ascii=False, separators=(',', ':')))
+            buffer.write('\n')
+
+    try:
+        pending = 0
+        for document in cursor:
+            encode(to_representation(document))
+            pending += 1
+            if pending >= batch_size:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        cursor.close()
@@ -0,0 +1,98 @@
+"""
+List endpoints served from ``values()`` rows.
+
+With ``OCTOFIT_FAST_JSON`` enabled, ``FastListMixin`` reads the serializer's
+fields straight from the queryset as dicts, so no model instances are
+built, converts only the values whose representation differs from the
+stored value, and renders with ``ORJSONRenderer``. Rows keep the field
+order and formatting of the serializer output, and ``?fields=``/``?omit=``
+apply as usual.
+"""
+from datetime import timezone
+
+from django.conf import settings
+from rest_framework import ISO_8601, serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .renderers import ORJSONRenderer
+
+# Fields whose to_representation returns stored values unchanged.
+PASSTHROUGH_FIELDS = (serializers.CharField, serializers.JSONField, serializers.BooleanField)
+
+
+def utc_isoformat(value):
+    """
+    ``DateTimeField.to_representation`` for ISO 8601 output in UTC.
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    elif value.utcoffset():
+        value = value.astimezone(timezone.utc)
+    text = value.isoformat()
+    return text[:-6] + 'Z' if text.endswith('+00:00') else text
+
+
+def converter(field):
+    if isinstance(field, PASSTHROUGH_FIELDS):
+        return None
+    if isinstance(field, serializers.IntegerField):
+        return int
+    if isinstance(field, serializers.FloatField):
+        return float
+    if isinstance(field, serializers.DateTimeField):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        field_timezone = getattr(field, 'timezone', None) or field.default_timezone()
+        if (
+            output_format and output_format.lower() == ISO_8601
+            and field_timezone is not None and str(field_timezone) == 'UTC'
+        ):
+            return utc_isoformat
+    return field.to_representation
+
+
+def row_converter(serializer):
+    """
+    Return a function turning one ``values()`` dict into a serializer row.
+    """
+    plan = [(name, converter(field)) for name, field in serializer.fields.items()]
+
+    def to_representation(values):
+        row = {}
+        for name, convert in plan:
+            value = values[name]
+            row[name] = value if value is None or convert is None else convert(value)
+        return row
+    return to_representation
+
+
+class FastListMixin:
+    """
+    Serve ``list`` from ``values()`` rows when ``OCTOFIT_FAST_JSON`` is on.
+    """
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if not settings.OCTOFIT_FAST_JSON:
+            return renderers
+        return [
+            ORJSONRenderer() if type(renderer) is JSONRenderer else renderer
+            for renderer in renderers
+        ]
+
+    def list(self, request, *args, **kwargs):
+        if not settings.OCTOFIT_FAST_JSON:
+            return super().list(request, *args, **kwargs)
+
+        serializer = self.get_serializer()
+        names = list(serializer.fields)
+        ordering = getattr(self.paginator, 'ordering', ()) or ()
+        columns = names + [name.lstrip('-') for name in ordering if name.lstrip('-') not in names]
+        queryset = self.filter_queryset(self.get_queryset()).values(*columns)
+        convert = row_converter(serializer)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response([convert(values) for values in page])
+        return Response([convert(values) for values in queryset])
@@ -0,0 +1,132 @@
+"""
+Sparse fieldsets for read endpoints.
+
+``?fields=a,b`` keeps only the listed fields and ``?omit=a,b`` drops them.
+The serializer mixin trims its fields from the request, and the view mixin
+defers the unrequested model fields, so djongo leaves them out of the
+MongoDB projection and they are never fetched or serialized.
+
+List actions also use a read-only copy of the serializer whose
+``to_representation`` runs a precomputed list of field converters instead
+of DRF's generic per-field attribute lookup.
+"""
+from functools import lru_cache
+from operator import attrgetter
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+
+def requested_fields(request, available):
+    """
+    Return the names in ``available`` selected by ``?fields=`` and ``?omit=``.
+    """
+    selected = list(available)
+    for param in ('fields', 'omit'):
+        value = request.query_params.get(param)
+        if value is None:
+            continue
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = sorted(set(names) - set(available))
+        if unknown:
+            raise ValidationError({param: [f"Unknown field(s): {', '.join(unknown)}."]})
+        if param == 'fields':
+            selected = [name for name in selected if name in names]
+        else:
+            selected = [name for name in selected if name not in names]
+    return selected
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Trim the serializer's fields to the request's ``fields``/``omit``.
+
+    Only applies to safe methods so writes always validate every field.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return
+        if 'fields' not in request.query_params and 'omit' not in request.query_params:
+            return
+        keep = set(requested_fields(request, self.fields))
+        for name in list(self.fields):
+            if name not in keep:
+                self.fields.pop(name)
+
+
+class ReadOnlySerializerMixin:
+    """
+    Faster ``to_representation`` for serializers that are only read.
+
+    Every field becomes read-only and each row is built from a converter
+    list prepared once per serializer instance, so ``many=True`` reuses it
+    for the whole page.
+    """
+
+    def get_extra_kwargs(self):
+        extra_kwargs = super().get_extra_kwargs()
+        for field in self.Meta.model._meta.concrete_fields:
+            extra_kwargs.setdefault(field.name, {})['read_only'] = True
+        return extra_kwargs
+
+    def to_representation(self, instance):
+        plan = getattr(self, '_representation_plan', None)
+        if plan is None:
+            plan = self._representation_plan = [
+                (field.field_name, attrgetter(field.source), field.to_representation)
+                for field in self._readable_fields
+            ]
+        row = {}
+        for name, get, convert in plan:
+            value = get(instance)
+            row[name] = None if value is None else convert(value)
+        return row
+
+
+@lru_cache(maxsize=None)
+def read_only_serializer(serializer_class):
+    """
+    Return a cached read-only subclass of ``serializer_class``.
+    """
+    return type(
+        f'ReadOnly{serializer_class.__name__}',
+        (ReadOnlySerializerMixin, serializer_class),
+        {'Meta': type('Meta', (serializer_class.Meta,), {})},
+    )
+
+
+class SparseFieldsetMixin:
+    """
+    Viewset support for ``?fields=``/``?omit=`` and read-only list serializers.
+
+    ``list`` and ``retrieve`` defer the model fields the serializer will not
+    output. Fields the paginator orders by are always loaded, since the
+    cursor is built from them, as are the view's ``sparse_always_load``.
+    """
+    sparse_actions = ('list', 'retrieve')
+    sparse_always_load = ()
+
+    def get_serializer_class(self):
+        serializer_class = super().get_serializer_class()
+        if self.action == 'list':
+            return read_only_serializer(serializer_class)
+        return serializer_class
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in self.sparse_actions or self.request.method not in SAFE_METHODS:
+            return queryset
+        params = self.request.query_params
+        if 'fields' not in params and 'omit' not in params:
+            return queryset
+
+        model_fields = {field.name for field in queryset.model._meta.concrete_fields}
+        wanted = set(self.get_serializer().fields) & model_fields
+        ordering = getattr(self.paginator, 'ordering', ()) or ()
+        wanted.update(name.lstrip('-') for name in ordering)
+        wanted.update(self.sparse_always_load)
+        wanted.add(queryset.model._meta.pk.name)
+        return queryset.only(*wanted)
@@ -0,0 +1,129 @@
+"""
+Server-side query filters.
+
+Filters are applied to the queryset before pagination, so they are
+translated into the MongoDB query rather than evaluated in Python.
+"""
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from . import rollups
+from .models import User
+
+
+def parse_bound(name, value, end=False):
+    """
+    Parse an ISO date or datetime query parameter into an aware datetime.
+
+    A bare date used as an upper bound covers that whole day, so the
+    returned value is the start of the next day and is compared with ``<``.
+    Returns ``(moment, inclusive)``.
+    """
+    try:
+        day = parse_date(value)
+        if day is not None:
+            if end:
+                day += timedelta(days=1)
+            moment = datetime.combine(day, time.min)
+            inclusive = not end
+        else:
+            moment = parse_datetime(value)
+            if moment is None:
+                raise ValueError
+            inclusive = True
+    except ValueError:
+        raise ValidationError({name: 'Enter a valid ISO 8601 date or datetime.'})
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment, inclusive
+
+
+def rollup_params(params):
+    """
+    Parse the user stats ``bucket`` and inclusive ``from``/``to`` date parameters.
+
+    Returns ``(bucket, start, end)`` with ``None`` for missing dates.
+    """
+    bucket = params.get('bucket', 'day')
+    if bucket not in rollups.BUCKETS:
+        raise ValidationError({'bucket': f"Must be one of: {', '.join(rollups.BUCKETS)}."})
+    bounds = []
+    for name in ('from', 'to'):
+        value = params.get(name)
+        day = None
+        if value:
+            try:
+                day = parse_date(value)
+            except ValueError:
+                pass
+            if day is None:
+                raise ValidationError({name: 'Enter a valid date (YYYY-MM-DD).'})
+        bounds.append(day)
+    return bucket, bounds[0], bounds[1]
+
+
+class ActivityFilterBackend(BaseFilterBackend):
+    """
+    Filter activities by ``username``, ``team``, ``activity_type`` and a date range.
+
+    The range is given as ``date_after`` and/or ``date_before``; both ends
+    are inclusive.
+    """
+    exact_params = ('username', 'activity_type')
+
+    def get_filters(self, request, team_members=None):
+        """
+        Return the requested filters as ORM lookups.
+
+        ``team_members`` are the usernames of the requested ``team``; they
+        are looked up through the ORM when not given.
+        """
+        params = request.query_params
+        lookups = {name: params[name] for name in self.exact_params if params.get(name)}
+        if params.get('team'):
+            if team_members is None:
+                team_members = User.objects.filter(team=params['team']).values_list('username', flat=True)
+            lookups['username__in'] = list(team_members)
+        if params.get('date_after'):
+            moment, inclusive = parse_bound('date_after', params['date_after'])
+            lookups['date__gte' if inclusive else 'date__gt'] = moment
+        if params.get('date_before'):
+            moment, inclusive = parse_bound('date_before', params['date_before'], end=True)
+            lookups['date__lte' if inclusive else 'date__lt'] = moment
+        return lookups
+
+    def filter_queryset(self, request, queryset, view):
+        return queryset.filter(**self.get_filters(request))
+
+    def get_mongo_query(self, request, team_members=None):
+        """
+        Return the requested filters as a MongoDB query document.
+        """
+        return mongo_query(self.get_filters(request, team_members))
+
+
+MONGO_OPERATORS = {
+    'in': '$in',
+    'gt': '$gt',
+    'gte': '$gte',
+    'lt': '$lt',
+    'lte': '$lte',
+}
+
+
+def mongo_query(lookups):
+    """
+    Translate simple ORM lookups (``field`` or ``field__op``) into a query document.
+    """
+    query = {}
+    for lookup, value in lookups.items():
+        field, _, operator = lookup.partition('__')
+        if operator:
+            query.setdefault(field, {})[MONGO_OPERATORS[operator]] = value
+        else:
+            query[field] = value
+    return query
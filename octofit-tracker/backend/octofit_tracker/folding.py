@@ -0,0 +1,105 @@
+"""
+Folding activities into per-user totals, serially or by username range.
+
+Rows are ``(username, points, calories, duration, activities)`` tuples.
+``fold_partition`` runs in a worker process: like ``synthetic`` it opens its
+own client from options passed in the job and needs no Django setup, and it
+returns its users already sorted in leaderboard order so the caller only
+has to merge the runs.
+"""
+from .db import create_client
+
+REPORT_EVERY = 100000
+PROJECTION = {'_id': False, 'username': True, 'points': True, 'calories_burned': True, 'duration_minutes': True}
+
+
+def rank_key(row):
+    """
+    Leaderboard order of a folded row: ``(-total_points, username)``.
+    """
+    return -row[1], row[0]
+
+
+def fold_activities(db, query=None, batch_size=10000, progress=None):
+    """
+    Return the folded rows of the activities matching ``query``, in username order.
+
+    Activities without a string username are skipped, so rows always sort.
+    ``progress(count)`` is called every ``REPORT_EVERY`` activities and at the end.
+    """
+    cursor = db.activities.find(query or {}, PROJECTION).sort('username', 1).batch_size(batch_size)
+
+    totals = []
+    current = None
+    count = 0
+    for activity in cursor:
+        username = activity.get('username')
+        if not isinstance(username, str):
+            continue
+        if current is None or current[0] != username:
+            if current is not None:
+                totals.append(tuple(current))
+            current = [username, 0, 0, 0, 0]
+        current[1] += activity.get('points') or 0
+        current[2] += activity.get('calories_burned') or 0
+        current[3] += activity.get('duration_minutes') or 0
+        current[4] += 1
+        count += 1
+        if progress and count % REPORT_EVERY == 0:
+            progress(count)
+    if current is not None:
+        totals.append(tuple(current))
+    if progress and count % REPORT_EVERY:
+        progress(count)
+    return totals
+
+
+def partition_ranges(db, partitions, samples_per_partition=1000):
+    """
+    Split usernames into about ``partitions`` contiguous ``(lower, upper)`` ranges.
+
+    Boundaries are quantiles of a ``$sample`` of activities, so partitions
+    hold similar numbers of activities and each one is a single range scan
+    of the username index. ``None`` means unbounded. Only string usernames
+    fall in a range, the same activities a serial ``fold_activities`` keeps.
+    """
+    if partitions <= 1:
+        return [(None, None)]
+    sample = sorted(
+        document['username']
+        for document in db.activities.aggregate([
+            {'$sample': {'size': partitions * samples_per_partition}},
+            {'$project': {'_id': False, 'username': True}},
+        ])
+        if isinstance(document.get('username'), str)
+    )
+    bounds = sorted({sample[len(sample) * i // partitions] for i in range(1, partitions)}) if sample else []
+    edges = [None] + bounds + [None]
+    return list(zip(edges, edges[1:]))
+
+
+def range_query(lower, upper):
+    condition = {'$type': 'string'}
+    if lower is not None:
+        condition['$gte'] = lower
+    if upper is not None:
+        condition['$lt'] = upper
+    return {'username': condition}
+
+
+def fold_partition(job):
+    """
+    Fold one username range and return its rows sorted by ``rank_key``.
+
+    ``job`` is a plain dict (``client``, ``database``, ``lower``, ``upper``,
+    ``batch_size``) so it can be sent to a worker process.
+    """
+    client = create_client(job['client'])
+    try:
+        rows = fold_activities(
+            client[job['database']], range_query(job['lower'], job['upper']), batch_size=job['batch_size']
+        )
+    finally:
+        client.close()
+    rows.sort(key=rank_key)
+    return rows
@@ -0,0 +1,84 @@
+"""
+Declarative MongoDB index definitions.
+
+Models list the indexes their queries rely on in a ``mongo_indexes``
+attribute; ``manage.py sync_indexes`` creates and verifies them. Keys are
+field names, prefixed with ``-`` for descending order. Indexes on list
+fields (``JSONField(default=list)``) become multikey automatically.
+"""
+from pymongo import ASCENDING, DESCENDING
+
+
+class MongoIndex:
+    """
+    A single index declaration.
+    """
+
+    def __init__(self, *fields, name=None, unique=False, sparse=False, expire_after_seconds=None):
+        if not fields:
+            raise ValueError('MongoIndex requires at least one field.')
+        self.keys = [
+            (field[1:], DESCENDING) if field.startswith('-') else (field, ASCENDING)
+            for field in fields
+        ]
+        self.name = name or '_'.join(f'{field}_{direction}' for field, direction in self.keys)
+        self.unique = unique
+        self.sparse = sparse
+        self.expire_after_seconds = expire_after_seconds
+
+    def __repr__(self):
+        return f'<MongoIndex {self.name}>'
+
+    def options(self):
+        """
+        Options compared against the live index, in ``index_information()`` form.
+        """
+        options = {}
+        if self.unique:
+            options['unique'] = True
+        if self.sparse:
+            options['sparse'] = True
+        if self.expire_after_seconds is not None:
+            options['expireAfterSeconds'] = self.expire_after_seconds
+        return options
+
+    def create_kwargs(self):
+        kwargs = {'name': self.name, 'background': True}
+        kwargs.update(self.options())
+        return kwargs
+
+    def key_matches(self, info):
+        live = [
+            (field, direction if isinstance(direction, str) else int(direction))
+            for field, direction in info['key']
+        ]
+        return live == self.keys
+
+    def differences(self, info):
+        """
+        Return ``{option: (declared, live)}`` for options that disagree.
+        """
+        declared = self.options()
+        live = {name: info[name] for name in ('unique', 'sparse', 'expireAfterSeconds') if info.get(name)}
+        return {
+            name: (declared.get(name), live.get(name))
+            for name in set(declared) | set(live)
+            if declared.get(name) != live.get(name)
+        }
+
+
+INDEX_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression')
+
+
+def copy_indexes(db, source, target, declared=()):
+    """
+    Create ``source``'s secondary indexes on ``target`` (the ``declared`` ones if ``source`` has none).
+    """
+    live = {name: info for name, info in db[source].index_information().items() if name != '_id_'}
+    if not live:
+        for index in declared:
+            db[target].create_index(index.keys, **index.create_kwargs())
+        return
+    for name, info in live.items():
+        options = {option: info[option] for option in INDEX_OPTIONS if option in info}
+        db[target].create_index(list(info['key']), name=name, **options)
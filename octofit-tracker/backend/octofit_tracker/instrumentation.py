@@ -0,0 +1,225 @@
+"""
+Per-request timing and metrics.
+
+``ServerTimingMiddleware`` splits each request into phases:
+
+- ``db-sql``: djongo's SQL parsing and translation (time inside cursor
+  ``execute`` that was not spent waiting on MongoDB)
+- ``db-mongo``: MongoDB round-trips, measured by pymongo command events
+- ``app``: view and serializer code, excluding the two DB phases
+- ``render``: response rendering, i.e. JSON encoding for API responses
+
+The breakdown is sent as a ``Server-Timing`` header and a structured log
+line, and folded into per-route histograms that ``/metrics`` exposes in
+the Prometheus text format, along with the MongoDB connection pool metrics
+from ``monitoring.pool_monitor``. Metrics are kept per worker process.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+
+from django.db import connection
+
+from . import monitoring
+
+logger = logging.getLogger('octofit.requests')
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class MetricsRegistry:
+    """
+    Thread-safe per-route latency histograms and phase counters.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = defaultdict(lambda: [0] * (len(BUCKETS) + 1))
+        self._counts = defaultdict(int)
+        self._sums = defaultdict(float)
+        self._phases = defaultdict(float)
+        self._queries = defaultdict(int)
+        self._commands = defaultdict(int)
+        self._collectors = []
+
+    def observe(self, route, total, phases, queries, commands):
+        with self._lock:
+            self._buckets[route][bisect_left(BUCKETS, total)] += 1
+            self._counts[route] += 1
+            self._sums[route] += total
+            for phase, seconds in phases.items():
+                self._phases[route, phase] += seconds
+            self._queries[route] += queries
+            self._commands[route] += commands
+
+    def add_collector(self, collector):
+        """
+        Register a callable returning extra lines of exposition text.
+        """
+        self._collectors.append(collector)
+
+    def render(self):
+        with self._lock:
+            lines = [
+                '# HELP octofit_request_duration_seconds Request latency by route.',
+                '# TYPE octofit_request_duration_seconds histogram',
+            ]
+            for route in sorted(self._counts):
+                cumulative = 0
+                for bound, count in zip(BUCKETS + (float('inf'),), self._buckets[route]):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'octofit_request_duration_seconds_bucket{{route="{route}",le="{le}"}} {cumulative}')
+                lines.append(f'octofit_request_duration_seconds_sum{{route="{route}"}} {self._sums[route]:.6f}')
+                lines.append(f'octofit_request_duration_seconds_count{{route="{route}"}} {self._counts[route]}')
+
+            lines.append('# HELP octofit_request_phase_seconds_total Time spent per request phase.')
+            lines.append('# TYPE octofit_request_phase_seconds_total counter')
+            for (route, phase), seconds in sorted(self._phases.items()):
+                lines.append(f'octofit_request_phase_seconds_total{{route="{route}",phase="{phase}"}} {seconds:.6f}')
+
+            lines.append('# HELP octofit_db_queries_total SQL statements executed through djongo.')
+            lines.append('# TYPE octofit_db_queries_total counter')
+            for route, count in sorted(self._queries.items()):
+                lines.append(f'octofit_db_queries_total{{route="{route}"}} {count}')
+
+            lines.append('# HELP octofit_mongo_commands_total MongoDB commands sent.')
+            lines.append('# TYPE octofit_mongo_commands_total counter')
+            for route, count in sorted(self._commands.items()):
+                lines.append(f'octofit_mongo_commands_total{{route="{route}"}} {count}')
+            collectors = list(self._collectors)
+
+        for collector in collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+registry.add_collector(monitoring.pool_monitor.exposition)
+
+
+class RequestTiming:
+    """
+    Phase timings collected while one request is handled.
+    """
+
+    def __init__(self):
+        self.sql_seconds = 0.0
+        self.queries = 0
+        self.view_done = None
+        self.render_done = None
+
+
+_timing = ContextVar('octofit_request_timing', default=None)
+
+
+class ServerTimingMiddleware:
+    """
+    Time request phases, add ``Server-Timing`` and record metrics.
+
+    Should be the first entry in ``MIDDLEWARE`` so ``total`` covers the
+    whole stack. Under ASGI the DB and render phases happen on other
+    threads (djongo in the sync view adapter, motor in its executor), so
+    async requests report only ``app`` and ``total``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.timer = monitoring.install()
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Lets Django see this instance as a coroutine function (Django 4.1).
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        timing = RequestTiming()
+        token = _timing.set(timing)
+        self.timer.reset()
+        try:
+            started = time.perf_counter()
+            with connection.execute_wrapper(self.time_query):
+                response = self.get_response(request)
+            total = time.perf_counter() - started
+        finally:
+            _timing.reset(token)
+
+        commands, mongo_us = self.timer.snapshot()
+        mongo = mongo_us / 1e6
+        render = 0.0
+        if timing.view_done is not None and timing.render_done is not None:
+            render = timing.render_done - timing.view_done
+        phases = {
+            'db-sql': timing.sql_seconds,
+            'db-mongo': mongo,
+            'app': max(total - render - timing.sql_seconds - mongo, 0.0),
+            'render': render,
+        }
+        return self.record(request, response, total, phases, timing.queries, commands)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        total = time.perf_counter() - started
+        return self.record(request, response, total, {'app': total}, 0, 0)
+
+    def record(self, request, response, total, phases, queries, commands):
+        """
+        Add the ``Server-Timing`` header, update the metrics and log the request.
+        """
+        response['Server-Timing'] = ', '.join(
+            [f'{phase};dur={seconds * 1000:.2f}' for phase, seconds in phases.items()]
+            + [f'total;dur={total * 1000:.2f};desc="{queries} queries, {commands} mongo commands"']
+        )
+
+        match = request.resolver_match
+        route = match.view_name if match else 'unmatched'
+        if route != 'metrics':
+            registry.observe(route, total, phases, queries, commands)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'route': route,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 2),
+                'phases_ms': {phase: round(seconds * 1000, 2) for phase, seconds in phases.items()},
+                'queries': queries,
+                'mongo_commands': commands,
+            }))
+        return response
+
+    def process_template_response(self, request, response):
+        timing = _timing.get()
+        if timing is not None:
+            timing.view_done = time.perf_counter()
+            response.add_post_render_callback(lambda response: self._render_done(timing))
+        return response
+
+    def _render_done(self, timing):
+        timing.render_done = time.perf_counter()
+
+    def time_query(self, execute, sql, params, many, context):
+        """
+        ``execute_wrapper`` hook: time spent in execute minus MongoDB time.
+        """
+        _, mongo_before = self.timer.snapshot()
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            _, mongo_after = self.timer.snapshot()
+            timing = _timing.get()
+            if timing is not None:
+                timing.queries += 1
+                timing.sql_seconds += max(elapsed - (mongo_after - mongo_before) / 1e6, 0.0)
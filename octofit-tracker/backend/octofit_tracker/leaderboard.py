@@ -0,0 +1,203 @@
+"""
+Incremental maintenance of the leaderboard and team totals.
+
+Every activity write is turned into a per-user delta that is applied with a
+single ``$inc`` on the user's ``leaderboard`` document and on their team;
+team statistics, the per-user rollups and the windowed leaderboards are
+updated in the same pass.
+Ranks follow the order ``(-total_points, username)``; after a user's points
+change, only the rows between the old and the new rank are shifted.
+
+The increment and re-rank run under a per-process lock, so writers in one
+process cannot interleave their shifts. Writers in different processes
+still can, and two first uploads in different processes can create rows
+with the same starting rank, which may leave duplicate or out-of-order
+ranks; the user's own rank is only set if no other writer moved it
+meanwhile. ``rebuild_derived`` reconciles the stored ranks, and
+``OCTOFIT_REPOSITORY_READS`` computes them at read time instead. Rows are
+unique per username: the unique index is created before the first row is
+added, so a concurrent duplicate insert fails and is retried as an update.
+"""
+import threading
+from collections import defaultdict
+
+from django.db import DatabaseError
+from django.utils import timezone
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
+
+from . import live, ranking, rollups, team_counters, team_stats, windows
+from .cache import invalidate
+from .db import field_value, get_db
+from .models import Leaderboard
+
+TOTAL_FIELDS = (
+    'total_points',
+    'total_calories',
+    'total_duration_minutes',
+    'total_activities',
+)
+
+_rank_lock = threading.Lock()
+_username_index_ready = False
+
+
+def activity_delta(activity, sign=1):
+    """
+    Return the leaderboard totals contributed by a single activity.
+    """
+    return {
+        'total_points': sign * (field_value(activity, 'points') or 0),
+        'total_calories': sign * (field_value(activity, 'calories_burned') or 0),
+        'total_duration_minutes': sign * (field_value(activity, 'duration_minutes') or 0),
+        'total_activities': sign,
+    }
+
+
+def collect_deltas(added=(), removed=()):
+    """
+    Fold added and removed activities into one delta per username.
+    """
+    deltas = defaultdict(lambda: dict.fromkeys(TOTAL_FIELDS, 0))
+    for activities, sign in ((added, 1), (removed, -1)):
+        for activity in activities:
+            totals = deltas[field_value(activity, 'username')]
+            for field, amount in activity_delta(activity, sign).items():
+                totals[field] += amount
+    return {
+        username: totals
+        for username, totals in deltas.items()
+        if any(totals.values())
+    }
+
+
+def apply_activity_changes(added=(), removed=()):
+    """
+    Apply the effect of created, updated or deleted activities.
+
+    An update is expressed as the previous version in ``removed`` and the new
+    version in ``added``. Deltas are coalesced so each affected user is
+    touched once, however many activities were written.
+    """
+    added, removed = list(added), list(removed)
+    if not added and not removed:
+        return
+    deltas = collect_deltas(added, removed)
+    db = get_db()
+    user_teams = {}
+    events = []
+    for username, delta in deltas.items():
+        user_teams[username] = apply_delta(db, username, delta, events).get('team')
+
+    # Users whose totals did not change may still need their per-type stats moved.
+    others = {field_value(activity, 'username') for activity in added + removed} - set(user_teams)
+    if others:
+        for entry in db.leaderboard.find({'username': {'$in': list(others)}}, {'username': True, 'team': True}):
+            user_teams[entry['username']] = entry.get('team')
+    team_stats.apply_changes(db, user_teams, deltas, added, removed)
+    # Windows first: a window built on first use reads the rollups, which
+    # must not include these activities yet.
+    windows.apply_changes(db, user_teams, added, removed)
+    rollups.apply_changes(db, added, removed)
+    live.publish(db, events)
+    invalidate('leaderboard', 'teams')
+
+
+def apply_delta(db, username, delta, events=None):
+    """
+    Atomically add ``delta`` to a user's totals, then fix up ranks and team.
+
+    When ``events`` is a list, the user's rank change is appended to it for
+    the live leaderboard.
+    """
+    points = delta.get('total_points', 0)
+    with _rank_lock:
+        before = _increment(db, username, delta)
+        created = before is None
+        if created:
+            _create_entry(db, username)
+            before = _increment(db, username, delta)
+        if points or created:
+            total_points = before['total_points'] + points
+            new_rank = _rerank(db, username, before['rank'], total_points)
+
+    if points or created:
+        ranking.record_points(username, total_points)
+        if events is not None:
+            events.append({
+                'username': username,
+                'total_points': total_points,
+                'old_rank': None if created else before['rank'],
+                'new_rank': new_rank,
+            })
+    if points and before.get('team'):
+        team_counters.increment(db, before['team'], points)
+    return before
+
+
+def _increment(db, username, delta):
+    return db.leaderboard.find_one_and_update(
+        {'username': username},
+        {'$inc': delta, '$set': {'updated_at': timezone.now()}},
+        projection={'_id': False, 'total_points': True, 'rank': True, 'team': True},
+        return_document=ReturnDocument.BEFORE,
+    )
+
+
+def _create_entry(db, username):
+    """
+    Add a zeroed leaderboard row for a user who has no activities yet.
+
+    The row is created through the ORM so it gets a primary key like any
+    other row, and starts one place below the current last rank.
+    """
+    global _username_index_ready
+    if not _username_index_ready:
+        index = next(index for index in Leaderboard.mongo_indexes if index.unique)
+        try:
+            db.leaderboard.create_index(index.keys, **index.create_kwargs())
+        except OperationFailure:
+            # Already there under another name, or duplicates need ``rebuild_derived`` first.
+            pass
+        _username_index_ready = True
+    user = db.users.find_one({'username': username}, {'full_name': True, 'team': True}) or {}
+    try:
+        Leaderboard.objects.create(
+            username=username,
+            full_name=user.get('full_name') or username,
+            team=user.get('team') or '',
+            rank=db.leaderboard.count_documents({}) + 1,
+        )
+    except DatabaseError:
+        # Another writer created the row first; the caller retries the $inc.
+        pass
+
+
+def _rerank(db, username, old_rank, points):
+    """
+    Move a user from ``old_rank`` to the rank implied by ``points``.
+
+    Only rows whose rank lies between the old and the new position are
+    shifted, so the cost is proportional to how far the user moved. Callers
+    hold ``_rank_lock``.
+    """
+    new_rank = db.leaderboard.count_documents({
+        'username': {'$ne': username},
+        '$or': [
+            {'total_points': {'$gt': points}},
+            {'total_points': points, 'username': {'$lt': username}},
+        ],
+    }) + 1
+    if new_rank < old_rank:
+        db.leaderboard.update_many(
+            {'rank': {'$gte': new_rank, '$lt': old_rank}, 'username': {'$ne': username}},
+            {'$inc': {'rank': 1}},
+        )
+    elif new_rank > old_rank:
+        db.leaderboard.update_many(
+            {'rank': {'$gt': old_rank, '$lte': new_rank}, 'username': {'$ne': username}},
+            {'$inc': {'rank': -1}},
+        )
+    if new_rank != old_rank:
+        db.leaderboard.update_one({'username': username, 'rank': old_rank}, {'$set': {'rank': new_rank}})
+    return new_rank
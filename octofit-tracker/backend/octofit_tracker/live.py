@@ -0,0 +1,299 @@
+"""
+Live leaderboard updates.
+
+Every rank change made by the incremental leaderboard maintenance is
+published as a small event in ``leaderboard_events`` (expired by a TTL
+index). Each process runs one ``LiveHub`` thread that polls for new events
+once per tick, coalesces them per user and hands the batch to every
+subscriber, so a burst of uploads becomes one message per tick.
+
+Subscribers receive an initial snapshot of the board and then ``delta``
+messages, lists of ``{username, total_points, old_rank, new_rank}``.
+``old_rank`` is ``None`` for a user who just joined the board. Clients
+should re-sort on ``(-total_points, username)`` rather than shift rows by
+rank, which keeps applying a delta idempotent.
+
+The SSE stream is served by a DRF action under WSGI (one thread per
+client) and by ``LiveLeaderboardApp`` under ASGI, which also accepts
+WebSocket connections and holds no thread per client. Because a WSGI
+worker is tied up for as long as a client stays connected, the frontend
+only subscribes when built with ``REACT_APP_LEADERBOARD_LIVE=true``, which
+should be set only for ASGI deployments. Snapshots hold at most
+``LEADERBOARD_LIVE_SNAPSHOT_LIMIT`` rows.
+"""
+import asyncio
+import json
+import queue
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from bson import ObjectId
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .db import get_db
+from .models import Leaderboard
+from .serializers import LeaderboardSerializer
+
+COLLECTION = 'leaderboard_events'
+SSE_PATH = '/api/leaderboard/live/'
+WEBSOCKET_PATH = '/ws/leaderboard/'
+
+# Event ids are generated by each writer process, so only events at least
+# this old are read; newer ones could still be overtaken by another writer.
+SETTLE_SECONDS = 1
+
+
+def publish(db, events):
+    """
+    Record rank changes; ``events`` are dicts with the delta message fields.
+    """
+    if events:
+        now = timezone.now()
+        db[COLLECTION].insert_many([dict(event, created_at=now) for event in events], ordered=False)
+
+
+def coalesce(events):
+    """
+    Merge events per user: the first ``old_rank`` and the latest points and rank.
+    """
+    merged = {}
+    for event in events:
+        username = event['username']
+        if username in merged:
+            merged[username].update(total_points=event['total_points'], new_rank=event['new_rank'])
+        else:
+            merged[username] = {
+                'username': username,
+                'total_points': event['total_points'],
+                'old_rank': event.get('old_rank'),
+                'new_rank': event['new_rank'],
+            }
+    return sorted(merged.values(), key=lambda delta: (delta['new_rank'], delta['username']))
+
+
+def parse_limit(value):
+    """
+    Parse a ``limit`` parameter, capped at ``LEADERBOARD_LIVE_SNAPSHOT_LIMIT``.
+
+    0 or ``None`` means the cap. Raises ``ValueError`` with the
+    client-facing message if it is not a non-negative integer.
+    """
+    cap = getattr(settings, 'LEADERBOARD_LIVE_SNAPSHOT_LIMIT', 100)
+    if value is None:
+        return cap
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('A valid integer is required.')
+    if limit < 0:
+        raise ValueError('Ensure this value is greater than or equal to 0.')
+    return min(limit, cap) if limit else cap
+
+
+def snapshot(limit=None):
+    """
+    Return the current board (the top ``limit`` rows if given), ordered by rank.
+    """
+    entries = Leaderboard.objects.order_by('rank')
+    if limit:
+        entries = entries[:limit]
+    return LeaderboardSerializer(entries, many=True).data
+
+
+def sse_message(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+class LiveHub:
+    """
+    Per-process event poller fanning coalesced deltas out to subscribers.
+
+    The polling thread starts with the first subscriber and stops after the
+    last one leaves. Callbacks run on that thread and must not block.
+    """
+
+    def __init__(self, tick=None):
+        self.tick = tick
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, callback):
+        """
+        Call ``callback(deltas)`` for each coalesced batch; returns an unsubscribe function.
+        """
+        with self._lock:
+            self._subscribers.add(callback)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='leaderboard-live', daemon=True)
+                self._thread.start()
+
+        def unsubscribe():
+            with self._lock:
+                self._subscribers.discard(callback)
+        return unsubscribe
+
+    def _run(self):
+        tick = self.tick or getattr(settings, 'LEADERBOARD_LIVE_TICK', 1.0)
+        last_id = self._settled_id()
+        try:
+            db = get_db()
+            while True:
+                time.sleep(tick)
+                with self._lock:
+                    if not self._subscribers:
+                        self._thread = None
+                        return
+                    subscribers = list(self._subscribers)
+                settled = self._settled_id()
+                events = list(db[COLLECTION].find({'_id': {'$gt': last_id, '$lt': settled}}).sort('_id', 1))
+                if not events:
+                    continue
+                last_id = events[-1]['_id']
+                deltas = coalesce(events)
+                for callback in subscribers:
+                    callback(deltas)
+        finally:
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+            connections.close_all()
+
+    @staticmethod
+    def _settled_id():
+        return ObjectId.from_datetime(timezone.now() - timedelta(seconds=SETTLE_SECONDS))
+
+
+hub = LiveHub()
+
+
+def heartbeat_seconds():
+    return getattr(settings, 'LEADERBOARD_LIVE_HEARTBEAT', 15)
+
+
+def stream_events(limit=None):
+    """
+    Blocking SSE generator for the WSGI view.
+    """
+    deltas = queue.Queue()
+    unsubscribe = hub.subscribe(deltas.put)
+    try:
+        yield sse_message('snapshot', snapshot(limit))
+        while True:
+            try:
+                yield sse_message('delta', deltas.get(timeout=heartbeat_seconds()))
+            except queue.Empty:
+                yield ': ping\n\n'
+    finally:
+        unsubscribe()
+
+
+class LiveLeaderboardApp:
+    """
+    ASGI wrapper serving the live stream itself and passing everything else on.
+
+    ``GET /api/leaderboard/live/`` streams SSE and ``/ws/leaderboard/``
+    speaks WebSocket with the same JSON messages (``{"event", "data"}``).
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == SSE_PATH:
+            return await self.serve_sse(scope, receive, send)
+        if scope['type'] == 'websocket' and scope['path'] == WEBSOCKET_PATH:
+            return await self.serve_websocket(scope, receive, send)
+        return await self.application(scope, receive, send)
+
+    async def deltas(self):
+        loop = asyncio.get_running_loop()
+        batches = asyncio.Queue()
+        unsubscribe = hub.subscribe(lambda deltas: loop.call_soon_threadsafe(batches.put_nowait, deltas))
+        return batches, unsubscribe
+
+    async def until_disconnect(self, receive, disconnect_types):
+        while (await receive())['type'] not in disconnect_types:
+            pass
+
+    async def pump(self, receive, disconnect_types, batches, emit):
+        """
+        Emit deltas (or ``None`` heartbeats) until the client disconnects.
+        """
+        disconnected = asyncio.ensure_future(self.until_disconnect(receive, disconnect_types))
+        try:
+            while not disconnected.done():
+                waiter = asyncio.ensure_future(batches.get())
+                done, _ = await asyncio.wait(
+                    {waiter, disconnected}, timeout=heartbeat_seconds(), return_when=asyncio.FIRST_COMPLETED
+                )
+                if waiter in done:
+                    await emit(waiter.result())
+                else:
+                    waiter.cancel()
+                    if not disconnected.done():
+                        await emit(None)
+        finally:
+            disconnected.cancel()
+
+    @staticmethod
+    def limit(scope):
+        """
+        Parse ``?limit=`` from the query string; raises ``ValueError`` if invalid.
+        """
+        values = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('limit')
+        return parse_limit(values[-1] if values else None)
+
+    async def serve_sse(self, scope, receive, send):
+        try:
+            limit = self.limit(scope)
+        except ValueError as exc:
+            body = json.dumps({'limit': str(exc)}).encode()
+            await send({'type': 'http.response.start', 'status': 400, 'headers': [(b'content-type', b'application/json')]})
+            await send({'type': 'http.response.body', 'body': body})
+            return
+        headers = [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]
+        if getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False):
+            headers.append((b'access-control-allow-origin', b'*'))
+        batches, unsubscribe = await self.deltas()
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+            data = await sync_to_async(snapshot)(limit)
+            await send({'type': 'http.response.body', 'body': sse_message('snapshot', data).encode(), 'more_body': True})
+
+            async def emit(deltas):
+                message = ': ping\n\n' if deltas is None else sse_message('delta', deltas)
+                await send({'type': 'http.response.body', 'body': message.encode(), 'more_body': True})
+            await self.pump(receive, {'http.disconnect'}, batches, emit)
+        finally:
+            unsubscribe()
+
+    async def serve_websocket(self, scope, receive, send):
+        if (await receive())['type'] != 'websocket.connect':
+            return
+        try:
+            limit = self.limit(scope)
+        except ValueError:
+            await send({'type': 'websocket.close', 'code': 1008})
+            return
+        batches, unsubscribe = await self.deltas()
+        try:
+            await send({'type': 'websocket.accept'})
+            data = await sync_to_async(snapshot)(limit)
+            await send({'type': 'websocket.send', 'text': json.dumps({'event': 'snapshot', 'data': data})})
+
+            async def emit(deltas):
+                if deltas is not None:
+                    await send({'type': 'websocket.send', 'text': json.dumps({'event': 'delta', 'data': deltas})})
+            await self.pump(receive, {'websocket.disconnect'}, batches, emit)
+        finally:
+            unsubscribe()
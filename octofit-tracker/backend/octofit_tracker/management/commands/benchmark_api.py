@@ -0,0 +1,130 @@
+import json
+import platform
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from octofit_tracker import benchmarks, monitoring
+from octofit_tracker.cache import get_cache
+from octofit_tracker.db import get_db
+from octofit_tracker.models import Workout
+
+ENDPOINTS = ['users', 'teams', 'activities', 'leaderboard', 'workouts']
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway database and benchmark every API endpoint, '
+        'optionally comparing against a saved baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Synthetic users to seed (0 for the sample data)')
+        parser.add_argument('--activities-per-user', type=int, default=20)
+        parser.add_argument('--teams', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--workers', type=int, default=1, help='Seeding processes')
+        parser.add_argument('--requests', type=int, default=50, help='Measured requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per endpoint')
+        parser.add_argument(
+            '--warm-cache',
+            action='store_true',
+            help='Keep the response cache between requests instead of measuring cold reads',
+        )
+        parser.add_argument('--output', help='Write results to this JSON file (e.g. a new baseline)')
+        parser.add_argument('--compare', help='Baseline JSON file to compare against')
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.2,
+            help='Allowed slowdown as a fraction of the baseline (default 0.2 = 20%%)',
+        )
+        parser.add_argument('--keepdb', action='store_true', help='Keep the benchmark database afterwards')
+
+    def handle(self, *args, **options):
+        timer = monitoring.install()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            self.seed(options)
+            results = self.run(options, timer)
+        finally:
+            if not options['keepdb']:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Wrote results to {options['output']}"))
+
+        if options['compare']:
+            with open(options['compare']) as handle:
+                baseline = json.load(handle)
+            regressions = benchmarks.compare(baseline, results, options['threshold'])
+            if regressions:
+                for regression in regressions:
+                    self.stdout.write(self.style.ERROR(f'Regression {regression}'))
+                raise CommandError(f'{len(regressions)} benchmark regressions against {options["compare"]}')
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def seed(self, options):
+        call_command(
+            'populate_db',
+            users=options['users'],
+            activities_per_user=options['activities_per_user'],
+            teams=options['teams'],
+            seed=options['seed'],
+            workers=options['workers'],
+            stdout=self.stdout,
+        )
+        if not Workout.objects.exists():
+            for index in range(5):
+                Workout.objects.create(
+                    name=f'Benchmark Workout {index}',
+                    description='Seeded for benchmarking',
+                    difficulty='intermediate',
+                    duration_minutes=45,
+                    exercises=[{'name': 'Squats', 'sets': 3, 'reps': 12}],
+                    target_muscles=['legs'],
+                )
+
+    def run(self, options, timer):
+        db = get_db()
+        client = APIClient()
+        before_request = None if options['warm_cache'] else get_cache().clear
+        paths = {}
+        for endpoint in ENDPOINTS:
+            paths[f'{endpoint}-list'] = f'/api/{endpoint}/'
+            document = db[endpoint].find_one({'id': {'$exists': True}}, {'id': True})
+            if document:
+                paths[f'{endpoint}-detail'] = f"/api/{endpoint}/{document['id']}/"
+
+        results = {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'users': options['users'],
+                'activities_per_user': options['activities_per_user'],
+                'teams': options['teams'],
+                'seed': options['seed'],
+                'requests': options['requests'],
+                'warm_cache': options['warm_cache'],
+            },
+            'endpoints': {},
+        }
+        with override_settings(ALLOWED_HOSTS=['*'], DEBUG=False):
+            for name, path in paths.items():
+                for _ in range(options['warmup']):
+                    client.get(path)
+                summary = benchmarks.run_endpoint(client, path, options['requests'], timer, before_request)
+                results['endpoints'][name] = summary
+                self.stdout.write(
+                    f"{name:<22} p50 {summary['p50_ms']:>9.2f}ms  p95 {summary['p95_ms']:>9.2f}ms  "
+                    f"p99 {summary['p99_ms']:>9.2f}ms  {summary['throughput_rps']:>8.1f} req/s  "
+                    f"{summary['db_round_trips']:>6.2f} db/req"
+                )
+        return results
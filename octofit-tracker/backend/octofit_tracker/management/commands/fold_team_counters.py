@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from octofit_tracker import team_counters
+from octofit_tracker.db import get_db
+
+
+class Command(BaseCommand):
+    help = 'Fold the sharded team point counters into teams.total_points'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep folding every this many seconds instead of once',
+        )
+
+    def handle(self, *args, **options):
+        db = get_db()
+        while True:
+            teams = team_counters.fold(db)
+            self.stdout.write(self.style.SUCCESS(f'Folded counters for {teams} teams'))
+            if options['interval'] <= 0:
+                return
+            time.sleep(options['interval'])
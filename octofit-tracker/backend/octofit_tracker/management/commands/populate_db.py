@@ -1,16 +1,39 @@
+from django.conf import settings
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
-from pymongo import MongoClient
+from octofit_tracker import derived, rollups, scoring, team_counters, team_stats, synthetic, windows
+from octofit_tracker.db import client_options, get_db, insert_documents
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+import math
+import os
 import random
+import time
 
 
 class Command(BaseCommand):
     help = 'Populate the octofit_db database with test data'
 
+    # Team.members is stored inline; large synthetic teams keep a sample so
+    # documents stay well below MongoDB's 16MB limit.
+    max_team_members = 10000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            help='Generate this many synthetic users instead of the superhero sample data',
+        )
+        parser.add_argument('--activities-per-user', type=int, default=20)
+        parser.add_argument('--teams', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0, help='Seed for reproducible synthetic data')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Documents per insert_many call')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Generator processes')
+
     def handle(self, *args, **options):
-        # Connect to MongoDB
-        client = MongoClient('localhost', 27017)
-        db = client['octofit_db']
+        # Connect to the MongoDB database configured for Django
+        db = get_db()
         
         self.stdout.write(self.style.SUCCESS('Connected to MongoDB'))
         
@@ -20,12 +43,17 @@ class Command(BaseCommand):
         db.activities.drop()
         db.leaderboard.drop()
         db.workouts.drop()
+        db.team_stats.drop()
+        db[team_counters.COLLECTION].drop()
+        db[rollups.COLLECTION].drop()
+        db[windows.COLLECTION].drop()
+        db[windows.META_COLLECTION].drop()
         
         self.stdout.write(self.style.SUCCESS('Dropped existing collections'))
         
-        # Create unique index on email field
-        db.users.create_index('email', unique=True)
-        self.stdout.write(self.style.SUCCESS('Created unique index on email field'))
+        if options['users']:
+            self.populate_synthetic(db, options)
+            return
         
         # Marvel Team Superheroes
         marvel_users = [
@@ -172,52 +200,18 @@ class Command(BaseCommand):
                     'distance_km': round(random.uniform(1, 20), 2) if activity_type in ['running', 'cycling', 'swimming'] else 0,
                     'date': activity_date,
                     'notes': f'{activity_type.capitalize()} session',
-                    'points': random.randint(10, 50)
                 }
+                activity['points'] = scoring.score(activity)
                 activities.append(activity)
         
         result = db.activities.insert_many(activities)
         self.stdout.write(self.style.SUCCESS(f'Inserted {len(result.inserted_ids)} activities'))
         
-        # Calculate leaderboard based on activities
-        leaderboard_data = []
-        for user in all_users:
-            user_activities = [a for a in activities if a['username'] == user['username']]
-            total_points = sum(a['points'] for a in user_activities)
-            total_calories = sum(a['calories_burned'] for a in user_activities)
-            total_duration = sum(a['duration_minutes'] for a in user_activities)
-            
-            leaderboard_entry = {
-                'username': user['username'],
-                'full_name': user['full_name'],
-                'team': user['team'],
-                'total_points': total_points,
-                'total_calories': total_calories,
-                'total_duration_minutes': total_duration,
-                'total_activities': len(user_activities),
-                'rank': 0,  # Will be calculated after sorting
-                'updated_at': datetime.now()
-            }
-            leaderboard_data.append(leaderboard_entry)
-        
-        # Sort by points and assign ranks
-        leaderboard_data.sort(key=lambda x: x['total_points'], reverse=True)
-        for idx, entry in enumerate(leaderboard_data):
-            entry['rank'] = idx + 1
-        
-        result = db.leaderboard.insert_many(leaderboard_data)
-        self.stdout.write(self.style.SUCCESS(f'Inserted {len(result.inserted_ids)} leaderboard entries'))
-        
-        # Update team total points
-        for team in teams:
-            team_members = team['members']
-            team_total = sum(l['total_points'] for l in leaderboard_data if l['username'] in team_members)
-            db.teams.update_one(
-                {'name': team['name']},
-                {'$set': {'total_points': team_total}}
-            )
-        
-        self.stdout.write(self.style.SUCCESS('Updated team total points'))
+        # Leaderboard, team totals, team statistics, rollups and windows
+        summary = derived.rebuild(db)
+        self.stdout.write(self.style.SUCCESS(
+            f"Built {summary['users']} leaderboard entries, team totals, statistics, rollups and windows"
+        ))
         
         # Create sample workouts
         workouts = [
@@ -296,11 +290,125 @@ class Command(BaseCommand):
         result = db.workouts.insert_many(workouts)
         self.stdout.write(self.style.SUCCESS(f'Inserted {len(result.inserted_ids)} workouts'))
         
+        # Build the indexes declared on the models now that the data is loaded
+        call_command('sync_indexes', stdout=self.stdout)
+        
         self.stdout.write(self.style.SUCCESS('\n=== Database Population Complete ==='))
         self.stdout.write(self.style.SUCCESS(f'Total Users: {len(all_users)}'))
         self.stdout.write(self.style.SUCCESS(f'Total Teams: {len(teams)}'))
         self.stdout.write(self.style.SUCCESS(f'Total Activities: {len(activities)}'))
-        self.stdout.write(self.style.SUCCESS(f'Total Leaderboard Entries: {len(leaderboard_data)}'))
+        self.stdout.write(self.style.SUCCESS(f"Total Leaderboard Entries: {summary['users']}"))
         self.stdout.write(self.style.SUCCESS(f'Total Workouts: {len(workouts)}'))
-        
-        client.close()
+
+    def populate_synthetic(self, db, options):
+        """
+        Generate users, activities and all derived data at load-test scale.
+
+        Chunks of users are generated and inserted by a process pool. Only
+        per-user totals come back, so the leaderboard, team totals and team
+        statistics are computed in one pass without re-reading activities.
+        """
+        started = time.monotonic()
+        now = datetime.now()
+        users = options['users']
+        teams = max(options['teams'], 1)
+        job = {
+            'users': users,
+            'activities_per_user': options['activities_per_user'],
+            'teams': teams,
+            'seed': options['seed'],
+            'batch_size': options['batch_size'],
+            'now': now,
+            'client': client_options(),
+            'database': db.name,
+            'scoring': settings.ACTIVITY_SCORING,
+        }
+        jobs = [dict(job, chunk=chunk) for chunk in range(math.ceil(users / synthetic.CHUNK_SIZE))]
+
+        entries = []
+        breakdowns = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+        workers = max(options['workers'], 1)
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            results = executor.map(synthetic.generate_chunk, jobs) if executor else map(synthetic.generate_chunk, jobs)
+            for done, (chunk_entries, chunk_breakdowns) in enumerate(results, start=1):
+                entries.extend(chunk_entries)
+                for team, kinds in chunk_breakdowns.items():
+                    for kind, sums in kinds.items():
+                        for field, amount in sums.items():
+                            breakdowns[team][kind][field] += amount
+                if done % 10 == 0 or done == len(jobs):
+                    self.stdout.write(f'Generated {len(entries)}/{users} users ({done}/{len(jobs)} chunks)')
+        finally:
+            if executor:
+                executor.shutdown()
+
+        # Single pass over the sorted users: ranks, leaderboard rows and team totals
+        entries.sort(key=lambda entry: (-entry[3], entry[0]))
+        fields = ('total_points', 'total_calories', 'total_duration_minutes', 'total_activities')
+        team_docs = {
+            synthetic.team_name(index): dict(dict.fromkeys(fields, 0), member_count=0, members=[])
+            for index in range(teams)
+        }
+        batch = []
+        for rank, (username, full_name, team, points, calories, duration, count) in enumerate(entries, start=1):
+            batch.append({
+                'username': username,
+                'full_name': full_name,
+                'team': team,
+                'total_points': points,
+                'total_calories': calories,
+                'total_duration_minutes': duration,
+                'total_activities': count,
+                'rank': rank,
+                'updated_at': now,
+            })
+            totals = team_docs[team]
+            for field, amount in zip(fields, (points, calories, duration, count)):
+                totals[field] += amount
+            totals['member_count'] += 1
+            if len(totals['members']) < self.max_team_members:
+                totals['members'].append(username)
+            if len(batch) >= options['batch_size']:
+                insert_documents(db, 'leaderboard', batch)
+                batch = []
+        if batch:
+            insert_documents(db, 'leaderboard', batch)
+        self.stdout.write(self.style.SUCCESS(f'Inserted {len(entries)} leaderboard entries'))
+
+        insert_documents(db, 'teams', [
+            {
+                'name': name,
+                'description': f'Synthetic team {name}',
+                'created_at': now,
+                'captain': totals['members'][0] if totals['members'] else '',
+                'members': totals['members'],
+                'total_points': totals['total_points'],
+            }
+            for name, totals in team_docs.items()
+        ])
+        team_stats.replace_all(db, {
+            name: {
+                'member_count': totals['member_count'],
+                'total_points': totals['total_points'],
+                'total_calories': totals['total_calories'],
+                'total_duration_minutes': totals['total_duration_minutes'],
+                'total_activities': totals['total_activities'],
+                'by_activity_type': {kind: dict(sums) for kind, sums in breakdowns[name].items()},
+            }
+            for name, totals in team_docs.items()
+        })
+        self.stdout.write(self.style.SUCCESS(f'Inserted {teams} teams and their statistics'))
+
+        count = rollups.rebuild(db, batch_size=options['batch_size'])
+        windows.rebuild_all(db)
+        self.stdout.write(self.style.SUCCESS(f'Built {count} activity rollups and the windowed leaderboards'))
+
+        call_command('sync_indexes', stdout=self.stdout)
+
+        elapsed = time.monotonic() - started
+        activities = users * options['activities_per_user']
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {users} users and {activities} activities in {elapsed:.1f}s '
+            f'({activities / elapsed if elapsed else 0:.0f} activities/s)'
+        ))
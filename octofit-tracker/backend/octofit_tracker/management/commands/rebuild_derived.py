@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from octofit_tracker import derived
+from octofit_tracker.db import get_db
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the leaderboard, team total points, team statistics, rollups and '
+        'windowed leaderboards from the activities without dropping any source data'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Documents per write batch')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes folding username ranges in parallel (default 1, a single scan)',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(stage, count):
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'{stage}: {count} processed ({count / elapsed if elapsed else 0:.0f}/s)')
+
+        summary = derived.rebuild(
+            get_db(), batch_size=options['batch_size'], workers=max(options['workers'], 1), progress=progress
+        )
+        seconds = summary['seconds']
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {summary['users']} leaderboard entries from {summary['activities']} activities "
+            f"in {seconds:.1f}s ({summary['activities'] / seconds if seconds else 0:.0f} activities/s); "
+            f"{summary['teams_updated']} team totals changed"
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from octofit_tracker import rollups, windows
+from octofit_tracker.db import get_db
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the daily and weekly per-user activity rollups from the activities, '
+        'then the windowed leaderboards from the rollups'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rollup documents per insert')
+
+    def handle(self, *args, **options):
+        db = get_db()
+        count = rollups.rebuild(db, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} activity rollups'))
+        for window, rows in windows.rebuild_all(db).items():
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt the {window} leaderboard ({rows} rows)'))
@@ -0,0 +1,99 @@
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+
+from octofit_tracker import leaderboard, scoring
+from octofit_tracker.db import get_db
+
+PROJECTION = {
+    'username': True,
+    'date': True,
+    'points': True,
+    **dict.fromkeys(scoring.INPUT_FIELDS, True),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute activity points with the current scoring coefficients (except points '
+        'given explicitly by clients), then update the leaderboard, team totals, rollups and windows by the difference'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Activities scored and written per batch')
+        parser.add_argument('--type', dest='activity_type', help='Only rescore activities of this type')
+        parser.add_argument('--dry-run', action='store_true', help='Report how many activities would change')
+
+    def handle(self, *args, **options):
+        db = get_db()
+        query = {'custom_points': {'$ne': True}}
+        if options['activity_type']:
+            query['activity_type'] = options['activity_type']
+        scanned = changed = 0
+
+        for documents in self.chunks(db, query, options['batch_size']):
+            scanned += len(documents)
+            rescored = [
+                (document, points)
+                for document, points in zip(documents, scoring.score_documents(documents))
+                if document.get('points') != points
+            ]
+            changed += len(rescored)
+            if rescored and not options['dry_run']:
+                rescored = self.write(db, rescored)
+                leaderboard.apply_activity_changes(
+                    added=[dict(document, points=points) for document, points in rescored],
+                    removed=[document for document, _ in rescored],
+                )
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Scanned {scanned} activities, {changed} changed')
+
+        verb = 'would change' if options['dry_run'] else 'rescored'
+        self.stdout.write(self.style.SUCCESS(f'Scanned {scanned} activities; {changed} {verb}'))
+
+    def write(self, db, rescored):
+        """
+        Write new points where the activity still holds what was scored; returns the pairs written.
+
+        An activity edited through the API since it was read is left alone,
+        since its own update already applied the matching deltas.
+        """
+        result = db.activities.bulk_write([
+            UpdateOne(self.unchanged(document), {'$set': {'points': points}})
+            for document, points in rescored
+        ], ordered=False)
+        if result.matched_count == len(rescored):
+            return rescored
+        current = {
+            document['_id']: document
+            for document in db.activities.find({'_id': {'$in': [document['_id'] for document, _ in rescored]}}, PROJECTION)
+        }
+        return [
+            (document, points)
+            for document, points in rescored
+            if current.get(document['_id']) == dict(document, points=points)
+        ]
+
+    @staticmethod
+    def unchanged(document):
+        """
+        Match the activity only if its points and scoring inputs are as read.
+        """
+        return {
+            '_id': document['_id'],
+            'custom_points': {'$ne': True},
+            'points': document.get('points'),
+            **{name: document.get(name) for name in scoring.INPUT_FIELDS},
+        }
+
+    def chunks(self, db, query, batch_size):
+        """
+        Yield lists of activity documents in ``_id`` order, one range query per batch.
+        """
+        last_id = None
+        while True:
+            page_query = query if last_id is None else {'$and': [query, {'_id': {'$gt': last_id}}]}
+            documents = list(db.activities.find(page_query, PROJECTION).sort('_id', 1).limit(batch_size))
+            if not documents:
+                return
+            yield documents
+            last_id = documents[-1]['_id']
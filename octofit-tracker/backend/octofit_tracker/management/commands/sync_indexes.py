@@ -0,0 +1,83 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from pymongo.errors import OperationFailure
+
+from octofit_tracker.db import get_db
+from octofit_tracker.models import DERIVED_COLLECTION_INDEXES
+
+
+class Command(BaseCommand):
+    help = 'Create the MongoDB indexes declared on the models and report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only compare live indexes with the declarations; fail if any are missing or differ',
+        )
+
+    def handle(self, *args, **options):
+        db = get_db()
+        missing = []
+        drifted = []
+
+        for name, declared in self.declarations():
+            collection = db[name]
+            live = collection.index_information()
+            usage = self.index_usage(collection)
+
+            for index in declared:
+                name, info = next(
+                    ((name, info) for name, info in live.items() if index.key_matches(info)),
+                    (None, None),
+                )
+                if info is None:
+                    missing.append(f'{collection.name}.{index.name}')
+                    if options['check']:
+                        self.stdout.write(self.style.ERROR(f'Missing {collection.name}.{index.name}'))
+                    else:
+                        collection.create_index(index.keys, **index.create_kwargs())
+                        self.stdout.write(self.style.SUCCESS(f'Created {collection.name}.{index.name}'))
+                    continue
+
+                differences = index.differences(info)
+                if differences:
+                    drifted.append(f'{collection.name}.{name}')
+                    for option, (wanted, actual) in sorted(differences.items()):
+                        self.stdout.write(self.style.ERROR(
+                            f'Drift {collection.name}.{name}: {option} declared {wanted!r}, live {actual!r}'
+                        ))
+                elif usage.get(name) == 0:
+                    self.stdout.write(self.style.WARNING(f'Unused {collection.name}.{name} (no operations recorded)'))
+
+            for name, info in live.items():
+                if name != '_id_' and not any(index.key_matches(info) for index in declared):
+                    self.stdout.write(self.style.WARNING(
+                        f'Undeclared {collection.name}.{name} on {info["key"]}, ops={usage.get(name, "?")}'
+                    ))
+
+        if drifted or (options['check'] and missing):
+            raise CommandError(
+                f'{len(missing)} missing and {len(drifted)} drifted indexes; '
+                'drifted indexes must be dropped and re-created by hand.'
+            )
+        self.stdout.write(self.style.SUCCESS('Indexes are in sync with the model declarations'))
+
+    def declarations(self):
+        """
+        Yield ``(collection name, indexes)`` for models and derived collections.
+        """
+        for model in apps.get_app_config('octofit_tracker').get_models():
+            if getattr(model, 'mongo_indexes', None):
+                yield model._meta.db_table, model.mongo_indexes
+        yield from DERIVED_COLLECTION_INDEXES.items()
+
+    def index_usage(self, collection):
+        """
+        Return ``{index name: operation count}`` since the server last started.
+        """
+        try:
+            return {stat['name']: stat['accesses']['ops'] for stat in collection.aggregate([{'$indexStats': {}}])}
+        except OperationFailure:
+            # $indexStats needs the clusterMonitor role; usage is best effort.
+            return {}
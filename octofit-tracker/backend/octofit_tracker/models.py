@@ -1,6 +1,8 @@
 from djongo import models
 from django.utils import timezone
 
+from .indexes import MongoIndex
+
 
 class User(models.Model):
     username = models.CharField(max_length=100, unique=True)
@@ -11,6 +13,13 @@ class User(models.Model):
     fitness_level = models.CharField(max_length=50)
     goals = models.JSONField(default=list)
 
+    mongo_indexes = [
+        MongoIndex('username', unique=True),
+        MongoIndex('email', unique=True),
+        MongoIndex('team'),
+        MongoIndex('goals'),
+    ]
+
     class Meta:
         db_table = 'users'
 
@@ -26,6 +35,11 @@ class Team(models.Model):
     members = models.JSONField(default=list)
     total_points = models.IntegerField(default=0)
 
+    mongo_indexes = [
+        MongoIndex('name', unique=True),
+        MongoIndex('-total_points'),
+    ]
+
     class Meta:
         db_table = 'teams'
 
@@ -42,6 +56,14 @@ class Activity(models.Model):
     date = models.DateTimeField(default=timezone.now)
     notes = models.TextField(blank=True)
     points = models.IntegerField(default=0)
+    # Points given by the client instead of computed; rescoring leaves them alone.
+    custom_points = models.BooleanField(default=False)
+
+    mongo_indexes = [
+        MongoIndex('-date', '-id'),
+        MongoIndex('username', '-date', '-id'),
+        MongoIndex('activity_type', '-date', '-id'),
+    ]
 
     class Meta:
         db_table = 'activities'
@@ -62,6 +84,13 @@ class Leaderboard(models.Model):
     rank = models.IntegerField(default=0)
     updated_at = models.DateTimeField(default=timezone.now)
 
+    mongo_indexes = [
+        MongoIndex('username', unique=True),
+        MongoIndex('rank'),
+        MongoIndex('-total_points', 'username'),
+        MongoIndex('team', '-total_points'),
+    ]
+
     class Meta:
         db_table = 'leaderboard'
         ordering = ['rank']
@@ -79,8 +108,40 @@ class Workout(models.Model):
     target_muscles = models.JSONField(default=list)
     created_at = models.DateTimeField(default=timezone.now)
 
+    mongo_indexes = [
+        MongoIndex('difficulty'),
+        MongoIndex('target_muscles'),
+    ]
+
     class Meta:
         db_table = 'workouts'
 
     def __str__(self):
         return self.name
+
+
+# Indexes for collections maintained outside the ORM, keyed by collection name.
+DERIVED_COLLECTION_INDEXES = {
+    'team_stats': [
+        MongoIndex('team', unique=True),
+        MongoIndex('-total_points'),
+    ],
+    'activity_rollups': [
+        MongoIndex('username', 'bucket', 'start', unique=True),
+        MongoIndex('bucket', 'start'),
+    ],
+    'leaderboard_windows': [
+        MongoIndex('window', 'username', unique=True),
+        MongoIndex('window', '-total_points', 'username'),
+        MongoIndex('window', 'team', '-total_points'),
+    ],
+    'leaderboard_windows_meta': [
+        MongoIndex('window', unique=True),
+    ],
+    'leaderboard_events': [
+        MongoIndex('created_at', expire_after_seconds=3600),
+    ],
+    'team_counters': [
+        MongoIndex('team', 'shard', unique=True),
+    ],
+}
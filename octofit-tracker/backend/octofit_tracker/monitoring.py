@@ -0,0 +1,171 @@
+"""
+pymongo command and connection pool monitoring.
+
+``CommandTimer`` counts MongoDB commands and their server round-trip time
+per thread. ``PoolMonitor`` tracks connection pool checkout waits, timeouts
+and connections in use. pymongo only attaches global listeners to clients
+created after registration, so ``install()`` also closes the current Django
+connection; djongo reconnects with the listeners on its next query.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.db import connections
+from pymongo import monitoring
+
+
+class CommandTimer(monitoring.CommandListener):
+    """
+    Accumulate command counts and durations for the current thread.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def reset(self):
+        self._local.commands = 0
+        self._local.duration_us = 0
+
+    def snapshot(self):
+        """
+        Return ``(commands, duration in microseconds)`` since the last reset.
+        """
+        return getattr(self._local, 'commands', 0), getattr(self._local, 'duration_us', 0)
+
+    def started(self, event):
+        self._local.commands = getattr(self._local, 'commands', 0) + 1
+
+    def succeeded(self, event):
+        self._local.duration_us = getattr(self._local, 'duration_us', 0) + event.duration_micros
+
+    def failed(self, event):
+        self._local.duration_us = getattr(self._local, 'duration_us', 0) + event.duration_micros
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """
+    Per-server pool gauges and a histogram of connection checkout waits.
+
+    pymongo 3.x events carry no durations, so the wait is timed from the
+    checkout-started event on the same thread.
+    """
+    buckets = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.in_use = defaultdict(int)
+        self.open = defaultdict(int)
+        self.timeouts = defaultdict(int)
+        self.wait_buckets = defaultdict(lambda: [0] * (len(self.buckets) + 1))
+        self.wait_sum = defaultdict(float)
+        self.wait_count = defaultdict(int)
+
+    @staticmethod
+    def server(address):
+        return '%s:%s' % address if isinstance(address, tuple) else str(address)
+
+    def _observe_wait(self, address):
+        started = getattr(self._local, 'checkout_started', None)
+        if started is None:
+            return
+        self._local.checkout_started = None
+        wait = time.perf_counter() - started
+        server = self.server(address)
+        self.wait_buckets[server][bisect_left(self.buckets, wait)] += 1
+        self.wait_sum[server] += wait
+        self.wait_count[server] += 1
+
+    def connection_check_out_started(self, event):
+        self._local.checkout_started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self._observe_wait(event.address)
+            self.in_use[self.server(event.address)] += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self._observe_wait(event.address)
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                self.timeouts[self.server(event.address)] += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use[self.server(event.address)] -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open[self.server(event.address)] += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open[self.server(event.address)] -= 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def exposition(self):
+        """
+        Return the pool metrics as Prometheus text lines.
+        """
+        with self._lock:
+            lines = [
+                '# HELP octofit_mongo_pool_connections_in_use Connections checked out of the pool.',
+                '# TYPE octofit_mongo_pool_connections_in_use gauge',
+            ]
+            lines += [f'octofit_mongo_pool_connections_in_use{{server="{s}"}} {n}' for s, n in sorted(self.in_use.items())]
+            lines += [
+                '# HELP octofit_mongo_pool_connections_open Open pooled connections.',
+                '# TYPE octofit_mongo_pool_connections_open gauge',
+            ]
+            lines += [f'octofit_mongo_pool_connections_open{{server="{s}"}} {n}' for s, n in sorted(self.open.items())]
+            lines += [
+                '# HELP octofit_mongo_pool_checkout_timeouts_total Checkouts that hit waitQueueTimeoutMS.',
+                '# TYPE octofit_mongo_pool_checkout_timeouts_total counter',
+            ]
+            lines += [f'octofit_mongo_pool_checkout_timeouts_total{{server="{s}"}} {n}' for s, n in sorted(self.timeouts.items())]
+            lines += [
+                '# HELP octofit_mongo_pool_checkout_wait_seconds Time spent waiting for a pooled connection.',
+                '# TYPE octofit_mongo_pool_checkout_wait_seconds histogram',
+            ]
+            for server in sorted(self.wait_count):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), self.wait_buckets[server]):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'octofit_mongo_pool_checkout_wait_seconds_bucket{{server="{server}",le="{le}"}} {cumulative}')
+                lines.append(f'octofit_mongo_pool_checkout_wait_seconds_sum{{server="{server}"}} {self.wait_sum[server]:.6f}')
+                lines.append(f'octofit_mongo_pool_checkout_wait_seconds_count{{server="{server}"}} {self.wait_count[server]}')
+        return lines
+
+
+command_timer = CommandTimer()
+pool_monitor = PoolMonitor()
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install(alias='default'):
+    """
+    Register ``command_timer`` and ``pool_monitor`` with pymongo once per process.
+    """
+    global _installed
+    with _install_lock:
+        if not _installed:
+            monitoring.register(command_timer)
+            monitoring.register(pool_monitor)
+            connections[alias].close()
+            _installed = True
+    return command_timer
@@ -0,0 +1,152 @@
+"""
+Keyset (cursor) pagination.
+
+DRF's ``CursorPagination`` positions on the first ordering field and falls
+back to an offset inside runs of equal values. ``KeysetPagination`` instead
+encodes the full sort key of the last row in the cursor and filters on it,
+so every page is a single indexed range query however deep it is.
+"""
+import base64
+import json
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginate a queryset by a unique, totally ordered key.
+
+    ``ordering`` must end with a unique field so that the key is unambiguous.
+    Fields prefixed with ``-`` are walked in descending order.
+    """
+    ordering = ('-id',)
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.model = queryset.model
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        if isinstance(last, dict):
+            position = [last[name] for name in self.field_names]
+        else:
+            position = [self._field(name).value_from_object(last) for name in self.field_names]
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(position))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    @property
+    def field_names(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    def after(self, position):
+        """
+        Build the filter selecting rows that sort after ``position``.
+
+        For ordering ``(a, b)`` this is ``a > x OR (a = x AND b > y)``, with
+        ``<`` in place of ``>`` for descending fields.
+        """
+        condition = Q()
+        for i, name in enumerate(self.ordering):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            prefix = {self.field_names[j]: position[j] for j in range(i)}
+            prefix[f'{field}__{lookup}'] = position[i]
+            condition |= Q(**prefix)
+        return condition
+
+    def mongo_after(self, position):
+        """
+        ``after`` as a MongoDB query document, for pymongo/motor reads.
+        """
+        branches = []
+        for i, name in enumerate(self.ordering):
+            field = name.lstrip('-')
+            operator = '$lt' if name.startswith('-') else '$gt'
+            branch = {self.field_names[j]: position[j] for j in range(i)}
+            branch[field] = {operator: position[i]}
+            branches.append(branch)
+        return {'$or': branches}
+
+    def mongo_sort(self):
+        return [(name.lstrip('-'), -1 if name.startswith('-') else 1) for name in self.ordering]
+
+    def encode_cursor(self, position):
+        # Raw documents carry naive UTC datetimes; encode them like ORM values.
+        position = [
+            timezone.make_aware(value, dt_timezone.utc) if isinstance(value, datetime) and timezone.is_naive(value)
+            else value
+            for value in position
+        ]
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in position]
+        data = json.dumps(values, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(data).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [self._field(name).to_python(value) for name, value in zip(self.field_names, values)]
+        except (TypeError, ValueError, DjangoValidationError) as exc:
+            raise NotFound(self.invalid_cursor_message) from exc
+
+    def _field(self, name):
+        return self.model._meta.get_field(name)
+
+
+class ActivityPagination(KeysetPagination):
+    """
+    Newest activities first, keyed on ``(date, id)``.
+    """
+    ordering = ('-date', '-id')
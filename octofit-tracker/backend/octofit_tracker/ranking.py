@@ -0,0 +1,277 @@
+"""
+In-process order-statistic index over leaderboard points.
+
+``RankIndex`` answers "what is this user's rank" and "who holds rank k" in
+O(log n) without reading the ``leaderboard`` collection. Users are grouped
+into point buckets of ``LEADERBOARD_RANK_BUCKET_WIDTH`` points; a Fenwick
+tree counts users per bucket and each bucket keeps its members sorted by
+``(-total_points, username)``, the same order used for stored ranks.
+Since it holds every user's points, top-k lists and percentiles are exact.
+
+Each worker process holds its own index. It is loaded lazily from the
+collection, kept current by this process's leaderboard writes, and fully
+reloaded every ``LEADERBOARD_RANK_INDEX_TTL`` seconds to pick up writes
+made by other processes. Reloads build the new index off to the side, so
+reads keep being answered by the old one meanwhile.
+"""
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+
+from django.conf import settings
+
+from .db import get_db
+
+logger = logging.getLogger(__name__)
+
+
+class RankIndex:
+    """
+    Fenwick tree over point buckets with sorted members per bucket.
+    """
+
+    def __init__(self, bucket_width=1):
+        self.bucket_width = max(int(bucket_width), 1)
+        self._points = {}
+        self._buckets = {}
+        self._tree = array('q', [0, 0])
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, username):
+        return username in self._points
+
+    def load(self, entries):
+        """
+        Replace the contents with ``(username, total_points)`` pairs.
+        """
+        points = {username: max(int(total or 0), 0) for username, total in entries}
+        buckets = {}
+        for username, total in points.items():
+            buckets.setdefault(self._bucket(total), []).append((-total, username))
+        size = 1
+        while size <= max(buckets, default=0):
+            size *= 2
+        tree = array('q', [0]) * (size + 1)
+        for bucket, members in buckets.items():
+            members.sort()
+            tree[bucket + 1] += len(members)
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        with self._lock:
+            self._points, self._buckets, self._tree = points, buckets, tree
+
+    def update(self, username, total_points):
+        """
+        Insert a user or move them to a new point total.
+        """
+        total_points = max(int(total_points or 0), 0)
+        with self._lock:
+            previous = self._points.get(username)
+            if previous == total_points:
+                return
+            if previous is not None:
+                self._remove(username, previous)
+            self._points[username] = total_points
+            bucket = self._bucket(total_points)
+            self._add(bucket, 1)
+            insort(self._buckets.setdefault(bucket, []), (-total_points, username))
+
+    def discard(self, username):
+        with self._lock:
+            previous = self._points.pop(username, None)
+            if previous is not None:
+                self._remove(username, previous)
+
+    def points(self, username):
+        return self._points.get(username)
+
+    def rank(self, username):
+        """
+        Return the 1-based rank of ``username``, or ``None`` if unknown.
+        """
+        with self._lock:
+            total = self._points.get(username)
+            if total is None:
+                return None
+            bucket = self._bucket(total)
+            above = len(self._points) - self._prefix(bucket)
+            position = bisect_left(self._buckets[bucket], (-total, username))
+            return above + position + 1
+
+    def select(self, rank):
+        """
+        Return the ``(username, total_points)`` holding a 1-based rank.
+        """
+        with self._lock:
+            count = len(self._points)
+            if not 1 <= rank <= count:
+                return None
+            # Walk the tree for the bucket containing the m-th lowest entry.
+            remaining = count - rank + 1
+            index = 0
+            step = 1 << (len(self._tree) - 1).bit_length()
+            while step:
+                nxt = index + step
+                if nxt < len(self._tree) and self._tree[nxt] < remaining:
+                    index = nxt
+                    remaining -= self._tree[nxt]
+                step >>= 1
+            members = self._buckets[index]
+            key = members[len(members) - remaining]
+            return key[1], -key[0]
+
+    def percentile(self, username):
+        """
+        Return the share of other users ranked below ``username`` (0-100), or ``None``.
+
+        The leader is at 100 and the last user at 0; a lone user is at 100.
+        """
+        with self._lock:
+            rank = self.rank(username)
+            if rank is None:
+                return None
+            count = len(self._points)
+            return 100.0 if count == 1 else 100.0 * (count - rank) / (count - 1)
+
+    def window(self, first, last):
+        """
+        Return ``(rank, username, total_points)`` for ranks in ``[first, last]``.
+        """
+        with self._lock:
+            first = max(first, 1)
+            last = min(last, len(self._points))
+            return [(rank,) + self.select(rank) for rank in range(first, last + 1)]
+
+    def _bucket(self, total_points):
+        return total_points // self.bucket_width
+
+    def _remove(self, username, total_points):
+        bucket = self._bucket(total_points)
+        members = self._buckets[bucket]
+        del members[bisect_left(members, (-total_points, username))]
+        if not members:
+            del self._buckets[bucket]
+        self._add(bucket, -1)
+
+    def _add(self, bucket, amount):
+        size = len(self._tree) - 1
+        if bucket >= size:
+            self._grow(bucket)
+            size = len(self._tree) - 1
+        i = bucket + 1
+        while i <= size:
+            self._tree[i] += amount
+            i += i & -i
+
+    def _grow(self, bucket):
+        size = len(self._tree) - 1
+        while size <= bucket:
+            size *= 2
+        counts = array('q', [0]) * (size + 1)
+        for index, members in self._buckets.items():
+            counts[index + 1] = len(members)
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                counts[parent] += counts[i]
+        self._tree = counts
+
+    def _prefix(self, bucket):
+        """
+        Count entries in buckets ``0..bucket`` inclusive.
+        """
+        total = 0
+        i = min(bucket + 1, len(self._tree) - 1)
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+
+_index = None
+_loaded_at = 0.0
+_generation = 0
+_pending_updates = None
+_index_lock = threading.Lock()
+_reload_lock = threading.Lock()
+
+
+def get_rank_index():
+    """
+    Return this process's rank index, reloading it when it is stale.
+
+    Only the first load makes callers wait. A stale index keeps answering
+    while one caller builds its replacement outside ``_index_lock``; writes
+    recorded meanwhile are replayed into the new index before it is swapped in.
+    """
+    global _index, _loaded_at, _pending_updates
+    ttl = getattr(settings, 'LEADERBOARD_RANK_INDEX_TTL', 60)
+    index = _index
+    if index is not None and time.monotonic() - _loaded_at <= ttl:
+        return index
+    if not _reload_lock.acquire(blocking=index is None):
+        return index
+    try:
+        with _index_lock:
+            if _index is not None and time.monotonic() - _loaded_at <= ttl:
+                return _index
+            generation = _generation
+            _pending_updates = []
+        fresh = RankIndex(getattr(settings, 'LEADERBOARD_RANK_BUCKET_WIDTH', 10))
+        try:
+            cursor = get_db().leaderboard.find({}, {'_id': False, 'username': True, 'total_points': True})
+            fresh.load((doc['username'], doc.get('total_points', 0)) for doc in cursor)
+        finally:
+            with _index_lock:
+                updates, _pending_updates = _pending_updates, None
+        with _index_lock:
+            for username, total_points in updates:
+                fresh.update(username, total_points)
+            if generation != _generation:
+                # Reset while loading: what was read may predate a rebuild.
+                return fresh
+            _index, _loaded_at = fresh, time.monotonic()
+        return fresh
+    finally:
+        _reload_lock.release()
+
+
+def warm_rank_index():
+    """
+    Load the index at startup so the first requests do not pay for it.
+
+    Failures are logged rather than raised, so the server still starts
+    while MongoDB is unavailable; the index then loads on first use.
+    """
+    if not getattr(settings, 'LEADERBOARD_RANK_INDEX_WARM', True):
+        return
+    try:
+        get_rank_index()
+    except Exception:
+        logger.exception('Could not warm the leaderboard rank index')
+
+
+def record_points(username, total_points):
+    """
+    Keep an already loaded index, and one being loaded, in step with a leaderboard write.
+    """
+    with _index_lock:
+        index = _index
+        if _pending_updates is not None:
+            _pending_updates.append((username, total_points))
+    if index is not None:
+        index.update(username, total_points)
+
+
+def reset_rank_index():
+    global _index, _generation
+    with _index_lock:
+        _index = None
+        _generation += 1
@@ -0,0 +1,84 @@
+"""
+Renderers for the export formats and the optional orjson encoder.
+
+Exports stream their body directly, so the NDJSON and CSV renderers are
+only used for content negotiation (``?format=ndjson|csv``) and for error
+responses.
+"""
+import csv
+import io
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speedup
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` using orjson for compact output.
+
+    Produces the same bytes as DRF's compact UTF-8 output, except that
+    floats needing an exponent are written without ``+``/leading zeros
+    (``1e16`` rather than ``1e+16``). Indented output, and any request when
+    orjson is not installed, falls back to the stdlib encoder.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        rendered = orjson.dumps(data, default=JSONEncoder().default)
+        # Match DRF, which escapes the JavaScript line separators.
+        return rendered.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        lines = (json.dumps(row, ensure_ascii=False, separators=(',', ':')) + '\n' for row in rows)
+        return ''.join(lines).encode(self.charset)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Negotiates ``text/event-stream`` for the live leaderboard; errors become one event.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return f"event: error\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode(self.charset)
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            if isinstance(row, dict):
+                writer.writerow(f'{key}: {value}' for key, value in row.items())
+            else:
+                writer.writerow([row])
+        return buffer.getvalue().encode(self.charset)
@@ -0,0 +1,105 @@
+"""
+Native MongoDB reads for the hot paths.
+
+These functions query pymongo directly with aggregation pipelines instead
+of going through djongo's SQL translation, which dominates request time
+on large collections. Documents are returned in the same shape the
+matching serializer produces, so views can swap them in transparently.
+Ranking uses ``$setWindowFields`` and needs MongoDB 5.0 or later.
+"""
+from .db import get_db
+
+
+def projection_for(serializer):
+    projection = dict.fromkeys(serializer.fields, True)
+    projection['_id'] = False
+    return projection
+
+
+def representer(serializer):
+    """
+    Return a function converting one raw document with the serializer's fields.
+    """
+    fields = list(serializer.fields.items())
+
+    def to_representation(document):
+        row = {}
+        for name, field in fields:
+            value = document.get(name)
+            row[name] = None if value is None else field.to_representation(value)
+        return row
+    return to_representation
+
+
+def represent(documents, serializer):
+    return list(map(representer(serializer), documents))
+
+
+def leaderboard_page(serializer, team=None, skip=0, limit=None):
+    """
+    Return leaderboard rows ordered by points, with ``rank`` computed by the server.
+
+    Ranks follow ``(-total_points, username)``, the same order the
+    incremental maintenance uses, so they never depend on stored ranks.
+    """
+    pipeline = []
+    if team:
+        pipeline.append({'$match': {'team': team}})
+    pipeline.append({
+        '$setWindowFields': {
+            'sortBy': {'total_points': -1, 'username': 1},
+            'output': {'rank': {'$documentNumber': {}}},
+        },
+    })
+    pipeline.append({'$sort': {'rank': 1}})
+    if skip:
+        pipeline.append({'$skip': skip})
+    if limit:
+        pipeline.append({'$limit': limit})
+    pipeline.append({'$project': projection_for(serializer)})
+    return represent(get_db().leaderboard.aggregate(pipeline), serializer)
+
+
+def teams(serializer, pending_points=None):
+    """
+    Return team rows, adding ``pending_points`` (``{name: points}``) to their totals.
+    """
+    projection = projection_for(serializer)
+    if pending_points:
+        projection['name'] = True
+    documents = get_db().teams.find({}, projection)
+    if pending_points:
+        documents = (
+            dict(document, total_points=(document.get('total_points') or 0) + pending_points.get(document['name'], 0))
+            for document in documents
+        )
+    return represent(documents, serializer)
+
+
+def team_totals(db=None):
+    """
+    Aggregate leaderboard totals per team, highest points first.
+    """
+    pipeline = [
+        {'$group': {
+            '_id': '$team',
+            'member_count': {'$sum': 1},
+            'total_points': {'$sum': '$total_points'},
+            'total_calories': {'$sum': '$total_calories'},
+            'total_duration_minutes': {'$sum': '$total_duration_minutes'},
+            'total_activities': {'$sum': '$total_activities'},
+        }},
+        {'$sort': {'total_points': -1, '_id': 1}},
+        {'$project': {
+            '_id': False,
+            'team': '$_id',
+            'member_count': True,
+            'total_points': True,
+            'total_calories': True,
+            'total_duration_minutes': True,
+            'total_activities': True,
+            'average_points': {'$divide': ['$total_points', '$member_count']},
+        }},
+    ]
+    return list((db or get_db()).leaderboard.aggregate(pipeline))
+
@@ -0,0 +1,223 @@
+"""
+Per-user daily and weekly activity rollups.
+
+The ``activity_rollups`` collection holds one document per user and UTC
+day (``bucket: 'day'``) and per user and ISO week (``bucket: 'week'``),
+with the sums of the activities in that period and a per-``activity_type``
+breakdown. Activity writes update it with ``$inc`` alongside the
+leaderboard, so per-user charts read one document per period instead of
+every activity.
+
+``rebuild`` streams per-day groups in username order, so it holds one
+user's rollups at a time, and writes them to a temporary collection that
+is renamed over the live one, so readers never see it empty.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone
+
+from pymongo import UpdateOne
+
+from .db import field_value
+from .indexes import copy_indexes
+from .models import DERIVED_COLLECTION_INDEXES
+from .team_stats import type_key
+
+COLLECTION = 'activity_rollups'
+TEMP_COLLECTION = 'activity_rollups_rebuild'
+BUCKETS = ('day', 'week')
+
+SUM_FIELDS = {
+    'count': None,
+    'points': 'points',
+    'calories_burned': 'calories_burned',
+    'duration_minutes': 'duration_minutes',
+    'distance_km': 'distance_km',
+}
+
+
+def bucket_start(moment, bucket):
+    """
+    Return the naive UTC midnight starting the ``bucket`` containing ``moment``.
+
+    ``moment`` may be a date or a (naive UTC or aware) datetime.
+    """
+    if isinstance(moment, datetime):
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc)
+        moment = moment.date()
+    if bucket == 'week':
+        moment -= timedelta(days=moment.weekday())
+    return datetime.combine(moment, time.min)
+
+
+def bucket_key(start, bucket):
+    if bucket == 'week':
+        year, week, _ = start.isocalendar()
+        return f'{year}-W{week:02d}'
+    return start.date().isoformat()
+
+
+def collect_increments(added=(), removed=()):
+    """
+    Fold activities into ``{(username, bucket, start): {field: amount}}``.
+    """
+    increments = defaultdict(lambda: defaultdict(int))
+    for activities, sign in ((added, 1), (removed, -1)):
+        for activity in activities:
+            moment = field_value(activity, 'date')
+            if moment is None:
+                continue
+            prefix = f"by_activity_type.{type_key(field_value(activity, 'activity_type'))}"
+            for bucket in BUCKETS:
+                fields = increments[field_value(activity, 'username'), bucket, bucket_start(moment, bucket)]
+                for field, source in SUM_FIELDS.items():
+                    amount = sign * (1 if source is None else (field_value(activity, source) or 0))
+                    fields[field] += amount
+                    fields[f'{prefix}.{field}'] += amount
+    return increments
+
+
+def apply_changes(db, added=(), removed=()):
+    """
+    Apply created, updated or deleted activities to the rollups.
+    """
+    operations = []
+    for (username, bucket, start), fields in collect_increments(added, removed).items():
+        fields = {field: amount for field, amount in fields.items() if amount}
+        if not fields:
+            continue
+        operations.append(UpdateOne(
+            {'username': username, 'bucket': bucket, 'start': start},
+            {'$inc': fields, '$setOnInsert': {'key': bucket_key(start, bucket)}},
+            upsert=True,
+        ))
+    if operations:
+        db[COLLECTION].bulk_write(operations, ordered=False)
+    if removed:
+        usernames = list({field_value(activity, 'username') for activity in removed})
+        db[COLLECTION].delete_many({'username': {'$in': usernames}, 'count': {'$lte': 0}})
+
+
+def rebuild(db, batch_size=1000):
+    """
+    Recompute every rollup from the activities; returns the number of documents.
+    """
+    sums = {
+        field: {'$sum': 1 if source is None else {'$ifNull': [f'${source}', 0]}}
+        for field, source in SUM_FIELDS.items()
+    }
+    pipeline = [
+        {'$match': {'date': {'$type': 'date'}}},
+        {'$group': dict({
+            '_id': {
+                'username': '$username',
+                'day': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$date'}},
+                'activity_type': '$activity_type',
+            },
+        }, **sums)},
+        {'$sort': {'_id.username': 1}},
+    ]
+    db[TEMP_COLLECTION].drop()
+    copy_indexes(db, COLLECTION, TEMP_COLLECTION, DERIVED_COLLECTION_INDEXES[COLLECTION])
+
+    batch = []
+    written = 0
+
+    def flush(documents):
+        nonlocal batch, written
+        batch.extend(documents.values())
+        if len(batch) >= batch_size:
+            db[TEMP_COLLECTION].insert_many(batch, ordered=False)
+            written += len(batch)
+            batch = []
+
+    username = None
+    documents = {}
+    for group in db.activities.aggregate(pipeline, allowDiskUse=True):
+        if group['_id']['username'] != username:
+            flush(documents)
+            username, documents = group['_id']['username'], {}
+        day = datetime.strptime(group['_id']['day'], '%Y-%m-%d')
+        for bucket in BUCKETS:
+            start = bucket_start(day, bucket)
+            document = documents.setdefault((bucket, start), dict(
+                {'username': username, 'bucket': bucket, 'start': start,
+                 'key': bucket_key(start, bucket), 'by_activity_type': {}},
+                **dict.fromkeys(SUM_FIELDS, 0),
+            ))
+            breakdown = document['by_activity_type'].setdefault(
+                type_key(group['_id']['activity_type']), dict.fromkeys(SUM_FIELDS, 0)
+            )
+            for field in SUM_FIELDS:
+                document[field] += group[field]
+                breakdown[field] += group[field]
+    flush(documents)
+    if batch:
+        db[TEMP_COLLECTION].insert_many(batch, ordered=False)
+        written += len(batch)
+
+    if written:
+        db[TEMP_COLLECTION].rename(COLLECTION, dropTarget=True)
+    else:
+        db[TEMP_COLLECTION].drop()
+        db[COLLECTION].delete_many({})
+    return written
+
+
+def read_query(username, bucket='day', start=None, end=None):
+    """
+    Return the query selecting a user's ``bucket`` rollups between two dates, inclusive.
+    """
+    query = {'username': username, 'bucket': bucket}
+    if start or end:
+        query['start'] = {}
+        if start:
+            query['start']['$gte'] = bucket_start(start, bucket)
+        if end:
+            query['start']['$lte'] = bucket_start(end, bucket)
+    return query
+
+
+READ_PROJECTION = {'_id': False, 'username': False}
+
+
+def summarize(username, bucket, documents):
+    """
+    Fold rollup documents, oldest first, into the stats response.
+
+    The result has the summed ``totals`` and ``by_activity_type`` for the
+    whole range and a ``series`` with one row per non-empty period.
+    """
+    totals = dict.fromkeys(SUM_FIELDS, 0)
+    by_type = {}
+    series = []
+    for document in documents:
+        row = {'start': document['start'].date().isoformat(), 'key': document['key']}
+        row.update({field: document.get(field, 0) for field in SUM_FIELDS})
+        row['by_activity_type'] = {
+            activity_type: values
+            for activity_type, values in sorted(document.get('by_activity_type', {}).items())
+            if values.get('count')
+        }
+        for field in SUM_FIELDS:
+            totals[field] += row[field]
+        for activity_type, values in row['by_activity_type'].items():
+            summed = by_type.setdefault(activity_type, dict.fromkeys(SUM_FIELDS, 0))
+            for field in SUM_FIELDS:
+                summed[field] += values.get(field, 0)
+        series.append(row)
+    return {
+        'username': username,
+        'bucket': bucket,
+        'totals': totals,
+        'by_activity_type': dict(sorted(by_type.items())),
+        'series': series,
+    }
+
+
+def read(db, username, bucket='day', start=None, end=None):
+    """
+    Return a user's rollup stats for ``bucket`` between two dates, inclusive.
+    """
+    documents = db[COLLECTION].find(read_query(username, bucket, start, end), READ_PROJECTION).sort('start', 1)
+    return summarize(username, bucket, documents)
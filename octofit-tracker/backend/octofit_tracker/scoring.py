@@ -0,0 +1,85 @@
+"""
+Activity scoring.
+
+An activity's points are a linear function of its duration, calories and
+distance, with per-``activity_type`` coefficients from
+``settings.ACTIVITY_SCORING`` (types without an entry use ``default``):
+
+    points = round(base + per_minute * duration_minutes
+                   + per_calorie * calories_burned + per_km * distance_km)
+
+rounded half to even and never negative. Points a client sends explicitly
+are kept and marked ``custom_points``; they are not rescored. ``score``
+handles one activity on write; ``score_batch`` evaluates columns of activities at once with NumPy
+when it is installed and falls back to the same formula in Python, with
+identical results either way. Every function takes an optional ``table``
+in the shape of the setting, for worker processes without Django settings.
+"""
+from django.conf import settings
+
+from .db import field_value
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy only speeds up batch rescoring
+    np = None
+
+COEFFICIENTS = ('base', 'per_minute', 'per_calorie', 'per_km')
+INPUT_FIELDS = ('activity_type', 'duration_minutes', 'calories_burned', 'distance_km')
+
+
+def coefficients(activity_type, table=None):
+    """
+    Return the ``(base, per_minute, per_calorie, per_km)`` tuple for a type.
+    """
+    table = settings.ACTIVITY_SCORING if table is None else table
+    row = table.get(str(activity_type or '').lower(), table['default'])
+    return tuple(float(row.get(name, 0)) for name in COEFFICIENTS)
+
+
+def points_for(activity_type, duration_minutes, calories_burned, distance_km, table=None):
+    base, per_minute, per_calorie, per_km = coefficients(activity_type, table)
+    raw = base + per_minute * (duration_minutes or 0) + per_calorie * (calories_burned or 0) + per_km * (distance_km or 0)
+    return max(round(raw), 0)
+
+
+def score(activity, table=None):
+    """
+    Return the points for one activity (a model instance or a dict).
+    """
+    return points_for(*(field_value(activity, name) for name in INPUT_FIELDS), table=table)
+
+
+def score_batch(activity_types, duration_minutes, calories_burned, distance_km, table=None):
+    """
+    Return the points for equally long columns of activity fields, as a list.
+    """
+    if np is None:
+        return [
+            points_for(*row, table=table)
+            for row in zip(activity_types, duration_minutes, calories_burned, distance_km)
+        ]
+    if not len(activity_types):
+        return []
+    # Look the coefficients up once per distinct type, then gather them per row.
+    keys = [str(activity_type or '').lower() for activity_type in activity_types]
+    types, inverse = np.unique(np.array(keys, dtype=object), return_inverse=True)
+    rows = np.array([coefficients(activity_type, table) for activity_type in types], dtype=np.float64)[inverse]
+
+    def column(values):
+        return np.array([value or 0 for value in values], dtype=np.float64)
+
+    raw = (
+        rows[:, 0]
+        + rows[:, 1] * column(duration_minutes)
+        + rows[:, 2] * column(calories_burned)
+        + rows[:, 3] * column(distance_km)
+    )
+    return np.maximum(np.rint(raw), 0).astype(np.int64).tolist()
+
+
+def score_documents(documents, table=None):
+    """
+    Return the points for a list of activity documents, in order.
+    """
+    return score_batch(*([document.get(name) for document in documents] for name in INPUT_FIELDS), table=table)
@@ -1,32 +1,54 @@
 from rest_framework import serializers
+from . import scoring
+from .fieldsets import SparseFieldsetSerializerMixin
 from .models import User, Team, Activity, Leaderboard, Workout
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = '__all__'
 
 
-class TeamSerializer(serializers.ModelSerializer):
+class TeamSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Team
         fields = '__all__'
 
 
-class ActivitySerializer(serializers.ModelSerializer):
+class ActivitySerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    """
+    Activities are scored on write unless ``points`` is given explicitly.
+
+    Explicit points are kept as given and flagged with ``custom_points``, so
+    ``rescore_activities`` does not overwrite them. Updates are rescored only
+    when one of the scoring inputs changes.
+    """
     class Meta:
         model = Activity
         fields = '__all__'
-
-
-class LeaderboardSerializer(serializers.ModelSerializer):
+        read_only_fields = ('custom_points',)
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if 'points' in attrs:
+            attrs['custom_points'] = True
+        elif self.instance is None or any(name in attrs for name in scoring.INPUT_FIELDS):
+            attrs['points'] = scoring.score({
+                name: attrs.get(name, getattr(self.instance, name, None))
+                for name in scoring.INPUT_FIELDS
+            })
+            attrs['custom_points'] = False
+        return attrs
+
+
+class LeaderboardSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Leaderboard
         fields = '__all__'
 
 
-class WorkoutSerializer(serializers.ModelSerializer):
+class WorkoutSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Workout
         fields = '__all__'
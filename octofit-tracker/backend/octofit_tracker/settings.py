@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -55,6 +57,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'octofit_tracker.instrumentation.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -89,18 +92,124 @@ WSGI_APPLICATION = 'octofit_tracker.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# pymongo client options shared by djongo, management commands, the
+# synthetic-data workers and the async endpoints (octofit_tracker.db.create_client).
+# A timeout of 0 means no timeout. Wire compression is off unless
+# MONGO_COMPRESSORS is set (e.g. "zstd,zlib"; zstd and snappy need extra packages).
+MONGO_CLIENT = {
+    'host': os.getenv('MONGO_HOST', 'localhost'),
+    'port': int(os.getenv('MONGO_PORT', '27017')),
+    'maxPoolSize': int(os.getenv('MONGO_MAX_POOL_SIZE', '100')),
+    'minPoolSize': int(os.getenv('MONGO_MIN_POOL_SIZE', '0')),
+    'waitQueueTimeoutMS': int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', '5000')) or None,
+    'connectTimeoutMS': int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', '5000')) or None,
+    'socketTimeoutMS': int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', '0')) or None,
+    'serverSelectionTimeoutMS': int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+}
+if os.getenv('MONGO_COMPRESSORS'):
+    MONGO_CLIENT['compressors'] = os.getenv('MONGO_COMPRESSORS')
+
 DATABASES = {
     'default': {
         'ENGINE': 'djongo',
         'NAME': 'octofit_db',
         'ENFORCE_SCHEMA': False,
-        'CLIENT': {
-            'host': 'localhost',
-            'port': 27017,
+        'CLIENT': MONGO_CLIENT,
+    }
+}
+
+
+# Cache
+# Local memory by default; set REDIS_URL to share the response cache (and
+# its invalidations) between worker processes. Requires the redis package.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'octofit',
         }
     }
+
+# Cache alias and lifetime (seconds) for leaderboard, team and workout responses
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', '30'))
+
+
+# Serve the leaderboard and team lists with native aggregation pipelines
+# (octofit_tracker.repository) instead of djongo's SQL translation.
+# Requires MongoDB 5.0+ for $setWindowFields.
+OCTOFIT_REPOSITORY_READS = os.getenv('OCTOFIT_REPOSITORY_READS', 'false').lower() in ('1', 'true', 'yes')
+
+# Serve the user, activity and leaderboard lists from values() rows and
+# render JSON with orjson (octofit_tracker.fastlist) when it is installed.
+OCTOFIT_FAST_JSON = os.getenv('OCTOFIT_FAST_JSON', 'false').lower() in ('1', 'true', 'yes')
+
+
+# Leaderboard rank index
+# Users are grouped into buckets of this many points in the in-process rank
+# index; each worker reloads its index from MongoDB after the TTL (seconds).
+# The WSGI and ASGI entry points load it at startup unless WARM is off.
+LEADERBOARD_RANK_BUCKET_WIDTH = int(os.getenv('LEADERBOARD_RANK_BUCKET_WIDTH', '10'))
+LEADERBOARD_RANK_INDEX_TTL = int(os.getenv('LEADERBOARD_RANK_INDEX_TTL', '60'))
+LEADERBOARD_RANK_INDEX_WARM = os.getenv('LEADERBOARD_RANK_INDEX_WARM', 'true').lower() in ('1', 'true', 'yes')
+
+# Spread team point increments over this many counter documents per team
+# (octofit_tracker.team_counters; 0 or 1 updates teams.total_points directly).
+# Run `manage.py fold_team_counters --interval 60` to fold them back. Shard
+# sums are cached per process for TEAM_COUNTER_CACHE_SECONDS. Team totals are
+# over-counted while a fold runs; other processes only see a finished fold
+# at once when REDIS_URL shares the cache, otherwise after up to
+# TEAM_COUNTER_CACHE_SECONDS (and RESPONSE_CACHE_TIMEOUT for cached responses).
+TEAM_COUNTER_SHARDS = int(os.getenv('TEAM_COUNTER_SHARDS', '0'))
+TEAM_COUNTER_CACHE_SECONDS = float(os.getenv('TEAM_COUNTER_CACHE_SECONDS', '1'))
+
+# Write-behind buffer for single activity uploads (octofit_tracker.write_buffer):
+# batches are flushed every INTERVAL_MS or MAX_ITEMS activities. DURABILITY is
+# 'accepted' (202 once queued), 'flushed' (201 once the batch is written) or
+# 'journaled' (201 once the batch is in the MongoDB journal). Accepted
+# activities are lost if the process crashes before the next flush or if
+# their batch fails to write (the failure is only logged). Flushed and
+# journaled uploads get a 503 if their batch is not written within
+# TIMEOUT_MS after the flush interval.
+ACTIVITY_WRITE_BUFFER = os.getenv('ACTIVITY_WRITE_BUFFER', 'false').lower() in ('1', 'true', 'yes')
+ACTIVITY_WRITE_BUFFER_INTERVAL_MS = int(os.getenv('ACTIVITY_WRITE_BUFFER_INTERVAL_MS', '50'))
+ACTIVITY_WRITE_BUFFER_MAX_ITEMS = int(os.getenv('ACTIVITY_WRITE_BUFFER_MAX_ITEMS', '500'))
+ACTIVITY_WRITE_BUFFER_MAX_QUEUE = int(os.getenv('ACTIVITY_WRITE_BUFFER_MAX_QUEUE', '10000'))
+ACTIVITY_WRITE_BUFFER_TIMEOUT_MS = int(os.getenv('ACTIVITY_WRITE_BUFFER_TIMEOUT_MS', '5000'))
+ACTIVITY_WRITE_BUFFER_DURABILITY = os.getenv('ACTIVITY_WRITE_BUFFER_DURABILITY', 'flushed')
+if ACTIVITY_WRITE_BUFFER_DURABILITY not in ('accepted', 'flushed', 'journaled'):
+    raise ImproperlyConfigured(
+        f'ACTIVITY_WRITE_BUFFER_DURABILITY must be accepted, flushed or journaled, not {ACTIVITY_WRITE_BUFFER_DURABILITY!r}.'
+    )
+
+# Activity scoring (octofit_tracker.scoring): points are
+#   base + per_minute * duration + per_calorie * calories + per_km * distance
+# rounded to an integer. Types without an entry use 'default'. After changing
+# the coefficients, run `manage.py rescore_activities` to rescore history.
+ACTIVITY_SCORING = {
+    'default': {'base': 5, 'per_minute': 0.2, 'per_calorie': 0.02, 'per_km': 0},
+    'running': {'base': 5, 'per_minute': 0.2, 'per_calorie': 0.02, 'per_km': 1.5},
+    'cycling': {'base': 5, 'per_minute': 0.15, 'per_calorie': 0.02, 'per_km': 0.5},
+    'swimming': {'base': 5, 'per_minute': 0.25, 'per_calorie': 0.02, 'per_km': 4},
+    'weightlifting': {'base': 5, 'per_minute': 0.25, 'per_calorie': 0.02, 'per_km': 0},
+    'yoga': {'base': 5, 'per_minute': 0.15, 'per_calorie': 0.02, 'per_km': 0},
 }
 
+# Live leaderboard: seconds between event polls (deltas are coalesced per
+# tick) and between keep-alive comments on idle streams.
+LEADERBOARD_LIVE_TICK = float(os.getenv('LEADERBOARD_LIVE_TICK', '1'))
+LEADERBOARD_LIVE_HEARTBEAT = int(os.getenv('LEADERBOARD_LIVE_HEARTBEAT', '15'))
+# Most rows sent in the snapshot that opens (and reopens) a live stream.
+LEADERBOARD_LIVE_SNAPSHOT_LIMIT = int(os.getenv('LEADERBOARD_LIVE_SNAPSHOT_LIMIT', '100'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
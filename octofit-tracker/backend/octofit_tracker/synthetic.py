@@ -0,0 +1,106 @@
+"""
+Reproducible synthetic data generation for load testing.
+
+Users are generated in fixed-size chunks, each with its own random stream
+seeded from ``(seed, chunk)``, so the output is the same whatever the
+number of worker processes. Workers insert users and activities with
+batched ``insert_many`` calls and return only the per-user and per-team
+aggregates, which the caller folds into the leaderboard and team data
+without reading the activities back.
+"""
+import random
+from collections import defaultdict
+from datetime import timedelta
+
+from . import scoring
+from .db import create_client, insert_documents
+
+CHUNK_SIZE = 1000
+
+ACTIVITY_TYPES = ['running', 'cycling', 'swimming', 'weightlifting', 'yoga', 'boxing', 'crossfit']
+DISTANCE_TYPES = {'running', 'cycling', 'swimming'}
+FITNESS_LEVELS = ['beginner', 'intermediate', 'advanced', 'expert']
+GOALS = ['strength', 'endurance', 'cardio', 'flexibility', 'speed', 'power', 'agility', 'mass']
+
+
+def team_name(index):
+    return f'Team {index + 1:03d}'
+
+
+def generate_chunk(job):
+    """
+    Generate and insert one chunk of users and their activities.
+
+    ``job`` is a plain dict so it can be sent to a worker process. Returns
+    ``(entries, team_breakdowns)`` for the chunk, where each entry is a
+    compact ``(username, full_name, team, points, calories, duration,
+    activities)`` tuple.
+    """
+    rng = random.Random(f"{job['seed']}:{job['chunk']}")
+    first = job['chunk'] * CHUNK_SIZE
+    last = min(first + CHUNK_SIZE, job['users'])
+
+    client = create_client(job['client'])
+    try:
+        db = client[job['database']]
+        users = []
+        activities = []
+        entries = []
+        breakdowns = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+
+        for index in range(first, last):
+            username = f"user{index:07d}"
+            team = team_name(index % job['teams'])
+            users.append({
+                'username': username,
+                'email': f'{username}@example.com',
+                'full_name': f'Synthetic User {index}',
+                'team': team,
+                'created_at': job['now'],
+                'fitness_level': rng.choice(FITNESS_LEVELS),
+                'goals': rng.sample(GOALS, 2),
+            })
+            totals = {'points': 0, 'calories': 0, 'duration': 0}
+            for _ in range(job['activities_per_user']):
+                activity_type = rng.choice(ACTIVITY_TYPES)
+                activity = {
+                    'username': username,
+                    'activity_type': activity_type,
+                    'duration_minutes': rng.randint(20, 120),
+                    'calories_burned': rng.randint(100, 800),
+                    'distance_km': round(rng.uniform(1, 20), 2) if activity_type in DISTANCE_TYPES else 0,
+                    'date': job['now'] - timedelta(days=rng.randint(0, 89), seconds=rng.randint(0, 86399)),
+                    'notes': f'{activity_type.capitalize()} session',
+                }
+                activity['points'] = scoring.score(activity, job['scoring'])
+                totals['points'] += activity['points']
+                totals['calories'] += activity['calories_burned']
+                totals['duration'] += activity['duration_minutes']
+                breakdown = breakdowns[team][activity_type]
+                breakdown['count'] += 1
+                breakdown['points'] += activity['points']
+                breakdown['calories_burned'] += activity['calories_burned']
+                breakdown['duration_minutes'] += activity['duration_minutes']
+
+                activities.append(activity)
+                if len(activities) >= job['batch_size']:
+                    insert_documents(db, 'activities', activities)
+                    activities = []
+
+            entries.append((
+                username,
+                users[-1]['full_name'],
+                team,
+                totals['points'],
+                totals['calories'],
+                totals['duration'],
+                job['activities_per_user'],
+            ))
+
+        if activities:
+            insert_documents(db, 'activities', activities)
+        insert_documents(db, 'users', users)
+    finally:
+        client.close()
+
+    return entries, {team: {kind: dict(sums) for kind, sums in kinds.items()} for team, kinds in breakdowns.items()}
@@ -0,0 +1,158 @@
+"""
+Sharded point counters for teams.
+
+Every activity write adds the member's points to their team. With a single
+``teams.total_points`` field, concurrent uploads from one large team all
+contend on that document. When ``TEAM_COUNTER_SHARDS`` is above 1 the
+increments go to one of that many ``team_counters`` documents per team,
+picked at random, instead.
+
+A team's points are then ``teams.total_points`` plus the sum of its
+shards. The team endpoints add the shard sums to the teams before they are
+serialized (``add_pending``), so the output of ``TeamSerializer`` does not
+change, whatever fields are selected; the sums are cached for
+``TEAM_COUNTER_CACHE_SECONDS``. ``fold`` (the ``fold_team_counters``
+command) moves shard values back into ``teams.total_points``. It adds to
+the team before subtracting from the shard, so readers count the folded
+points twice while a fold runs, and a crash in between keeps them counted
+twice until ``rebuild_derived`` reconciles the totals. A finished fold
+replaces the ``team_counters`` and ``teams`` cache generations, which makes
+every process drop its cached sums and team responses; with the default
+local memory cache that only reaches the folding process, so other
+processes may serve the over-count for up to ``TEAM_COUNTER_CACHE_SECONDS``
+and cached team responses for up to ``RESPONSE_CACHE_TIMEOUT``.
+
+Shards are keyed by team name: renaming a team folds its shards into the
+renamed team (``rename``) and deleting it drops them (``remove``).
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+from pymongo import UpdateOne
+
+from .cache import generation, invalidate
+
+COLLECTION = 'team_counters'
+
+_pending = None
+_pending_at = 0.0
+_pending_generation = None
+_pending_lock = threading.Lock()
+
+
+def shard_count():
+    return getattr(settings, 'TEAM_COUNTER_SHARDS', 0)
+
+
+def increment(db, team, points):
+    """
+    Add ``points`` to ``team``, on a random shard when sharding is enabled.
+    """
+    shards = shard_count()
+    if shards <= 1:
+        db.teams.update_one({'name': team}, {'$inc': {'total_points': points}})
+        return
+    db[COLLECTION].update_one(
+        {'team': team, 'shard': random.randrange(shards)},
+        {'$inc': {'points': points}},
+        upsert=True,
+    )
+
+
+def pending(db):
+    """
+    Return ``{team: points}`` not yet folded into ``teams.total_points``.
+    """
+    global _pending, _pending_at, _pending_generation
+    ttl = getattr(settings, 'TEAM_COUNTER_CACHE_SECONDS', 1)
+    folded = generation(COLLECTION)
+    with _pending_lock:
+        if _pending is None or _pending_generation != folded or time.monotonic() - _pending_at > ttl:
+            _pending = {
+                group['_id']: group['points']
+                for group in db[COLLECTION].aggregate([{'$group': {'_id': '$team', 'points': {'$sum': '$points'}}}])
+                if group['points']
+            }
+            _pending_at = time.monotonic()
+            _pending_generation = folded
+        return _pending
+
+
+def add_pending(db, teams):
+    """
+    Add unfolded shard points to ``Team`` instances' ``total_points``, in place.
+
+    The instances must not be saved afterwards. Returns them as a list.
+    """
+    teams = list(teams)
+    points = pending(db) if teams else {}
+    for team in teams:
+        if team.name in points:
+            team.total_points = (team.total_points or 0) + points[team.name]
+    return teams
+
+
+def fold(db, team=None, into=None):
+    """
+    Move non-zero shards into ``teams.total_points``; returns the number of teams updated.
+
+    Only ``team``'s shards are folded when it is given, into the team named
+    ``into`` if that is given too. Shards of teams that no longer exist are
+    left alone.
+    """
+    query = {'points': {'$ne': 0}}
+    if team is not None:
+        query['team'] = team
+    shards = list(db[COLLECTION].find(query, {'team': True, 'points': True}))
+    targets = {shard['team']: into or shard['team'] for shard in shards}
+    existing = set(db.teams.distinct('name', {'name': {'$in': list(set(targets.values()))}})) if shards else set()
+    shards = [shard for shard in shards if targets[shard['team']] in existing]
+    totals = {}
+    for shard in shards:
+        target = targets[shard['team']]
+        totals[target] = totals.get(target, 0) + shard['points']
+    if totals:
+        db.teams.bulk_write([
+            UpdateOne({'name': team}, {'$inc': {'total_points': points}})
+            for team, points in totals.items()
+        ], ordered=False)
+        db[COLLECTION].bulk_write([
+            UpdateOne({'_id': shard['_id']}, {'$inc': {'points': -shard['points']}})
+            for shard in shards
+        ], ordered=False)
+        invalidate(COLLECTION, 'teams')
+    reset()
+    return len(totals)
+
+
+def rename(db, old, new):
+    """
+    Fold a renamed team's shards into its document under the new name.
+    """
+    if old == new:
+        return
+    fold(db, team=old, into=new)
+    db[COLLECTION].delete_many({'team': old, 'points': 0})
+
+
+def remove(db, team):
+    db[COLLECTION].delete_many({'team': team})
+    invalidate(COLLECTION)
+    reset()
+
+
+def clear(db):
+    """
+    Drop all shard values, for when team totals are recomputed from scratch.
+    """
+    db[COLLECTION].delete_many({})
+    invalidate(COLLECTION)
+    reset()
+
+
+def reset():
+    global _pending
+    with _pending_lock:
+        _pending = None
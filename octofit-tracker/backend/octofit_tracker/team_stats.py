@@ -0,0 +1,170 @@
+"""
+Materialized per-team statistics.
+
+The ``team_stats`` collection holds one document per team with its totals,
+member count and a per-``activity_type`` breakdown. Activity writes update
+it with ``$inc`` alongside the leaderboard, so team dashboards read a
+single document per team instead of aggregating on every request.
+"""
+from collections import defaultdict
+
+from django.utils import timezone
+from pymongo import UpdateOne
+
+from . import repository
+from .db import field_value
+
+COLLECTION = 'team_stats'
+
+TYPE_FIELDS = {
+    'count': None,
+    'points': 'points',
+    'calories_burned': 'calories_burned',
+    'duration_minutes': 'duration_minutes',
+}
+
+
+def type_key(activity_type):
+    """
+    Make an activity type safe to use as a MongoDB field name.
+    """
+    return str(activity_type or 'unknown').replace('.', '_').lstrip('$') or 'unknown'
+
+
+def apply_changes(db, user_teams, user_deltas, added=(), removed=()):
+    """
+    Fold leaderboard deltas and the activities behind them into team documents.
+
+    ``user_teams`` maps usernames to team names and ``user_deltas`` holds the
+    per-user leaderboard deltas that were just applied.
+    """
+    increments = defaultdict(lambda: defaultdict(int))
+    for username, delta in user_deltas.items():
+        team = user_teams.get(username)
+        if team:
+            for field, amount in delta.items():
+                increments[team][field] += amount
+
+    for activities, sign in ((added, 1), (removed, -1)):
+        for activity in activities:
+            team = user_teams.get(field_value(activity, 'username'))
+            if not team:
+                continue
+            prefix = f"by_activity_type.{type_key(field_value(activity, 'activity_type'))}"
+            for field, source in TYPE_FIELDS.items():
+                amount = 1 if source is None else (field_value(activity, source) or 0)
+                increments[team][f'{prefix}.{field}'] += sign * amount
+
+    now = timezone.now()
+    operations = [
+        UpdateOne(
+            {'team': team},
+            {'$inc': {field: amount for field, amount in fields.items() if amount},
+             '$set': {'updated_at': now}},
+            upsert=True,
+        )
+        for team, fields in increments.items()
+        if any(fields.values())
+    ]
+    if operations:
+        db[COLLECTION].bulk_write(operations, ordered=False)
+
+
+def set_member_count(db, team, member_count):
+    db[COLLECTION].update_one(
+        {'team': team},
+        {'$set': {'member_count': member_count, 'updated_at': timezone.now()}},
+        upsert=True,
+    )
+
+
+def rename(db, old, new):
+    """
+    Move a team's statistics to its new name.
+
+    Any document already stored under ``new`` belongs to a deleted team
+    and is replaced.
+    """
+    if old == new:
+        return
+    db[COLLECTION].delete_one({'team': new})
+    db[COLLECTION].update_one({'team': old}, {'$set': {'team': new, 'updated_at': timezone.now()}})
+
+
+def remove(db, team):
+    db[COLLECTION].delete_one({'team': team})
+
+
+def rebuild(db):
+    """
+    Recompute every team document from the leaderboard and activities.
+    """
+    user_teams = {user['username']: user.get('team') for user in db.users.find({}, {'username': True, 'team': True})}
+    rosters = {team['name']: len(team.get('members') or []) for team in db.teams.find({}, {'name': True, 'members': True})}
+
+    documents = {}
+    for totals in repository.team_totals(db):
+        team = totals.pop('team')
+        if not team:
+            continue
+        totals.pop('average_points', None)
+        totals['member_count'] = rosters.get(team, totals['member_count'])
+        documents[team] = dict(totals, team=team, by_activity_type={})
+
+    for team, members in rosters.items():
+        documents.setdefault(team, {
+            'team': team,
+            'member_count': members,
+            'total_points': 0,
+            'total_calories': 0,
+            'total_duration_minutes': 0,
+            'total_activities': 0,
+            'by_activity_type': {},
+        })
+
+    pipeline = [{'$group': {
+        '_id': {'username': '$username', 'activity_type': '$activity_type'},
+        'count': {'$sum': 1},
+        'points': {'$sum': '$points'},
+        'calories_burned': {'$sum': '$calories_burned'},
+        'duration_minutes': {'$sum': '$duration_minutes'},
+    }}]
+    for group in db.activities.aggregate(pipeline, allowDiskUse=True):
+        team = user_teams.get(group['_id']['username'])
+        if team not in documents:
+            continue
+        breakdown = documents[team]['by_activity_type'].setdefault(
+            type_key(group['_id']['activity_type']), dict.fromkeys(TYPE_FIELDS, 0)
+        )
+        for field in TYPE_FIELDS:
+            breakdown[field] += group[field]
+
+    return replace_all(db, documents)
+
+
+def replace_all(db, documents):
+    """
+    Make ``team_stats`` hold exactly ``documents``, a mapping of team name to document.
+    """
+    now = timezone.now()
+    db[COLLECTION].delete_many({'team': {'$nin': list(documents)}})
+    operations = [
+        UpdateOne({'team': team}, {'$set': dict(document, team=team, updated_at=now)}, upsert=True)
+        for team, document in documents.items()
+    ]
+    if operations:
+        db[COLLECTION].bulk_write(operations, ordered=False)
+    return len(documents)
+
+
+def read(db, team=None):
+    """
+    Return team documents, highest points first, with the per-member average.
+    """
+    query = {'team': team} if team else {}
+    rows = []
+    for document in db[COLLECTION].find(query, {'_id': False}).sort('total_points', -1):
+        members = document.get('member_count') or 0
+        document['average_points'] = document.get('total_points', 0) / members if members else 0
+        rows.append(document)
+    return rows
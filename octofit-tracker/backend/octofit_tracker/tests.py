@@ -1,8 +1,22 @@
-from django.test import TestCase
+import json
+import threading
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.utils import timezone
+from pymongo import monitoring as pymongo_monitoring
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
+from . import benchmarks, folding, instrumentation, leaderboard, live, monitoring, ranking, rollups, scoring, synthetic, team_counters, windows, write_buffer
+from .cache import get_cache
+from .db import get_db
+from .indexes import MongoIndex
+from .management.commands import populate_db, rescore_activities
 from .models import User, Team, Activity, Leaderboard, Workout
+from .ranking import RankIndex, reset_rank_index
+from .serializers import LeaderboardSerializer
 
 
 class UserModelTest(TestCase):
@@ -217,3 +231,1158 @@ class WorkoutAPITest(APITestCase):
         """Test retrieving workouts via API."""
         response = self.client.get('/api/workouts/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class LeaderboardMaintenanceTest(APITestCase):
+    """Test cases for incremental leaderboard updates on activity writes."""
+
+    def setUp(self):
+        self.client = APIClient()
+        for username in ('runner', 'walker'):
+            User.objects.create(
+                username=username,
+                email=f'{username}@example.com',
+                full_name=username.title(),
+                team='Speed Team',
+                fitness_level='beginner',
+            )
+        Team.objects.create(
+            name='Speed Team',
+            description='A team of movers',
+            captain='runner',
+            members=['runner', 'walker'],
+        )
+        self.activity_data = {
+            'username': 'runner',
+            'activity_type': 'running',
+            'duration_minutes': 30,
+            'calories_burned': 300,
+            'distance_km': 5.0,
+            'notes': 'Morning run',
+            'points': 25
+        }
+
+    def post_activity(self, **overrides):
+        data = dict(self.activity_data, **overrides)
+        response = self.client.post('/api/activities/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data
+
+    def test_create_activity_updates_totals(self):
+        """Test that creating an activity increments leaderboard and team totals."""
+        self.post_activity()
+        entry = Leaderboard.objects.get(username='runner')
+        self.assertEqual(entry.total_points, 25)
+        self.assertEqual(entry.total_calories, 300)
+        self.assertEqual(entry.total_duration_minutes, 30)
+        self.assertEqual(entry.total_activities, 1)
+        self.assertEqual(entry.team, 'Speed Team')
+        self.assertEqual(Team.objects.get(name='Speed Team').total_points, 25)
+
+    def test_update_and_delete_activity_adjust_totals(self):
+        """Test that updates apply the difference and deletes revert it."""
+        activity = self.post_activity()
+        response = self.client.patch(f"/api/activities/{activity['id']}/", {'points': 40}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Leaderboard.objects.get(username='runner').total_points, 40)
+
+        response = self.client.delete(f"/api/activities/{activity['id']}/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        entry = Leaderboard.objects.get(username='runner')
+        self.assertEqual(entry.total_points, 0)
+        self.assertEqual(entry.total_activities, 0)
+        self.assertEqual(Team.objects.get(name='Speed Team').total_points, 0)
+
+    def test_ranks_follow_points(self):
+        """Test that only users whose position changed are re-ranked."""
+        self.post_activity(points=10)
+        self.post_activity(username='walker', points=20)
+        self.assertEqual(Leaderboard.objects.get(username='walker').rank, 1)
+        self.assertEqual(Leaderboard.objects.get(username='runner').rank, 2)
+
+        self.post_activity(points=15)
+        self.assertEqual(Leaderboard.objects.get(username='runner').rank, 1)
+        self.assertEqual(Leaderboard.objects.get(username='walker').rank, 2)
+
+    def test_first_entry_ensures_unique_username(self):
+        """Test that creating the first row for a user makes sure usernames are unique."""
+        leaderboard._username_index_ready = False
+        self.post_activity()
+        self.assertTrue(any(
+            info.get('unique') and [field for field, _ in info['key']] == ['username']
+            for info in get_db().leaderboard.index_information().values()
+        ))
+
+    def test_concurrent_writers_keep_ranks_consistent(self):
+        """Test that concurrent writers in one process leave ranks unique and in order."""
+        usernames = [f'user{i:02d}' for i in range(8)]
+        for rank, username in enumerate(usernames, start=1):
+            Leaderboard.objects.create(username=username, full_name=username, team='', rank=rank)
+
+        def write(username, points):
+            db = get_db()
+            for step in range(5):
+                leaderboard.apply_delta(db, username, {'total_points': points + step, 'total_activities': 1})
+
+        threads = [
+            threading.Thread(target=write, args=(username, (i * 7) % 11))
+            for i, username in enumerate(usernames)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        entries = list(Leaderboard.objects.order_by('rank'))
+        self.assertEqual([entry.rank for entry in entries], list(range(1, len(usernames) + 1)))
+        self.assertEqual(
+            [entry.username for entry in entries],
+            [entry.username for entry in sorted(entries, key=lambda entry: (-entry.total_points, entry.username))],
+        )
+
+
+class RankIndexTest(TestCase):
+    """Test cases for the in-process leaderboard rank index."""
+
+    def setUp(self):
+        self.index = RankIndex(bucket_width=10)
+        self.index.load([('alice', 120), ('bob', 75), ('carol', 75), ('dave', 3)])
+
+    def test_rank_and_select(self):
+        """Test that ranks follow points, with ties broken by username."""
+        self.assertEqual(self.index.rank('alice'), 1)
+        self.assertEqual(self.index.rank('bob'), 2)
+        self.assertEqual(self.index.rank('carol'), 3)
+        self.assertEqual(self.index.select(4), ('dave', 3))
+        self.assertIsNone(self.index.select(5))
+
+    def test_update_moves_user(self):
+        """Test that updates re-position a user and grow past the last bucket."""
+        self.index.update('dave', 5000)
+        self.index.update('erin', 80)
+        self.assertEqual(self.index.rank('dave'), 1)
+        self.assertEqual(self.index.rank('erin'), 3)
+        self.assertEqual(self.index.window(2, 3), [(2, 'alice', 120), (3, 'erin', 80)])
+
+    def test_percentile(self):
+        """Test that percentiles run from 100 for the leader to 0 for the last user."""
+        self.assertEqual(self.index.percentile('alice'), 100.0)
+        self.assertAlmostEqual(self.index.percentile('bob'), 200 / 3)
+        self.assertEqual(self.index.percentile('dave'), 0.0)
+        self.assertIsNone(self.index.percentile('nobody'))
+
+    def test_stale_index_answers_during_reload(self):
+        """Test that a stale index keeps answering while another caller reloads it."""
+        reset_rank_index()
+        Leaderboard.objects.create(username='alice', full_name='Alice', team='', total_points=10, rank=1)
+        stale = ranking.get_rank_index()
+        ranking._loaded_at = 0.0
+        with ranking._reload_lock:
+            self.assertIs(ranking.get_rank_index(), stale)
+            ranking.record_points('bob', 20)
+        fresh = ranking.get_rank_index()
+        self.assertIsNot(fresh, stale)
+        self.assertEqual(fresh.rank('alice'), 1)
+        reset_rank_index()
+
+
+class LeaderboardRankAPITest(APITestCase):
+    """Test cases for the rank and around-me leaderboard endpoints."""
+
+    def setUp(self):
+        self.client = APIClient()
+        reset_rank_index()
+        for rank, (username, points) in enumerate([('alice', 90), ('bob', 60), ('carol', 30)], start=1):
+            Leaderboard.objects.create(
+                username=username,
+                full_name=username.title(),
+                team='Test Team',
+                total_points=points,
+                rank=rank
+            )
+
+    def tearDown(self):
+        reset_rank_index()
+
+    def test_get_rank(self):
+        """Test retrieving a single user's rank."""
+        response = self.client.get('/api/leaderboard/rank/bob/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['rank'], 2)
+        self.assertEqual(response.data['total_users'], 3)
+
+    def test_get_around(self):
+        """Test retrieving the window of entries around a user."""
+        response = self.client.get('/api/leaderboard/around/carol/?radius=1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['username'] for row in response.data['results']], ['bob', 'carol'])
+
+    def test_unknown_user(self):
+        """Test that an unknown user returns 404."""
+        response = self.client.get('/api/leaderboard/rank/nobody/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get('/api/leaderboard/percentile/nobody/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_top(self):
+        """Test the top-k list and its bounds."""
+        response = self.client.get('/api/leaderboard/top/?k=2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [
+            {'rank': 1, 'username': 'alice', 'total_points': 90},
+            {'rank': 2, 'username': 'bob', 'total_points': 60},
+        ])
+        response = self.client.get('/api/leaderboard/top/?k=0')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_percentile(self):
+        """Test a user's percentile."""
+        response = self.client.get('/api/leaderboard/percentile/bob/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['rank'], response.data['percentile']), (2, 50.0))
+
+
+class ActivityListAPITest(APITestCase):
+    """Test cases for cursor pagination and filtering of activities."""
+
+    def setUp(self):
+        self.client = APIClient()
+        now = timezone.now()
+        for days_ago, username, activity_type in [(0, 'alice', 'running'), (1, 'bob', 'yoga'), (2, 'alice', 'yoga')]:
+            Activity.objects.create(
+                username=username,
+                activity_type=activity_type,
+                duration_minutes=30,
+                calories_burned=200,
+                date=now - timedelta(days=days_ago),
+                points=10
+            )
+
+    def test_cursor_pagination(self):
+        """Test that pages follow the next cursor, newest first."""
+        response = self.client.get('/api/activities/?page_size=2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([a['username'] for a in response.data['results']], ['alice', 'bob'])
+        self.assertIsNotNone(response.data['next'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['activity_type'], 'yoga')
+        self.assertIsNone(response.data['next'])
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor returns 404."""
+        response = self.client.get('/api/activities/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_filters(self):
+        """Test filtering by username, activity type and date range."""
+        response = self.client.get('/api/activities/?username=alice&activity_type=yoga')
+        self.assertEqual(len(response.data['results']), 1)
+
+        since = (timezone.now() - timedelta(days=1, hours=1)).isoformat()
+        response = self.client.get('/api/activities/', {'date_after': since})
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_invalid_date_filter(self):
+        """Test that an unparseable date returns 400."""
+        response = self.client.get('/api/activities/?date_after=yesterday')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sparse_fieldsets(self):
+        """Test that fields and omit trim list rows without breaking the cursor."""
+        response = self.client.get('/api/activities/?page_size=2&fields=id,username')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'username'})
+        response = self.client.get(response.data['next'])
+        self.assertEqual(set(response.data['results'][0]), {'id', 'username'})
+
+        response = self.client.get('/api/activities/?omit=notes,distance_km')
+        self.assertNotIn('notes', response.data['results'][0])
+        self.assertIn('points', response.data['results'][0])
+
+        response = self.client.get('/api/activities/?fields=id,bogus')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FastListAPITest(APITestCase):
+    """Test cases for the values() list path and orjson rendering."""
+
+    def setUp(self):
+        self.client = APIClient()
+        now = timezone.now()
+        User.objects.create(
+            username='alice', email='alice@example.com', full_name='Alice Ünal',
+            team='Marvel', fitness_level='advanced', goals=['strength'],
+        )
+        for days_ago in range(3):
+            Activity.objects.create(
+                username='alice',
+                activity_type='running',
+                duration_minutes=30,
+                calories_burned=200,
+                distance_km=5,
+                date=now - timedelta(days=days_ago),
+                notes='Morning run',
+                points=10
+            )
+        Leaderboard.objects.create(username='alice', full_name='Alice Ünal', team='Marvel', total_points=30)
+
+    def test_same_bytes(self):
+        """Test that the fast path renders exactly what the serializers do."""
+        for path in ['/api/users/', '/api/activities/?page_size=2', '/api/leaderboard/', '/api/activities/?fields=id,date']:
+            get_cache().clear()
+            expected = self.client.get(path).content
+            get_cache().clear()
+            with override_settings(OCTOFIT_FAST_JSON=True):
+                response = self.client.get(path)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.content, expected, path)
+
+    @override_settings(OCTOFIT_FAST_JSON=True)
+    def test_cursor(self):
+        """Test that dict rows still produce a usable next cursor."""
+        response = self.client.get('/api/activities/?page_size=2')
+        self.assertEqual(len(response.json()['results']), 2)
+        response = self.client.get(response.json()['next'])
+        self.assertEqual(len(response.json()['results']), 1)
+
+
+class ActivityBulkAPITest(APITestCase):
+    """Test cases for bulk activity ingestion."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.activity_data = {
+            'username': 'bulkuser',
+            'activity_type': 'running',
+            'duration_minutes': 30,
+            'calories_burned': 250,
+            'distance_km': 5.0,
+            'points': 20
+        }
+
+    def test_bulk_create(self):
+        """Test that a list of activities is inserted and folded into the leaderboard once."""
+        data = [self.activity_data, dict(self.activity_data, activity_type='cycling', points=15)]
+        response = self.client.post('/api/activities/bulk/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        self.assertTrue(all(row['id'] for row in response.data['results']))
+        self.assertEqual(Activity.objects.filter(username='bulkuser').count(), 2)
+
+        entry = Leaderboard.objects.get(username='bulkuser')
+        self.assertEqual(entry.total_points, 35)
+        self.assertEqual(entry.total_activities, 2)
+
+    def test_bulk_validation_errors(self):
+        """Test that invalid items are reported by index and nothing is inserted."""
+        data = [self.activity_data, {'username': 'bulkuser'}]
+        response = self.client.post('/api/activities/bulk/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1])
+        self.assertFalse(Activity.objects.filter(username='bulkuser').exists())
+
+    def test_bulk_requires_list(self):
+        """Test that a single object is rejected."""
+        response = self.client.post('/api/activities/bulk/', self.activity_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ActivityExportAPITest(APITestCase):
+    """Test cases for streaming activity exports."""
+
+    def setUp(self):
+        self.client = APIClient()
+        for username in ('alice', 'alice', 'bob'):
+            Activity.objects.create(
+                username=username,
+                activity_type='running',
+                duration_minutes=30,
+                calories_burned=200,
+                points=10
+            )
+
+    def test_export_ndjson(self):
+        """Test exporting filtered activities as NDJSON."""
+        response = self.client.get('/api/activities/export/?format=ndjson&username=alice')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[0])['username'], 'alice')
+
+    def test_export_csv(self):
+        """Test exporting activities as CSV with a header row."""
+        response = self.client.get('/api/activities/export/?format=csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertTrue(lines[0].startswith('id,username,activity_type'))
+        self.assertEqual(len(lines), 4)
+
+
+class ResponseCacheAPITest(APITestCase):
+    """Test cases for cached responses, ETags and write invalidation."""
+
+    def setUp(self):
+        self.client = APIClient()
+        get_cache().clear()
+        self.workout_data = {
+            'name': 'Cached Workout',
+            'description': 'A workout for cache tests',
+            'difficulty': 'beginner',
+            'duration_minutes': 20,
+            'exercises': [],
+            'target_muscles': ['core']
+        }
+
+    def test_etag_not_modified(self):
+        """Test that a matching If-None-Match returns 304 with no body."""
+        response = self.client.get('/api/workouts/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        response = self.client.get('/api/workouts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    def test_write_invalidates(self):
+        """Test that a write through the viewset changes the cached list."""
+        etag = self.client.get('/api/workouts/')['ETag']
+        self.client.post('/api/workouts/', self.workout_data, format='json')
+
+        response = self.client.get('/api/workouts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Cached Workout', [workout['name'] for workout in response.data])
+
+    def test_activity_write_invalidates_leaderboard(self):
+        """Test that activity writes invalidate the cached leaderboard."""
+        etag = self.client.get('/api/leaderboard/')['ETag']
+        self.client.post('/api/activities/', {
+            'username': 'cacheuser',
+            'activity_type': 'yoga',
+            'duration_minutes': 30,
+            'calories_burned': 100,
+            'points': 5
+        }, format='json')
+
+        response = self.client.get('/api/leaderboard/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('cacheuser', [entry['username'] for entry in response.data])
+
+
+class MongoIndexTest(TestCase):
+    """Test cases for index declarations and the sync_indexes command."""
+
+    def test_declaration(self):
+        """Test key parsing and option drift detection."""
+        index = MongoIndex('username', '-date', unique=True)
+        self.assertEqual(index.keys, [('username', 1), ('date', -1)])
+        self.assertEqual(index.name, 'username_1_date_-1')
+        self.assertTrue(index.key_matches({'key': [('username', 1.0), ('date', -1.0)]}))
+        self.assertEqual(index.differences({'key': index.keys, 'unique': True}), {})
+        self.assertEqual(index.differences({'key': index.keys}), {'unique': (True, None)})
+
+    def test_sync_then_check(self):
+        """Test that declared indexes are created and then pass the check."""
+        call_command('sync_indexes', stdout=StringIO())
+        call_command('sync_indexes', check=True, stdout=StringIO())
+
+
+class RepositoryAPITest(APITestCase):
+    """Test cases for aggregation-pipeline reads."""
+
+    def setUp(self):
+        self.client = APIClient()
+        get_cache().clear()
+        self.user = User.objects.create(
+            username='statsuser',
+            email='stats@example.com',
+            full_name='Stats User',
+            team='Stats Team',
+            fitness_level='intermediate'
+        )
+        for activity_type, points in [('running', 20), ('running', 10), ('yoga', 5)]:
+            Activity.objects.create(
+                username='statsuser',
+                activity_type=activity_type,
+                duration_minutes=30,
+                calories_burned=100,
+                points=points
+            )
+        for username, points in [('statsuser', 35), ('other', 50)]:
+            Leaderboard.objects.create(username=username, full_name=username, team='Stats Team', total_points=points)
+
+    @override_settings(OCTOFIT_REPOSITORY_READS=True)
+    def test_leaderboard_pipeline(self):
+        """Test that the pipeline path ranks by points with the serializer's schema."""
+        response = self.client.get('/api/leaderboard/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['username'] for row in response.data[:2]], ['other', 'statsuser'])
+        self.assertEqual(response.data[0]['rank'], 1)
+        self.assertEqual(set(response.data[0]), set(LeaderboardSerializer().fields))
+
+
+class TeamStatsAPITest(APITestCase):
+    """Test cases for the materialized team statistics."""
+
+    def setUp(self):
+        self.client = APIClient()
+        get_cache().clear()
+        User.objects.create(
+            username='teamstats',
+            email='teamstats@example.com',
+            full_name='Team Stats',
+            team='Stats Squad',
+            fitness_level='beginner'
+        )
+        self.client.post('/api/teams/', {
+            'name': 'Stats Squad',
+            'description': 'Materialized stats',
+            'captain': 'teamstats',
+            'members': ['teamstats', 'someone'],
+        }, format='json')
+
+    def post_activity(self, activity_type, points):
+        return self.client.post('/api/activities/', {
+            'username': 'teamstats',
+            'activity_type': activity_type,
+            'duration_minutes': 30,
+            'calories_burned': 100,
+            'points': points
+        }, format='json').data
+
+    def test_stats_follow_activity_writes(self):
+        """Test that totals, averages and per-type breakdowns follow activity writes."""
+        self.post_activity('running', 20)
+        yoga = self.post_activity('yoga', 10)
+
+        response = self.client.get('/api/teams/stats/?team=Stats Squad')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stats = response.data[0]
+        self.assertEqual(stats['total_points'], 30)
+        self.assertEqual(stats['member_count'], 2)
+        self.assertEqual(stats['average_points'], 15)
+        self.assertEqual(stats['by_activity_type']['yoga']['count'], 1)
+
+        self.client.patch(f"/api/activities/{yoga['id']}/", {'activity_type': 'running'}, format='json')
+        stats = self.client.get('/api/teams/stats/?team=Stats Squad').data[0]
+        self.assertEqual(stats['by_activity_type']['running']['count'], 2)
+        self.assertEqual(stats['by_activity_type']['yoga']['count'], 0)
+
+    def test_rename_moves_stats(self):
+        """Test that renaming a team keeps its statistics under the new name."""
+        self.post_activity('running', 20)
+        team = Team.objects.get(name='Stats Squad')
+        response = self.client.patch(f'/api/teams/{team.pk}/', {'name': 'Stats Crew'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.client.get('/api/teams/stats/?team=Stats Squad').data, [])
+        stats = self.client.get('/api/teams/stats/?team=Stats Crew').data[0]
+        self.assertEqual((stats['total_points'], stats['member_count']), (20, 2))
+
+
+class BenchmarkStatsTest(TestCase):
+    """Test cases for benchmark summaries and baseline comparison."""
+
+    def test_percentiles(self):
+        """Test nearest-rank percentiles."""
+        samples = [i / 1000 for i in range(1, 101)]
+        summary = benchmarks.summarize(samples, [2] * 100, elapsed=2.0)
+        self.assertEqual(summary['p50_ms'], 50.0)
+        self.assertEqual(summary['p99_ms'], 99.0)
+        self.assertEqual(summary['throughput_rps'], 50.0)
+        self.assertEqual(summary['db_round_trips'], 2.0)
+
+    def test_compare(self):
+        """Test that slowdowns beyond the threshold and extra round-trips are reported."""
+        endpoint = {'p50_ms': 10.0, 'p95_ms': 20.0, 'p99_ms': 30.0, 'throughput_rps': 100.0, 'db_round_trips': 2.0}
+        baseline = {'endpoints': {'users-list': endpoint}}
+        self.assertEqual(benchmarks.compare(baseline, {'endpoints': {'users-list': dict(endpoint, p95_ms=23.0)}}, 0.2), [])
+
+        regressions = benchmarks.compare(
+            baseline, {'endpoints': {'users-list': dict(endpoint, p95_ms=25.0, db_round_trips=3.0)}}, 0.2
+        )
+        self.assertEqual(len(regressions), 2)
+
+
+class InstrumentationTest(APITestCase):
+    """Test cases for Server-Timing and the metrics endpoint."""
+
+    def test_server_timing_header(self):
+        """Test that responses carry the phase breakdown."""
+        response = self.client.get('/api/users/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        phases = [part.split(';')[0] for part in response['Server-Timing'].split(', ')]
+        self.assertEqual(phases, ['db-sql', 'db-mongo', 'app', 'render', 'total'])
+
+    def test_metrics(self):
+        """Test that requests are aggregated per route."""
+        self.client.get('/api/users/')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn('octofit_request_duration_seconds_count{route="user-list"}', body)
+        self.assertNotIn('route="metrics"', body)
+
+    def test_registry_buckets(self):
+        """Test that histogram buckets are cumulative."""
+        registry = instrumentation.MetricsRegistry()
+        registry.observe('r', 0.003, {'app': 0.003}, 1, 1)
+        registry.observe('r', 0.2, {'app': 0.2}, 2, 2)
+        body = registry.render()
+        self.assertIn('octofit_request_duration_seconds_bucket{route="r",le="0.005"} 1', body)
+        self.assertIn('octofit_request_duration_seconds_bucket{route="r",le="+Inf"} 2', body)
+        self.assertIn('octofit_db_queries_total{route="r"} 3', body)
+
+    def test_pool_metrics(self):
+        """Test that pool events become gauges and a checkout wait histogram."""
+        address = ('db.example', 27017)
+        pool = monitoring.PoolMonitor()
+        pool.connection_created(pymongo_monitoring.ConnectionCreatedEvent(address, 1))
+        pool.connection_check_out_started(pymongo_monitoring.ConnectionCheckOutStartedEvent(address))
+        pool.connection_checked_out(pymongo_monitoring.ConnectionCheckedOutEvent(address, 1))
+        pool.connection_check_out_started(pymongo_monitoring.ConnectionCheckOutStartedEvent(address))
+        pool.connection_check_out_failed(pymongo_monitoring.ConnectionCheckOutFailedEvent(
+            address, pymongo_monitoring.ConnectionCheckOutFailedReason.TIMEOUT
+        ))
+        body = '\n'.join(pool.exposition())
+        self.assertIn('octofit_mongo_pool_connections_in_use{server="db.example:27017"} 1', body)
+        self.assertIn('octofit_mongo_pool_connections_open{server="db.example:27017"} 1', body)
+        self.assertIn('octofit_mongo_pool_checkout_timeouts_total{server="db.example:27017"} 1', body)
+        self.assertIn('octofit_mongo_pool_checkout_wait_seconds_count{server="db.example:27017"} 2', body)
+
+    def test_metrics_include_pool(self):
+        """Test that /metrics exposes the shared client's pool."""
+        self.client.get('/api/users/')
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('# TYPE octofit_mongo_pool_checkout_wait_seconds histogram', body)
+
+
+class RollupStatsAPITest(APITestCase):
+    """Test cases for the daily and weekly activity rollups."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create(
+            username='rollupuser',
+            email='rollup@example.com',
+            full_name='Rollup User',
+            team='Rollup Team',
+            fitness_level='beginner'
+        )
+        # Monday 2024-01-08 and Sunday 2024-01-14 share ISO week 2; 2024-01-15 starts week 3.
+        for day, activity_type, points in [('08', 'running', 20), ('08', 'yoga', 5), ('14', 'running', 10), ('15', 'running', 7)]:
+            response = self.client.post('/api/activities/', {
+                'username': 'rollupuser',
+                'activity_type': activity_type,
+                'duration_minutes': 30,
+                'calories_burned': 100,
+                'distance_km': 2.5,
+                'date': f'2024-01-{day}T09:00:00Z',
+                'points': points
+            }, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_daily_series(self):
+        """Test per-day sums and the range filter."""
+        response = self.client.get(f'/api/users/{self.user.id}/stats/?from=2024-01-08&to=2024-01-14')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['start'] for row in response.data['series']], ['2024-01-08', '2024-01-14'])
+        self.assertEqual(response.data['series'][0]['points'], 25)
+        self.assertEqual(response.data['totals']['count'], 3)
+        self.assertEqual(response.data['by_activity_type']['running']['count'], 2)
+
+    def test_weekly_series(self):
+        """Test ISO week buckets."""
+        response = self.client.get(f'/api/users/{self.user.id}/stats/?bucket=week')
+        self.assertEqual([row['key'] for row in response.data['series']], ['2024-W02', '2024-W03'])
+        self.assertEqual([row['points'] for row in response.data['series']], [35, 7])
+        self.assertEqual(response.data['totals']['points'], 42)
+
+    def test_delete_and_rebuild(self):
+        """Test that deletes are subtracted and the rebuild matches."""
+        activity = Activity.objects.get(username='rollupuser', points=7)
+        self.client.delete(f'/api/activities/{activity.id}/')
+        before = self.client.get(f'/api/users/{self.user.id}/stats/?bucket=week').data
+        self.assertEqual(len(before['series']), 1)
+
+        call_command('rebuild_rollups', stdout=StringIO())
+        after = self.client.get(f'/api/users/{self.user.id}/stats/?bucket=week').data
+        self.assertEqual(after, before)
+
+    def test_rebuild_swaps_collection(self):
+        """Test that the rebuild keeps the rollup indexes and replaces the collection in one step."""
+        db = get_db()
+        before = self.client.get(f'/api/users/{self.user.id}/stats/').data
+        indexes = set(db[rollups.COLLECTION].index_information())
+        self.assertEqual(rollups.rebuild(db, batch_size=1), db[rollups.COLLECTION].count_documents({}))
+        self.assertEqual(set(db[rollups.COLLECTION].index_information()), indexes)
+        self.assertNotIn(rollups.TEMP_COLLECTION, db.list_collection_names())
+        self.assertEqual(self.client.get(f'/api/users/{self.user.id}/stats/').data, before)
+
+    def test_invalid_parameters(self):
+        """Test that unknown buckets and bad dates return 400."""
+        response = self.client.get(f'/api/users/{self.user.id}/stats/?bucket=month')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(f'/api/users/{self.user.id}/stats/?from=2024-13-01')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LeaderboardWindowAPITest(APITestCase):
+    """Test cases for the time-windowed leaderboards."""
+
+    def setUp(self):
+        self.client = APIClient()
+        get_cache().clear()
+        windows.reset()
+        now = timezone.now()
+        for username, days_ago, points in [('alice', 0, 10), ('alice', 10, 20), ('bob', 0, 5)]:
+            response = self.client.post('/api/activities/', {
+                'username': username,
+                'activity_type': 'running',
+                'duration_minutes': 30,
+                'calories_burned': 100,
+                'date': (now - timedelta(days=days_ago)).isoformat(),
+                'points': points
+            }, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def tearDown(self):
+        windows.reset()
+
+    def test_rolling_windows(self):
+        """Test that rolling windows only count recent activities."""
+        response = self.client.get('/api/leaderboard/?window=rolling7')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = response.data['results']
+        self.assertEqual([(row['username'], row['total_points'], row['rank']) for row in rows], [('alice', 10, 1), ('bob', 5, 2)])
+
+        response = self.client.get('/api/leaderboard/?window=rolling30')
+        self.assertEqual(response.data['results'][0]['total_points'], 30)
+
+    def test_rollover_subtracts_expired_days(self):
+        """Test that moving the window forward drops the expired days."""
+        db = get_db()
+        later = timezone.now().date() + timedelta(days=7)
+        windows.roll(db, 'rolling7', later)
+        self.assertEqual(db[windows.COLLECTION].count_documents({'window': 'rolling7'}), 0)
+
+        windows.roll(db, 'rolling30', later)
+        row = db[windows.COLLECTION].find_one({'window': 'rolling30', 'username': 'alice'})
+        self.assertEqual(row['total_points'], 30)
+
+    def test_rebuild_matches(self):
+        """Test that rebuilding from the rollups gives the incremental result."""
+        before = self.client.get('/api/leaderboard/?window=week').data['results']
+        call_command('rebuild_rollups', stdout=StringIO())
+        get_cache().clear()
+        after = self.client.get('/api/leaderboard/?window=week').data['results']
+        self.assertEqual(after, before)
+
+    def test_invalid_window(self):
+        """Test that unknown windows return 400."""
+        response = self.client.get('/api/leaderboard/?window=year')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncReadAPITest(APITestCase):
+    """Test cases for the motor-backed async read endpoints."""
+
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create(
+            username='asyncuser',
+            email='async@example.com',
+            full_name='Async User',
+            team='Async Team',
+            fitness_level='advanced'
+        )
+        for days_ago, points in [(0, 10), (1, 20), (2, 30)]:
+            self.client.post('/api/activities/', {
+                'username': 'asyncuser',
+                'activity_type': 'running',
+                'duration_minutes': 30,
+                'calories_burned': 100,
+                'date': (timezone.now() - timedelta(days=days_ago)).isoformat(),
+                'points': points
+            }, format='json')
+
+    async def test_same_responses(self):
+        """Test that the async endpoints return what the sync ones do."""
+        for sync_path, async_path in [
+            ('/api/leaderboard/', '/api/async/leaderboard/'),
+            ('/api/activities/?page_size=2&fields=id,points', '/api/async/activities/?page_size=2&fields=id,points'),
+            (f'/api/users/{self.user.id}/stats/?bucket=week', f'/api/async/users/{self.user.id}/stats/?bucket=week'),
+        ]:
+            expected = (await self.async_client.get(sync_path)).json()
+            response = await self.async_client.get(async_path)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            actual = response.json()
+            if isinstance(expected, dict) and 'next' in expected:
+                self.assertEqual(actual['results'], expected['results'])
+                self.assertEqual(expected['next'] is None, actual['next'] is None)
+            else:
+                self.assertEqual(actual, expected)
+
+    async def test_activity_cursor(self):
+        """Test that async pages follow their own next links."""
+        response = await self.async_client.get('/api/async/activities/?page_size=2')
+        self.assertEqual([row['points'] for row in response.json()['results']], [10, 20])
+        response = await self.async_client.get(response.json()['next'])
+        self.assertEqual([row['points'] for row in response.json()['results']], [30])
+
+    async def test_errors(self):
+        """Test that bad parameters and unknown users return DRF-style errors."""
+        response = await self.async_client.get('/api/async/activities/?cursor=bad')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = await self.async_client.get('/api/async/users/999999/stats/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class LiveLeaderboardTest(APITestCase):
+    """Test cases for live leaderboard events and the SSE stream."""
+
+    def test_rank_changes_are_published(self):
+        """Test that activity writes record one event per moved user."""
+        for username, points in [('alice', 10), ('bob', 20)]:
+            self.client.post('/api/activities/', {
+                'username': username,
+                'activity_type': 'running',
+                'duration_minutes': 30,
+                'calories_burned': 100,
+                'points': points
+            }, format='json')
+        events = list(get_db()[live.COLLECTION].find({}, {'_id': False, 'created_at': False}))
+        self.assertEqual(events[-1], {'username': 'bob', 'total_points': 20, 'old_rank': None, 'new_rank': 1})
+
+    def test_coalesce(self):
+        """Test that a burst collapses to one delta per user."""
+        deltas = live.coalesce([
+            {'username': 'alice', 'total_points': 10, 'old_rank': 3, 'new_rank': 2},
+            {'username': 'bob', 'total_points': 5, 'old_rank': None, 'new_rank': 4},
+            {'username': 'alice', 'total_points': 30, 'old_rank': 2, 'new_rank': 1},
+        ])
+        self.assertEqual(deltas, [
+            {'username': 'alice', 'total_points': 30, 'old_rank': 3, 'new_rank': 1},
+            {'username': 'bob', 'total_points': 5, 'old_rank': None, 'new_rank': 4},
+        ])
+
+    def test_stream_starts_with_snapshot(self):
+        """Test that the SSE endpoint opens with the current board."""
+        Leaderboard.objects.create(username='alice', full_name='Alice', team='Marvel', total_points=10, rank=1)
+        response = self.client.get('/api/leaderboard/live/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = iter(response.streaming_content)
+        first = next(content).decode()
+        response.close()
+        self.assertTrue(first.startswith('event: snapshot\n'))
+        self.assertIn('"username":"alice"', first)
+
+    def test_invalid_limit(self):
+        """Test that a negative or non-integer limit is rejected before the stream starts."""
+        for limit in ('-1', 'ten'):
+            with self.subTest(limit=limit):
+                response = self.client.get(f'/api/leaderboard/live/?limit={limit}', HTTP_ACCEPT='text/event-stream')
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertFalse(response.streaming)
+        with override_settings(LEADERBOARD_LIVE_SNAPSHOT_LIMIT=10):
+            self.assertEqual(live.parse_limit(None), 10)
+            self.assertEqual(live.parse_limit('0'), 10)
+            self.assertEqual(live.parse_limit('5'), 5)
+            self.assertEqual(live.parse_limit('500'), 10)
+        with self.assertRaises(ValueError):
+            live.LiveLeaderboardApp.limit({'query_string': b'limit=-3'})
+
+
+SCORING = {
+    'default': {'base': 5, 'per_minute': 0.5},
+    'running': {'base': 10, 'per_minute': 0.5, 'per_calorie': 0.01, 'per_km': 2},
+}
+
+
+@override_settings(ACTIVITY_SCORING=SCORING)
+class ScoringTest(APITestCase):
+    """Test cases for activity scoring and rescoring."""
+
+    def post_activity(self, **data):
+        data = dict({
+            'username': 'scorer',
+            'activity_type': 'running',
+            'duration_minutes': 30,
+            'calories_burned': 300,
+            'distance_km': 5.0,
+        }, **data)
+        response = self.client.post('/api/activities/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data
+
+    def test_scored_on_write(self):
+        """Test that points are computed unless given explicitly."""
+        self.assertEqual(self.post_activity()['points'], 38)
+        self.assertEqual(self.post_activity(activity_type='boxing')['points'], 20)
+        custom = self.post_activity(points=7)
+        self.assertEqual((custom['points'], custom['custom_points']), (7, True))
+
+    def test_update_rescores_on_input_change(self):
+        """Test that changing a scoring input recomputes the points."""
+        activity = self.post_activity()
+        response = self.client.patch(f"/api/activities/{activity['id']}/", {'notes': 'Easy'}, format='json')
+        self.assertEqual(response.data['points'], 38)
+        response = self.client.patch(f"/api/activities/{activity['id']}/", {'duration_minutes': 60}, format='json')
+        self.assertEqual(response.data['points'], 53)
+
+    def test_batch_matches_single(self):
+        """Test that batch scoring agrees with scoring one activity at a time."""
+        documents = [
+            {'activity_type': kind, 'duration_minutes': minutes, 'calories_burned': minutes * 7, 'distance_km': minutes / 9}
+            for kind in ('running', 'Running', 'yoga', None)
+            for minutes in (0, 15, 45, 121)
+        ]
+        self.assertEqual(scoring.score_documents(documents), [scoring.score(document) for document in documents])
+
+    def test_rescore_command(self):
+        """Test that rescoring rewrites computed points and the derived totals, not custom points."""
+        with override_settings(ACTIVITY_SCORING={'default': {'base': 1}}):
+            self.post_activity()
+            self.post_activity()
+        self.post_activity(points=7)
+        out = StringIO()
+        call_command('rescore_activities', batch_size=1, stdout=out)
+        self.assertIn('Scanned 2 activities; 2 rescored', out.getvalue())
+        self.assertEqual(sorted(Activity.objects.values_list('points', flat=True)), [7, 38, 38])
+        entry = Leaderboard.objects.get(username='scorer')
+        self.assertEqual((entry.total_points, entry.total_activities), (83, 3))
+
+    def test_rescore_skips_concurrent_edits(self):
+        """Test that an activity edited after it was read is neither overwritten nor counted."""
+        with override_settings(ACTIVITY_SCORING={'default': {'base': 1}}):
+            first, second = self.post_activity(), self.post_activity()
+        db = get_db()
+        documents = list(db.activities.find({}, rescore_activities.PROJECTION).sort('_id', 1))
+        db.activities.update_one({'id': second['id']}, {'$set': {'points': 12}})
+        written = rescore_activities.Command().write(db, [(document, 38) for document in documents])
+        self.assertEqual([document['id'] for document, _ in written], [first['id']])
+        self.assertEqual(Activity.objects.get(pk=second['id']).points, 12)
+
+
+class PopulateSyntheticTest(TestCase):
+    """Test cases for the synthetic mode of populate_db."""
+
+    def test_synthetic_population_is_consistent(self):
+        """Test that two generator processes produce matching users, activities, teams and totals."""
+        command = populate_db.Command()
+        command.max_team_members = 100
+        call_command(
+            command, users=synthetic.CHUNK_SIZE + 200, activities_per_user=2, teams=3,
+            workers=2, batch_size=500, stdout=StringIO(),
+        )
+        db = get_db()
+        users = synthetic.CHUNK_SIZE + 200
+        self.assertEqual(db.users.count_documents({}), users)
+        self.assertEqual(db.activities.count_documents({}), users * 2)
+        self.assertEqual(db.teams.count_documents({}), 3)
+
+        activity_points = sum(document.get('points', 0) for document in db.activities.find({}, {'points': True}))
+        entries = list(db.leaderboard.find({}, {'_id': False, 'total_points': True, 'total_activities': True, 'rank': True}))
+        self.assertEqual(len(entries), users)
+        self.assertEqual(sum(entry['total_points'] for entry in entries), activity_points)
+        self.assertEqual({entry['total_activities'] for entry in entries}, {2})
+        self.assertEqual(sorted(entry['rank'] for entry in entries), list(range(1, users + 1)))
+
+        teams = list(db.teams.find({}, {'_id': False, 'total_points': True, 'members': True}))
+        self.assertEqual(sum(team['total_points'] for team in teams), activity_points)
+        self.assertTrue(all(len(team['members']) <= 100 for team in teams))
+        self.assertEqual(sum(stats['member_count'] for stats in db.team_stats.find({}, {'member_count': True})), users)
+
+
+class RebuildDerivedTest(APITestCase):
+    """Test cases for the full rebuild of derived data."""
+
+    def setUp(self):
+        for username in ('alice', 'bob'):
+            User.objects.create(
+                username=username,
+                email=f'{username}@example.com',
+                full_name=username.title(),
+                team='Rebuilders',
+                fitness_level='beginner',
+            )
+        Team.objects.create(name='Rebuilders', description='Team', captain='alice', members=['alice', 'bob'])
+        for username, points in [('alice', 10), ('bob', 15), ('alice', 20)]:
+            self.client.post('/api/activities/', {
+                'username': username,
+                'activity_type': 'running',
+                'duration_minutes': 30,
+                'calories_burned': 100,
+                'points': points
+            }, format='json')
+
+    def test_rebuild_repairs_drift(self):
+        """Test that drifted totals, ranks and team points are recomputed in place."""
+        ids = dict(Leaderboard.objects.values_list('username', 'id'))
+        db = get_db()
+        indexes = set(db.leaderboard.index_information())
+        db.leaderboard.update_many({}, {'$set': {'total_points': 0, 'rank': 9}})
+        db.teams.update_one({'name': 'Rebuilders'}, {'$set': {'total_points': 1}})
+
+        out = StringIO()
+        call_command('rebuild_derived', stdout=out)
+        self.assertIn('Rebuilt 2 leaderboard entries from 3 activities', out.getvalue())
+
+        rows = list(Leaderboard.objects.order_by('rank').values_list('username', 'total_points', 'rank', 'id'))
+        self.assertEqual(rows, [('alice', 30, 1, ids['alice']), ('bob', 15, 2, ids['bob'])])
+        self.assertEqual(Team.objects.get(name='Rebuilders').total_points, 45)
+        self.assertEqual(set(db.leaderboard.index_information()), indexes)
+
+    def test_rebuild_skips_activities_without_username(self):
+        """Test that activities with a null username are left out of the board."""
+        get_db().activities.insert_one({'username': None, 'activity_type': 'running', 'points': 5})
+        out = StringIO()
+        call_command('rebuild_derived', stdout=out)
+        self.assertIn('Rebuilt 2 leaderboard entries from 3 activities', out.getvalue())
+        self.assertEqual(list(Leaderboard.objects.order_by('rank').values_list('username', flat=True)), ['alice', 'bob'])
+
+    def test_parallel_rebuild(self):
+        """Test that partitioned workers produce the same board as one scan."""
+        call_command('rebuild_derived', stdout=StringIO())
+        serial = list(Leaderboard.objects.order_by('rank').values_list('username', 'total_points', 'rank'))
+        get_db().leaderboard.update_many({}, {'$set': {'rank': 0}})
+
+        call_command('rebuild_derived', workers=2, stdout=StringIO())
+        parallel = list(Leaderboard.objects.order_by('rank').values_list('username', 'total_points', 'rank'))
+        self.assertEqual(parallel, serial)
+
+    def test_parallel_rebuild_matches_serial_with_odd_usernames(self):
+        """Test that non-string usernames are left out the same way with and without workers."""
+        get_db().activities.insert_many([
+            {'username': None, 'activity_type': 'running', 'points': 5},
+            {'username': 7, 'activity_type': 'running', 'points': 5},
+        ])
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                out = StringIO()
+                call_command('rebuild_derived', workers=workers, stdout=out)
+                self.assertIn('Rebuilt 2 leaderboard entries from 3 activities', out.getvalue())
+        self.assertEqual(folding.range_query(None, None), {'username': {'$type': 'string'}})
+
+
+class WriteBufferTest(APITestCase):
+    """Test cases for write-behind activity uploads."""
+
+    activity_data = {
+        'username': 'buffered',
+        'activity_type': 'running',
+        'duration_minutes': 30,
+        'calories_burned': 200,
+        'points': 10
+    }
+
+    def tearDown(self):
+        write_buffer.shutdown()
+
+    def test_group_commit(self):
+        """Test that queued activities are written as one batch per user update."""
+        buffer = write_buffer.WriteBuffer(interval=0.05, max_items=10)
+        futures = [buffer.submit(dict(self.activity_data, points=points)) for points in (10, 20, 30)]
+        activities = [future.result(timeout=5) for future in futures]
+        buffer.close()
+        self.assertTrue(all(activity.pk for activity in activities))
+        entry = Leaderboard.objects.get(username='buffered')
+        self.assertEqual((entry.total_points, entry.total_activities), (60, 3))
+
+    def test_wait_times_out(self):
+        """Test that waiting for a stalled flush raises a 503 instead of blocking."""
+        buffer = write_buffer.WriteBuffer(interval=0.01, timeout=0.05)
+        with buffer._flush_lock:
+            future = buffer.submit(self.activity_data)
+            with self.assertRaises(write_buffer.WriteTimeout) as raised:
+                buffer.wait(future)
+        self.assertEqual(raised.exception.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        buffer.close()
+        self.assertTrue(future.result(timeout=5).pk)
+
+    def test_submit_times_out_when_full(self):
+        """Test that a full queue rejects uploads with a 503 instead of blocking forever."""
+        buffer = write_buffer.WriteBuffer(interval=0.01, max_queue=1, timeout=0.05)
+        with buffer._flush_lock:
+            with self.assertRaises(write_buffer.WriteTimeout):
+                for _ in range(3):
+                    buffer.submit(self.activity_data)
+        buffer.close()
+
+    @override_settings(ACTIVITY_WRITE_BUFFER=True, ACTIVITY_WRITE_BUFFER_DURABILITY='flushed')
+    def test_flushed_create(self):
+        """Test that a flushed upload returns the stored activity."""
+        response = self.client.post('/api/activities/', self.activity_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Activity.objects.filter(pk=response.data['id']).exists())
+
+    @override_settings(ACTIVITY_WRITE_BUFFER=True, ACTIVITY_WRITE_BUFFER_DURABILITY='accepted')
+    def test_accepted_create_flushes_on_shutdown(self):
+        """Test that accepted uploads are written by the shutdown flush."""
+        response = self.client.post('/api/activities/', self.activity_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertNotIn('id', response.data)
+        write_buffer.shutdown()
+        self.assertEqual(Activity.objects.filter(username='buffered').count(), 1)
+
+
+@override_settings(TEAM_COUNTER_SHARDS=4, TEAM_COUNTER_CACHE_SECONDS=0)
+class TeamCounterTest(APITestCase):
+    """Test cases for sharded team point counters."""
+
+    def setUp(self):
+        User.objects.create(
+            username='sharded',
+            email='sharded@example.com',
+            full_name='Sharded',
+            team='Shard Team',
+            fitness_level='beginner',
+        )
+        self.team = Team.objects.create(name='Shard Team', description='Team', captain='sharded', members=['sharded'])
+        for points in (10, 20, 30):
+            self.client.post('/api/activities/', {
+                'username': 'sharded',
+                'activity_type': 'running',
+                'duration_minutes': 30,
+                'calories_burned': 100,
+                'points': points
+            }, format='json')
+
+    def tearDown(self):
+        team_counters.reset()
+
+    def test_reads_include_shards(self):
+        """Test that increments land on shards and API output still shows the total."""
+        self.assertEqual(Team.objects.get(pk=self.team.pk).total_points, 0)
+        self.assertEqual(team_counters.pending(get_db()), {'Shard Team': 60})
+        self.assertEqual(self.client.get('/api/teams/').data[0]['total_points'], 60)
+        self.assertEqual(self.client.get(f'/api/teams/{self.team.pk}/').data['total_points'], 60)
+
+    def test_fold(self):
+        """Test that folding moves shard values into the team document."""
+        call_command('fold_team_counters', stdout=StringIO())
+        self.assertEqual(Team.objects.get(pk=self.team.pk).total_points, 60)
+        self.assertEqual(team_counters.pending(get_db()), {})
+        self.assertEqual(self.client.get('/api/teams/').data[0]['total_points'], 60)
+
+    def test_sparse_fieldsets_include_shards(self):
+        """Test that shard points are added when the name is not among the selected fields."""
+        for path in ('/api/teams/?fields=total_points', f'/api/teams/{self.team.pk}/?fields=total_points'):
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                row = response.data[0] if isinstance(response.data, list) else response.data
+                self.assertEqual(row, {'total_points': 60})
+        with override_settings(OCTOFIT_REPOSITORY_READS=True):
+            self.assertEqual(self.client.get('/api/teams/?fields=total_points').data, [{'total_points': 60}])
+
+    def test_rename_moves_shards(self):
+        """Test that renaming a team folds its shards into the renamed team."""
+        self.client.patch(f'/api/teams/{self.team.pk}/', {'name': 'Renamed Team'}, format='json')
+        self.assertEqual(Team.objects.get(pk=self.team.pk).total_points, 60)
+        self.assertEqual(team_counters.pending(get_db()), {})
+        self.assertEqual(get_db().team_counters.count_documents({'team': 'Shard Team'}), 0)
+        self.assertEqual(self.client.get(f'/api/teams/{self.team.pk}/').data['total_points'], 60)
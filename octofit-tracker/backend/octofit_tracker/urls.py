@@ -19,16 +19,30 @@ REST API Endpoints:
     
     Available endpoints:
     - /api/users/
+    - /api/users/<id>/stats/?from=&to=&bucket=day|week
     - /api/teams/
-    - /api/activities/
-    - /api/leaderboard/
+    - /api/teams/stats/
+    - /api/activities/?username=&activity_type=&date_after=&date_before=&cursor=
+    - /api/activities/bulk/ (POST a list)
+    - /api/activities/export/?format=ndjson|csv (same filters as the list)
+    - /api/leaderboard/?window=week|month|rolling7|rolling30
+    - /api/leaderboard/live/ (Server-Sent Events; WebSocket at /ws/leaderboard/ under ASGI)
+    - /api/leaderboard/rank/<username>/
+    - /api/leaderboard/around/<username>/?radius=N
+    - /api/leaderboard/top/?k=N, /api/leaderboard/percentile/<username>/
+      (served from the in-process rank index)
     - /api/workouts/
+    - /api/async/leaderboard/, /api/async/activities/, /api/async/users/<id>/stats/
+      (async, motor-backed versions of the same reads; run under ASGI)
+    - /metrics (Prometheus text; every response also carries Server-Timing)
 """
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import (
     api_root,
+    metrics,
     UserViewSet,
     TeamViewSet,
     ActivityViewSet,
@@ -47,5 +61,9 @@ router.register(r'workouts', WorkoutViewSet, basename='workout')
 urlpatterns = [
     path('', api_root, name='api-root'),
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
+    path('api/async/leaderboard/', async_views.leaderboard_list, name='async-leaderboard-list'),
+    path('api/async/activities/', async_views.activity_list, name='async-activity-list'),
+    path('api/async/users/<int:pk>/stats/', async_views.user_stats, name='async-user-stats'),
     path('api/', include(router.urls)),
 ]
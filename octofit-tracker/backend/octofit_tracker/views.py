@@ -1,7 +1,27 @@
+import copy
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from pymongo.errors import BulkWriteError
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
+from . import (
+    instrumentation, leaderboard, live, repository, rollups, team_counters, team_stats, windows, write_buffer
+)
+from .cache import CachedResponseMixin
+from .db import get_db, insert_documents, to_document
+from .export import stream_documents
+from .fastlist import FastListMixin
+from .fieldsets import SparseFieldsetMixin
+from .filters import ActivityFilterBackend, rollup_params
+from .pagination import ActivityPagination
+from .ranking import get_rank_index
+from .renderers import CSVRenderer, EventStreamRenderer, NDJSONRenderer
 from .models import User, Team, Activity, Leaderboard, Workout
 from .serializers import (
     UserSerializer, 
@@ -12,6 +32,13 @@ from .serializers import (
 )
 
 
+def metrics(request):
+    """
+    Per-route request metrics in the Prometheus text format.
+    """
+    return HttpResponse(instrumentation.registry.render(), content_type='text/plain; version=0.0.4')
+
+
 @api_view(['GET'])
 def api_root(request, format=None):
     """
@@ -26,41 +53,351 @@ def api_root(request, format=None):
     })
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(SparseFieldsetMixin, FastListMixin, viewsets.ModelViewSet):
     """
     API endpoint for viewing and editing users.
     """
     queryset = User.objects.all()
     serializer_class = UserSerializer
 
+    @action(detail=True)
+    def stats(self, request, pk=None):
+        """
+        Return the user's activity totals and a per-period series from the rollups.
+
+        ``bucket`` is ``day`` (default) or ``week``; ``from`` and ``to`` are
+        inclusive ``YYYY-MM-DD`` dates and default to the whole history.
+        """
+        user = self.get_object()
+        bucket, start, end = rollup_params(request.query_params)
+        data = rollups.read(get_db(), user.username, bucket, start, end)
+        data['from'] = start.isoformat() if start else None
+        data['to'] = end.isoformat() if end else None
+        return Response(data)
+
 
-class TeamViewSet(viewsets.ModelViewSet):
+class TeamViewSet(CachedResponseMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     API endpoint for viewing and editing teams.
     """
     queryset = Team.objects.all()
     serializer_class = TeamSerializer
+    cache_resource = 'teams'
+    sparse_always_load = ('name',)
+
+    def list(self, request, *args, **kwargs):
+        if not settings.OCTOFIT_REPOSITORY_READS:
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(
+            lambda request: Response(repository.teams(
+                self.get_serializer(),
+                team_counters.pending(get_db()) if team_counters.shard_count() > 1 else None,
+            )),
+            request,
+        )
+
+    def get_serializer(self, *args, **kwargs):
+        """
+        Serialize teams with their unfolded counter shards in ``total_points``.
+        """
+        if args and 'data' not in kwargs and self.request.method in SAFE_METHODS and team_counters.shard_count() > 1:
+            teams = team_counters.add_pending(get_db(), args[0] if kwargs.get('many') else [args[0]])
+            args = (teams if kwargs.get('many') else teams[0],) + args[1:]
+        return super().get_serializer(*args, **kwargs)
 
+    @action(detail=False)
+    def stats(self, request):
+        """
+        Return the materialized team statistics, optionally for one ``team``.
+        """
+        return self.cached_response(
+            lambda request: Response(team_stats.read(get_db(), request.query_params.get('team'))),
+            request,
+        )
 
-class ActivityViewSet(viewsets.ModelViewSet):
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        team = serializer.instance
+        team_stats.set_member_count(get_db(), team.name, len(team.members or []))
+
+    def perform_update(self, serializer):
+        previous_name = serializer.instance.name
+        super().perform_update(serializer)
+        team = serializer.instance
+        db = get_db()
+        team_stats.rename(db, previous_name, team.name)
+        team_counters.rename(db, previous_name, team.name)
+        team_stats.set_member_count(db, team.name, len(team.members or []))
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        team_stats.remove(get_db(), instance.name)
+        team_counters.remove(get_db(), instance.name)
+
+
+class ActivityViewSet(SparseFieldsetMixin, FastListMixin, viewsets.ModelViewSet):
     """
     API endpoint for viewing and editing activities.
+
+    Lists are cursor-paginated newest first and can be filtered with
+    ``username``, ``team``, ``activity_type``, ``date_after`` and ``date_before``.
+    Creates go through the write-behind buffer when it is enabled.
     """
     queryset = Activity.objects.all()
     serializer_class = ActivitySerializer
+    filter_backends = [ActivityFilterBackend]
+    pagination_class = ActivityPagination
+    max_bulk_size = 1000
+    export_batch_size = 1000
+
+    def create(self, request, *args, **kwargs):
+        buffer = write_buffer.get_buffer()
+        if buffer is None:
+            return super().create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        future = buffer.submit(serializer.validated_data)
+        if buffer.durability == 'accepted':
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+        data = self.get_serializer(buffer.wait(future)).data
+        return Response(data, status=status.HTTP_201_CREATED, headers=self.get_success_headers(data))
+
+    def perform_create(self, serializer):
+        activity = serializer.save()
+        leaderboard.apply_activity_changes(added=[activity])
+
+    def perform_update(self, serializer):
+        previous = copy.copy(serializer.instance)
+        activity = serializer.save()
+        leaderboard.apply_activity_changes(added=[activity], removed=[previous])
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        leaderboard.apply_activity_changes(removed=[instance])
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Create a list of activities with one insert and one leaderboard update per user.
 
+        Validation is all-or-nothing; errors are reported per item index. Items
+        the database rejects are reported the same way and the rest are kept.
+        """
+        if not isinstance(request.data, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of activities.']})
+        if len(request.data) > self.max_bulk_size:
+            raise ValidationError({'non_field_errors': [f'At most {self.max_bulk_size} activities per request.']})
 
-class LeaderboardViewSet(viewsets.ModelViewSet):
+        serializer = self.get_serializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            errors = [{'index': i, 'errors': e} for i, e in enumerate(serializer.errors) if e]
+            return Response({'created': 0, 'results': [], 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        activities = [Activity(**item) for item in serializer.validated_data]
+        documents = [to_document(activity) for activity in activities]
+        errors = []
+        if documents:
+            try:
+                insert_documents(get_db(), Activity._meta.db_table, documents)
+            except BulkWriteError as exc:
+                errors = [
+                    {'index': error['index'], 'errors': {'non_field_errors': [error['errmsg']]}}
+                    for error in exc.details['writeErrors']
+                ]
+        failed = {error['index'] for error in errors}
+
+        created = []
+        for i, (activity, document) in enumerate(zip(activities, documents)):
+            if i not in failed:
+                activity.pk = document.get('id')
+                created.append(activity)
+        leaderboard.apply_activity_changes(added=created)
+
+        return Response(
+            {
+                'created': len(created),
+                'results': self.get_serializer(created, many=True).data,
+                'errors': errors,
+            },
+            status=status.HTTP_201_CREATED if created or not errors else status.HTTP_400_BAD_REQUEST,
+        )
+
+    @action(detail=False, renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        """
+        Stream every matching activity as NDJSON (default) or CSV.
+
+        Accepts the same filters as the list endpoint; select the format
+        with ``?format=ndjson`` or ``?format=csv``.
+        """
+        export_format = request.accepted_renderer.format
+        query = ActivityFilterBackend().get_mongo_query(request)
+        response = StreamingHttpResponse(
+            stream_documents(
+                Activity._meta.db_table,
+                query,
+                self.get_serializer(),
+                export_format,
+                batch_size=self.export_batch_size,
+            ),
+            content_type=request.accepted_renderer.media_type,
+        )
+        response['Content-Disposition'] = f'attachment; filename="activities.{export_format}"'
+        return response
+
+
+class LeaderboardViewSet(CachedResponseMixin, SparseFieldsetMixin, FastListMixin, viewsets.ModelViewSet):
     """
     API endpoint for viewing and editing leaderboard entries.
+
+    ``?window=week|month|rolling7|rolling30`` lists a time-windowed board
+    (optionally for one ``team``) instead of the all-time one. ``top`` and
+    ``percentile`` answer from the in-process rank index alone.
+
+    The all-time list is ordered by the stored ``rank``, which concurrent
+    uploads in different worker processes can leave duplicated or out of
+    order until ``rebuild_derived`` runs; with ``OCTOFIT_REPOSITORY_READS``
+    ranks are computed when the list is read.
     """
     queryset = Leaderboard.objects.all()
     serializer_class = LeaderboardSerializer
+    cache_resource = 'leaderboard'
+    max_radius = 50
+    max_top = 1000
+
+    def list(self, request, *args, **kwargs):
+        window = request.query_params.get('window')
+        if window:
+            if window not in windows.WINDOWS:
+                raise ValidationError({'window': f"Must be one of: {', '.join(windows.WINDOWS)}."})
+            return self.cached_response(
+                lambda request: Response(windows.read(get_db(), window, request.query_params.get('team'))),
+                request,
+            )
+        if not settings.OCTOFIT_REPOSITORY_READS:
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(
+            lambda request: Response(repository.leaderboard_page(self.get_serializer())), request
+        )
+
+    @action(detail=False, renderer_classes=[EventStreamRenderer])
+    def live(self, request):
+        """
+        Stream the board as Server-Sent Events: a snapshot, then coalesced deltas.
+
+        ``?limit=N`` caps the snapshot to the top N entries, at most
+        ``LEADERBOARD_LIVE_SNAPSHOT_LIMIT`` (also the default). Each client
+        holds a worker thread, so serve it through ``LiveLeaderboardApp``
+        under ASGI where possible.
+        """
+        try:
+            limit = live.parse_limit(request.query_params.get('limit'))
+        except ValueError as exc:
+            raise ValidationError({'limit': str(exc)})
+        response = StreamingHttpResponse(live.stream_events(limit), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def get_indexed_entry(self, username):
+        """
+        Look up a user's row and make sure the rank index agrees with it.
+        """
+        entry = get_object_or_404(Leaderboard, username=username)
+        index = get_rank_index()
+        index.update(entry.username, entry.total_points)
+        return index, entry
+
+    @action(detail=False, url_path=r'rank/(?P<username>[^/]+)')
+    def rank(self, request, username=None):
+        """
+        Return a single user's position without listing the board.
+        """
+        index, entry = self.get_indexed_entry(username)
+        data = self.get_serializer(entry).data
+        data['rank'] = index.rank(entry.username)
+        data['total_users'] = len(index)
+        return Response(data)
+
+    @action(detail=False)
+    def top(self, request):
+        """
+        Return the ``k`` highest ranked users (default 10) from the rank index.
+        """
+        try:
+            k = int(request.query_params.get('k', 10))
+        except ValueError:
+            raise ValidationError({'k': 'A valid integer is required.'})
+        if not 1 <= k <= self.max_top:
+            raise ValidationError({'k': f'Must be between 1 and {self.max_top}.'})
+        index = get_rank_index()
+        return Response({
+            'total_users': len(index),
+            'results': [
+                {'rank': rank, 'username': username, 'total_points': points}
+                for rank, username, points in index.window(1, k)
+            ],
+        })
+
+    @action(detail=False, url_path=r'percentile/(?P<username>[^/]+)')
+    def percentile(self, request, username=None):
+        """
+        Return a user's rank and percentile from the rank index.
+
+        Users this process has not seen yet are looked up once and added.
+        """
+        index = get_rank_index()
+        if username not in index:
+            points = Leaderboard.objects.filter(username=username).values_list('total_points', flat=True).first()
+            if points is None:
+                raise NotFound()
+            index.update(username, points)
+        percentile = index.percentile(username)
+        return Response({
+            'username': username,
+            'total_points': index.points(username),
+            'rank': index.rank(username),
+            'total_users': len(index),
+            'percentile': round(percentile, 2),
+        })
+
+    @action(detail=False, url_path=r'around/(?P<username>[^/]+)')
+    def around(self, request, username=None):
+        """
+        Return the entries within ``radius`` places of a user.
+        """
+        try:
+            radius = int(request.query_params.get('radius', 5))
+        except ValueError:
+            raise ValidationError({'radius': 'A valid integer is required.'})
+        if not 0 <= radius <= self.max_radius:
+            raise ValidationError({'radius': f'Must be between 0 and {self.max_radius}.'})
+
+        index, entry = self.get_indexed_entry(username)
+        rank = index.rank(entry.username)
+        window = index.window(rank - radius, rank + radius)
+        entries = {
+            row.username: row
+            for row in Leaderboard.objects.filter(username__in=[name for _, name, _ in window])
+        }
+        results = []
+        for position, name, _ in window:
+            if name in entries:
+                row = self.get_serializer(entries[name]).data
+                row['rank'] = position
+                results.append(row)
+        return Response({
+            'username': entry.username,
+            'rank': rank,
+            'total_users': len(index),
+            'results': results,
+        })
 
 
-class WorkoutViewSet(viewsets.ModelViewSet):
+class WorkoutViewSet(CachedResponseMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     API endpoint for viewing and editing workouts.
     """
     queryset = Workout.objects.all()
     serializer_class = WorkoutSerializer
+    cache_resource = 'workouts'
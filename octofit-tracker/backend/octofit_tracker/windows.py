@@ -0,0 +1,206 @@
+"""
+Time-windowed leaderboards.
+
+``leaderboard_windows`` holds one row per user and window (``week``,
+``month``, ``rolling7``, ``rolling30``) with the totals of the user's
+activities dated on or after the window's start. Activity writes ``$inc``
+the rows alongside the all-time leaderboard.
+
+Windows only ever move forward, so rolling over is a subtraction: when the
+UTC day changes, the daily rollups of the days that fell out of the window
+are subtracted from the rows and emptied rows are dropped. Calendar
+windows roll over the same way on the first day of a new week or month.
+The new start is claimed with a conditional update on the window's
+``leaderboard_windows_meta`` document, so only one worker applies it.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from . import rollups
+from .db import field_value
+
+COLLECTION = 'leaderboard_windows'
+META_COLLECTION = 'leaderboard_windows_meta'
+WINDOWS = ('week', 'month', 'rolling7', 'rolling30')
+
+# Window row total -> daily rollup sum it is built from.
+TOTAL_FIELDS = {
+    'total_points': 'points',
+    'total_calories': 'calories_burned',
+    'total_duration_minutes': 'duration_minutes',
+    'total_activities': 'count',
+}
+
+# Day each window was last rolled to, per process.
+_rolled = {}
+
+
+def today():
+    return timezone.now().date()
+
+
+def window_start(window, day):
+    """
+    Return the naive UTC midnight starting ``window`` on ``day``.
+    """
+    if window == 'week':
+        return rollups.bucket_start(day, 'week')
+    if window == 'month':
+        return rollups.bucket_start(day.replace(day=1), 'day')
+    days = int(window[len('rolling'):])
+    return rollups.bucket_start(day - timedelta(days=days - 1), 'day')
+
+
+def roll(db, window, day=None):
+    """
+    Move ``window`` forward to ``day`` (today by default); return its start.
+    """
+    day = day or today()
+    start = window_start(window, day)
+    if _rolled.get(window) == day:
+        return start
+
+    meta = db[META_COLLECTION].find_one({'window': window})
+    if meta is None:
+        rebuild(db, window, day)
+    elif meta['start'] < start:
+        claimed = db[META_COLLECTION].find_one_and_update(
+            {'window': window, 'start': meta['start']},
+            {'$set': {'start': start, 'updated_at': timezone.now()}},
+        )
+        if claimed is not None:
+            _subtract_days(db, window, meta['start'], start)
+    _rolled[window] = day
+    return start
+
+
+def _subtract_days(db, window, first, stop):
+    """
+    Subtract the daily rollups dated in ``[first, stop)`` from the window rows.
+    """
+    pipeline = [
+        {'$match': {'bucket': 'day', 'start': {'$gte': first, '$lt': stop}}},
+        {'$group': dict(
+            {'_id': '$username'},
+            **{total: {'$sum': f'${field}'} for total, field in TOTAL_FIELDS.items()}
+        )},
+    ]
+    operations = [
+        UpdateOne(
+            {'window': window, 'username': group['_id']},
+            {'$inc': {total: -group[total] for total in TOTAL_FIELDS}},
+        )
+        for group in db[rollups.COLLECTION].aggregate(pipeline, allowDiskUse=True)
+    ]
+    if operations:
+        db[COLLECTION].bulk_write(operations, ordered=False)
+    db[COLLECTION].delete_many({'window': window, 'total_activities': {'$lte': 0}})
+
+
+def apply_changes(db, user_teams, added=(), removed=()):
+    """
+    Apply created, updated or deleted activities to every window they fall in.
+    """
+    operations = []
+    for window in WINDOWS:
+        start = roll(db, window)
+        increments = {}
+        for activities, sign in ((added, 1), (removed, -1)):
+            for activity in activities:
+                moment = field_value(activity, 'date')
+                if moment is None or rollups.bucket_start(moment, 'day') < start:
+                    continue
+                totals = increments.setdefault(field_value(activity, 'username'), dict.fromkeys(TOTAL_FIELDS, 0))
+                for total, field in TOTAL_FIELDS.items():
+                    totals[total] += sign * (1 if field == 'count' else (field_value(activity, field) or 0))
+        for username, totals in increments.items():
+            if any(totals.values()):
+                operations.append(UpdateOne(
+                    {'window': window, 'username': username},
+                    {'$inc': totals, '$setOnInsert': {'team': user_teams.get(username) or ''}},
+                    upsert=True,
+                ))
+    if operations:
+        db[COLLECTION].bulk_write(operations, ordered=False)
+    if removed:
+        db[COLLECTION].delete_many({
+            'username': {'$in': list({field_value(activity, 'username') for activity in removed})},
+            'total_activities': {'$lte': 0},
+        })
+
+
+def rebuild(db, window, day=None):
+    """
+    Recompute ``window`` for ``day`` from the daily rollups; returns the row count.
+    """
+    day = day or today()
+    start = window_start(window, day)
+    user_teams = {user['username']: user.get('team') for user in db.users.find({}, {'username': True, 'team': True})}
+    pipeline = [
+        {'$match': {'bucket': 'day', 'start': {'$gte': start}}},
+        {'$group': dict(
+            {'_id': '$username'},
+            **{total: {'$sum': f'${field}'} for total, field in TOTAL_FIELDS.items()}
+        )},
+    ]
+    rows = [
+        dict(
+            {'window': window, 'username': group['_id'], 'team': user_teams.get(group['_id']) or ''},
+            **{total: group[total] for total in TOTAL_FIELDS}
+        )
+        for group in db[rollups.COLLECTION].aggregate(pipeline, allowDiskUse=True)
+        if group['total_activities'] > 0
+    ]
+    db[COLLECTION].delete_many({'window': window})
+    if rows:
+        db[COLLECTION].insert_many(rows, ordered=False)
+
+    now = timezone.now()
+    try:
+        db[META_COLLECTION].update_one(
+            {'window': window},
+            {'$set': {'start': start, 'updated_at': now}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # A concurrent rebuild created the document first with the same start.
+        pass
+    _rolled[window] = day
+    return len(rows)
+
+
+def rebuild_all(db, day=None):
+    return {window: rebuild(db, window, day) for window in WINDOWS}
+
+
+def read(db, window, team=None):
+    """
+    Return the window's rows, ranked by ``(-total_points, username)``.
+    """
+    start = roll(db, window)
+    query = {'window': window}
+    if team:
+        query['team'] = team
+    cursor = db[COLLECTION].find(query, {'_id': False, 'window': False}).sort([
+        ('total_points', -1), ('username', 1),
+    ])
+    results = []
+    for rank, row in enumerate(cursor, start=1):
+        row['rank'] = rank
+        results.append(row)
+    return {
+        'window': window,
+        'start': start.date().isoformat(),
+        'as_of': today().isoformat(),
+        'results': results,
+    }
+
+
+def reset():
+    """
+    Forget which days the windows were rolled to in this process.
+    """
+    _rolled.clear()
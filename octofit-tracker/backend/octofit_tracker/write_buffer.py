@@ -0,0 +1,262 @@
+"""
+Write-behind buffering for single activity uploads.
+
+When ``ACTIVITY_WRITE_BUFFER`` is on, ``ActivityViewSet.create`` validates
+the activity and queues it instead of inserting it. One flusher thread per
+process drains the queue every ``ACTIVITY_WRITE_BUFFER_INTERVAL_MS`` or
+``ACTIVITY_WRITE_BUFFER_MAX_ITEMS`` activities, whichever comes first, and
+writes the batch like the bulk endpoint does: one ``insert_many`` and one
+leaderboard update per user.
+
+``ACTIVITY_WRITE_BUFFER_DURABILITY`` chooses what a 2xx response means:
+
+``accepted``
+    The activity is queued; the response is ``202`` without an id. Queued
+    activities are lost if the process dies before the next flush, and a
+    batch whose write fails (other than per-document insert errors) is
+    logged and dropped, since nobody is waiting for it.
+``flushed``
+    The request waits for its batch to be written (group commit) and gets
+    the usual ``201`` with the stored activity. A failed insert is returned
+    to every request in the batch. If the batch is not written within
+    ``ACTIVITY_WRITE_BUFFER_TIMEOUT_MS`` after the flush interval the
+    request gets a ``503``; the activity stays queued and may still be saved.
+``journaled``
+    Like ``flushed``, with the insert acknowledged only once it is in the
+    MongoDB journal.
+
+Uploads also get a ``503`` when the queue stays full for that long. Once a
+batch is inserted its requests succeed even if updating the leaderboard
+and other derived data fails: those activities are logged and applied
+again with the next batch. A failure partway through that update can
+leave totals off until ``rebuild_derived`` is run.
+
+The queue is flushed when the process exits normally (``atexit``).
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+from django.conf import settings
+from django.db import connections
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from . import leaderboard
+from .db import get_db, insert_documents, to_document
+from .models import Activity
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES = ('accepted', 'flushed', 'journaled')
+_STOP = object()
+
+
+class WriteTimeout(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The activity was not written in time; it may still be saved.'
+    default_code = 'write_timeout'
+
+
+class WriteBuffer:
+    """
+    Bounded queue of validated activities drained in batches by a flusher thread.
+    """
+
+    def __init__(self, interval=0.05, max_items=500, max_queue=10000, durability='flushed', timeout=5.0):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f'Unknown durability {durability!r}; expected one of {", ".join(DURABILITY_MODES)}.')
+        self.interval = interval
+        self.timeout = interval + timeout
+        self.max_items = max(int(max_items), 1)
+        self.durability = durability
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._flush_lock = threading.Lock()
+        self._unapplied = []
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='activity-write-buffer', daemon=True)
+        self._thread.start()
+
+    def submit(self, data):
+        """
+        Queue validated activity data; returns a ``Future`` for the saved ``Activity``.
+
+        Blocks while the queue is full, which pushes back on uploads when
+        MongoDB cannot keep up, and raises ``WriteTimeout`` if it stays full.
+        """
+        if self._closed:
+            raise RuntimeError('The write buffer is closed.')
+        future = Future()
+        try:
+            self._queue.put((dict(data), future), timeout=self.timeout)
+        except queue.Full:
+            raise WriteTimeout()
+        return future
+
+    def wait(self, future):
+        """
+        Return the saved ``Activity`` for a submitted future; raises ``WriteTimeout``.
+
+        Waits for one flush interval plus the buffer's write timeout.
+        """
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise WriteTimeout()
+
+    def flush(self):
+        """
+        Write everything queued so far from the calling thread.
+        """
+        while True:
+            batch = []
+            while len(batch) < self.max_items:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP:
+                    batch.append(item)
+            if not batch:
+                return
+            self._write(batch)
+
+    def close(self):
+        """
+        Stop the flusher thread after it has written everything queued.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        self.flush()
+        with self._flush_lock:
+            self._apply([])
+        if self._unapplied:
+            logger.error(
+                '%d buffered activities were stored but not applied to the derived data; run rebuild_derived',
+                len(self._unapplied),
+            )
+
+    def _run(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    return
+                batch = [item]
+                deadline = time.monotonic() + self.interval
+                stopping = False
+                while len(batch) < self.max_items:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                self._write(batch)
+                if stopping:
+                    return
+        finally:
+            connections.close_all()
+
+    def _write(self, batch):
+        """
+        Insert one batch and apply it to the derived data, resolving its futures.
+        """
+        with self._flush_lock:
+            try:
+                activities = [Activity(**data) for data, _ in batch]
+                documents = [to_document(activity) for activity in activities]
+                db = get_db()
+                if self.durability == 'journaled':
+                    db = db.client.get_database(db.name, write_concern=WriteConcern(w=1, j=True))
+                errors = {}
+                try:
+                    insert_documents(db, Activity._meta.db_table, documents)
+                except BulkWriteError as exc:
+                    errors = {error['index']: error['errmsg'] for error in exc.details['writeErrors']}
+            except Exception as exc:
+                logger.exception('Failed to write %d buffered activities', len(batch))
+                for _, future in batch:
+                    future.set_exception(exc)
+                return
+
+            created = []
+            for i, (activity, document) in enumerate(zip(activities, documents)):
+                if i not in errors:
+                    activity.pk = document.get('id')
+                    created.append(activity)
+            self._apply(created)
+
+            for i, ((_, future), activity) in enumerate(zip(batch, activities)):
+                if i in errors:
+                    future.set_exception(ValidationError({'non_field_errors': [errors[i]]}))
+                else:
+                    future.set_result(activity)
+
+    def _apply(self, created):
+        """
+        Apply inserted activities, and any left over from failed attempts, to the derived data.
+
+        On failure they are kept for the next batch; the inserts stand either way.
+        """
+        pending = self._unapplied + created
+        if not pending:
+            return
+        try:
+            leaderboard.apply_activity_changes(added=pending)
+        except Exception:
+            logger.exception(
+                'Failed to update derived data for %d buffered activities; retrying with the next batch',
+                len(pending),
+            )
+            self._unapplied = pending
+        else:
+            self._unapplied = []
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """
+    Return this process's write buffer, or ``None`` when buffering is off.
+    """
+    global _buffer
+    if not getattr(settings, 'ACTIVITY_WRITE_BUFFER', False):
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = WriteBuffer(
+                interval=getattr(settings, 'ACTIVITY_WRITE_BUFFER_INTERVAL_MS', 50) / 1000,
+                max_items=getattr(settings, 'ACTIVITY_WRITE_BUFFER_MAX_ITEMS', 500),
+                max_queue=getattr(settings, 'ACTIVITY_WRITE_BUFFER_MAX_QUEUE', 10000),
+                durability=getattr(settings, 'ACTIVITY_WRITE_BUFFER_DURABILITY', 'flushed'),
+                timeout=getattr(settings, 'ACTIVITY_WRITE_BUFFER_TIMEOUT_MS', 5000) / 1000,
+            )
+        return _buffer
+
+
+@atexit.register
+def shutdown():
+    """
+    Flush and stop the buffer, if one was started; the next upload starts a new one.
+    """
+    global _buffer
+    with _buffer_lock:
+        buffer, _buffer = _buffer, None
+    if buffer is not None:
+        buffer.close()
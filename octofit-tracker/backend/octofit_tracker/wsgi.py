@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
 
 application = get_wsgi_application()
+
+from octofit_tracker.ranking import warm_rank_index  # noqa: E402 - needs the app registry
+
+warm_rank_index()
@@ -2,14 +2,15 @@ import React, { useState, useEffect } from 'react';
 
 const Activities = () => {
   const [activities, setActivities] = useState([]);
+  const [nextUrl, setNextUrl] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState(null);
 
-  useEffect(() => {
-    const apiUrl = `https://${process.env.REACT_APP_CODESPACE_NAME}-8000.app.github.dev/api/activities/`;
+  const fetchPage = (apiUrl) => {
     console.log('Activities - Fetching from REST API endpoint:', apiUrl);
 
-    fetch(apiUrl)
+    return fetch(apiUrl)
       .then(response => {
         if (!response.ok) {
           throw new Error('Network response was not ok');
@@ -21,16 +22,25 @@ const Activities = () => {
         // Handle both paginated (.results) and plain array responses
         const activitiesData = data.results || data;
         console.log('Activities - Processed data:', activitiesData);
-        setActivities(Array.isArray(activitiesData) ? activitiesData : []);
-        setLoading(false);
+        setActivities(previous => previous.concat(Array.isArray(activitiesData) ? activitiesData : []));
+        setNextUrl(data.next || null);
       })
       .catch(error => {
         console.error('Activities - Error fetching data:', error);
         setError(error.message);
-        setLoading(false);
       });
+  };
+
+  useEffect(() => {
+    const apiUrl = `https://${process.env.REACT_APP_CODESPACE_NAME}-8000.app.github.dev/api/activities/`;
+    fetchPage(apiUrl).then(() => setLoading(false));
   }, []);
 
+  const loadMore = () => {
+    setLoadingMore(true);
+    fetchPage(nextUrl).then(() => setLoadingMore(false));
+  };
+
   if (loading) return <div className="container mt-4"><div className="loading-spinner"><div className="spinner-border text-primary" role="status"><span className="visually-hidden">Loading...</span></div><p className="mt-2">Loading activities...</p></div></div>;
   if (error) return <div className="container mt-4"><div className="error-message"><strong>Error:</strong> {error}</div></div>;
 
@@ -74,6 +84,13 @@ const Activities = () => {
           </tbody>
         </table>
         </div>
+        {nextUrl && (
+          <div className="text-center my-3">
+            <button className="btn btn-outline-primary" onClick={loadMore} disabled={loadingMore}>
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
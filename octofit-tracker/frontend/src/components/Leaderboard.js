@@ -6,29 +6,71 @@ const Leaderboard = () => {
   const [error, setError] = useState(null);
 
   useEffect(() => {
-    const apiUrl = `https://${process.env.REACT_APP_CODESPACE_NAME}-8000.app.github.dev/api/leaderboard/`;
-    console.log('Leaderboard - Fetching from REST API endpoint:', apiUrl);
+    const baseUrl = `https://${process.env.REACT_APP_CODESPACE_NAME}-8000.app.github.dev/api/leaderboard/`;
 
-    fetch(apiUrl)
-      .then(response => {
-        if (!response.ok) {
-          throw new Error('Network response was not ok');
-        }
-        return response.json();
-      })
-      .then(data => {
-        console.log('Leaderboard - Fetched data:', data);
-        // Handle both paginated (.results) and plain array responses
-        const leaderboardData = data.results || data;
-        console.log('Leaderboard - Processed data:', leaderboardData);
-        setLeaderboard(Array.isArray(leaderboardData) ? leaderboardData : []);
-        setLoading(false);
-      })
-      .catch(error => {
-        console.error('Leaderboard - Error fetching data:', error);
-        setError(error.message);
-        setLoading(false);
+    // Live updates hold a server connection per open tab; only enable them
+    // (REACT_APP_LEADERBOARD_LIVE=true) when the backend is served by ASGI.
+    const live = process.env.REACT_APP_LEADERBOARD_LIVE === 'true' && typeof EventSource !== 'undefined';
+
+    if (!live) {
+      console.log('Leaderboard - Fetching from REST API endpoint:', baseUrl);
+      fetch(baseUrl)
+        .then(response => {
+          if (!response.ok) {
+            throw new Error('Network response was not ok');
+          }
+          return response.json();
+        })
+        .then(data => {
+          console.log('Leaderboard - Fetched data:', data);
+          // Handle both paginated (.results) and plain array responses
+          const leaderboardData = data.results || data;
+          setLeaderboard(Array.isArray(leaderboardData) ? leaderboardData : []);
+          setLoading(false);
+        })
+        .catch(error => {
+          console.error('Leaderboard - Error fetching data:', error);
+          setError(error.message);
+          setLoading(false);
+        });
+      return undefined;
+    }
+
+    const limit = 100;
+    const streamUrl = `${baseUrl}live/?limit=${limit}`;
+    console.log('Leaderboard - Subscribing to live updates:', streamUrl);
+    const source = new EventSource(streamUrl);
+
+    source.addEventListener('snapshot', event => {
+      const data = JSON.parse(event.data);
+      console.log('Leaderboard - Snapshot:', data);
+      setLeaderboard(Array.isArray(data) ? data : []);
+      setError(null);
+      setLoading(false);
+    });
+
+    source.addEventListener('delta', event => {
+      const deltas = JSON.parse(event.data);
+      setLeaderboard(previous => {
+        const rows = new Map(previous.map(entry => [entry.username, entry]));
+        deltas.forEach(delta => {
+          const entry = rows.get(delta.username) || { username: delta.username };
+          rows.set(delta.username, { ...entry, total_points: delta.total_points });
+        });
+        // Re-sort instead of shifting by rank so replayed deltas are harmless.
+        return Array.from(rows.values())
+          .sort((a, b) => (b.total_points || 0) - (a.total_points || 0) || a.username.localeCompare(b.username))
+          .slice(0, limit)
+          .map((entry, index) => ({ ...entry, rank: index + 1 }));
       });
+    });
+
+    source.onerror = () => {
+      // EventSource reconnects by itself and then receives a fresh snapshot.
+      console.error('Leaderboard - Live connection lost, reconnecting');
+    };
+
+    return () => source.close();
   }, []);
 
   if (loading) return <div className="container mt-4"><div className="loading-spinner"><div className="spinner-border text-primary" role="status"><span className="visually-hidden">Loading...</span></div><p className="mt-2">Loading leaderboard...</p></div></div>;